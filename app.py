@@ -1,28 +1,41 @@
 import streamlit as st
-import requests
 import os
 import tempfile
 import json
+import hashlib
+import functools
+import io
+import uuid
 from dotenv import load_dotenv
 import time
-import re
 
 # Import utility modules
 from utils.config import (
-    get_available_providers, 
     get_models_for_provider, 
     has_free_tier, 
     get_setup_instructions,
-    validate_api_key
+    ROUTER_OBJECTIVE,
+    DIFF_CONTEXT_LINES,
+    DIFF_REPO_ROOT,
+    REVIEW_HISTORY_SIZE,
+    REVIEW_JOB_POLL_INTERVAL,
+    ISSUES_PAGE_SIZE,
+    DEBUG_PANEL
 )
-from utils.prompts import create_review_prompt
+from utils.language import detect_language
+from utils.diff import get_git_diff, parse_unified_diff, resolve_repo_path, review_diff
+from utils.uploads import UPLOAD_TYPES, count_issues, is_archive, review_uploaded_files, summarize_file_reviews
+from utils.issue_index import ISSUE_SORT_ORDERS, build_issue_index, filter_issues
+from utils.review_schema import SEVERITIES
+from utils.tracing import get_metrics_server_error, get_tracer, start_metrics_server, trace, traced
+from utils.review import analyze_code, analyze_with_stream
+from utils.jobs import JobManager, QUEUED, DONE, FAILED, FINISHED, raise_if_cancelled, report_progress
+from utils.router import AUTO_PROVIDER, ROUTER_OBJECTIVES, choose_model, get_stats_table
+from rule_engine import supports_language, review_with_rules
 
 # Import provider modules
-from providers.ollama_provider import analyze_with_ollama, is_ollama_running
-from providers.gemini_provider import analyze_with_gemini, is_gemini_available
-from providers.groq_provider import analyze_with_groq, is_groq_available
-from providers.huggingface_provider import analyze_with_huggingface, is_huggingface_available
-from providers.openrouter_provider import analyze_with_openrouter, is_openrouter_available, get_model_pricing
+from providers.openrouter_provider import is_openrouter_available, get_model_pricing
+from providers.health import get_health_registry, get_usable_providers
 
 # Load environment variables
 load_dotenv()
@@ -92,6 +105,13 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Serve the stage metrics for Prometheus if METRICS_PORT is set (once per process)
+start_metrics_server()
+if get_metrics_server_error() and not st.session_state.get("metrics_error_shown"):
+    # Shown on the first run of each session; the error is also in the server log
+    st.session_state["metrics_error_shown"] = True
+    st.warning(get_metrics_server_error())
+
 # App title and description
 st.title("AI Code Review Assistant")
 st.markdown("Upload or paste your code to get professional feedback, best practices, and improvement suggestions.")
@@ -101,18 +121,11 @@ with st.sidebar:
     st.header("Settings")
     
     # API Provider selection
-    available_providers = ["OpenAI", "Anthropic", "Ollama", "Google Gemini", "Groq", "Hugging Face", "OpenRouter"]
-    
-    # Check provider availability
-    provider_status = {
-        "OpenAI": validate_api_key("OpenAI"),
-        "Anthropic": validate_api_key("Anthropic"),
-        "Ollama": is_ollama_running(),
-        "Google Gemini": is_gemini_available(),
-        "Groq": is_groq_available(),
-        "Hugging Face": is_huggingface_available(),
-        "OpenRouter": is_openrouter_available()
-    }
+    available_providers = ["OpenAI", "Anthropic", "Ollama", "Google Gemini", "Groq", "Hugging Face", "OpenRouter", AUTO_PROVIDER]
+    
+    # Check provider availability (cached snapshot, probes run in the background)
+    health_registry = get_health_registry()
+    provider_status = health_registry.snapshot()
     
     # Add free tier indicators to provider names
     provider_display_names = []
@@ -132,15 +145,23 @@ with st.sidebar:
     api_provider = available_providers[selected_provider_index]
     
     # Show provider status
-    if provider_status[api_provider]:
+    if api_provider == AUTO_PROVIDER:
+        st.markdown("<div class='provider-status'>🔀 Each review goes to the configured provider that best fits the objective below</div>", unsafe_allow_html=True)
+    elif provider_status[api_provider] is None:
+        st.markdown(f"<div class='provider-status'>⏳ Checking {api_provider} status...</div>", unsafe_allow_html=True)
+    elif provider_status[api_provider]:
         st.markdown(f"<div class='provider-status status-available'>✅ {api_provider} is available</div>", unsafe_allow_html=True)
     else:
         st.markdown(f"<div class='provider-status status-unavailable'>❌ {api_provider} is not available</div>", unsafe_allow_html=True)
         with st.expander("Setup Instructions"):
             st.markdown(get_setup_instructions(api_provider))
+    if st.button("Refresh status", key="refresh_provider_status"):
+        health_registry.invalidate()
     
     # API Key input (not needed for Ollama)
-    if api_provider != "Ollama":
+    if api_provider == AUTO_PROVIDER:
+        api_key = None  # Each provider's key comes from the environment
+    elif api_provider != "Ollama":
         api_key_env_var = f"{api_provider.upper().replace(' ', '_')}_API_KEY"
         if api_provider == "Google Gemini":
             api_key_env_var = "GEMINI_API_KEY"
@@ -154,7 +175,9 @@ with st.sidebar:
     else:
         api_key = None  # No API key needed for Ollama
         # Show Ollama status
-        if is_ollama_running():
+        if provider_status["Ollama"] is None:
+            st.info("Checking whether Ollama is running...")
+        elif provider_status["Ollama"]:
             st.success("Ollama is running locally")
         else:
             st.error("Ollama is not running")
@@ -162,11 +185,24 @@ with st.sidebar:
                 st.markdown(get_setup_instructions("Ollama"))
     
     # Model selection based on provider
-    models = get_models_for_provider(api_provider)
-    model = st.selectbox(
-        "Select Model",
-        models
-    )
+    router_objective = ROUTER_OBJECTIVE
+    if api_provider == AUTO_PROVIDER:
+        model = None
+        router_objective = st.select_slider(
+            "Optimize For",
+            options=ROUTER_OBJECTIVES,
+            value=ROUTER_OBJECTIVE if ROUTER_OBJECTIVE in ROUTER_OBJECTIVES else "balanced",
+            format_func=str.capitalize,
+            help="Route by recent latency and failure rates, by price, or by a balance of the two"
+        )
+        with st.expander("Provider Statistics"):
+            st.dataframe(get_stats_table(), hide_index=True)
+    else:
+        models = get_models_for_provider(api_provider)
+        model = st.selectbox(
+            "Select Model",
+            models
+        )
     
     # Show pricing for OpenRouter models
     if api_provider == "OpenRouter" and is_openrouter_available():
@@ -180,6 +216,35 @@ with st.sidebar:
         value="Standard"
     )
     
+    # Local rule engine mode
+    rule_check_mode = st.selectbox(
+        "Local Rule Checks",
+        ["Before AI review", "Instead of AI review", "Off"],
+        help="Fast offline checks for naming, unused imports, swallowed exceptions, SQL injection and nested loops"
+    )
+    
+    # Review cache
+    use_review_cache = st.checkbox(
+        "Use cached reviews",
+        value=True,
+        help="Reuse the previous review when the same code is analyzed again with the same settings"
+    )
+    
+    # Streaming output
+    stream_output = st.checkbox(
+        "Stream output",
+        value=True,
+        help="Show the review while the model is still generating it"
+    )
+    
+    # Hedged requests
+    hedge_requests = st.checkbox(
+        "Back up slow requests",
+        value=False,
+        disabled=len(get_usable_providers()) < 2,
+        help="If the provider takes longer than usual, send the review to another configured provider too and use whichever answers first (turns off streaming)"
+    )
+    
     st.divider()
     
     # About section
@@ -195,188 +260,56 @@ with st.sidebar:
     - Style and best practice recommendations
     - Multiple AI providers (free & paid options)
     """)
-
-
-# Function to detect programming language from code or filename
-def detect_language(code, filename=None):
-    # Check filename extension first if available
-    if filename:
-        extension_map = {
-            '.py': 'Python',
-            '.js': 'JavaScript',
-            '.ts': 'TypeScript',
-            '.html': 'HTML',
-            '.css': 'CSS',
-            '.java': 'Java',
-            '.cpp': 'C++',
-            '.c': 'C',
-            '.go': 'Go',
-            '.rs': 'Rust',
-            '.php': 'PHP',
-            '.rb': 'Ruby',
-            '.swift': 'Swift',
-            '.kt': 'Kotlin',
-            '.scala': 'Scala',
-            '.sh': 'Shell',
-            '.pl': 'Perl',
-            '.cs': 'C#'
-        }
-        ext = os.path.splitext(filename)[1].lower()
-        if ext in extension_map:
-            return extension_map[ext]
-    
-    # Basic detection based on code patterns
-    language_patterns = {
-        'Python': [r'import\s+[a-zA-Z0-9_]+', r'def\s+[a-zA-Z0-9_]+\s*\(', r'class\s+[a-zA-Z0-9_]+\s*:'],
-        'JavaScript': [r'const\s+[a-zA-Z0-9_]+\s*=', r'function\s+[a-zA-Z0-9_]+\s*\(', r'let\s+[a-zA-Z0-9_]+\s*='],
-        'Java': [r'public\s+class\s+[a-zA-Z0-9_]+', r'public\s+static\s+void\s+main'],
-        'C++': [r'#include\s+<[a-zA-Z0-9_]+>', r'int\s+main\s*\('],
-        'HTML': [r'<!DOCTYPE\s+html>', r'<html.*>.*</html>'],
-        'CSS': [r'[a-zA-Z0-9_]+\s*{[^}]*}', r'\.[a-zA-Z0-9_-]+\s*{']
-    }
-    
-    for lang, patterns in language_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, code):
-                return lang
     
-    return "Unknown"
+    # Stage timings of recent reviews, drawn at the end of the page so this run's rendering is included
+    show_debug_panel = st.checkbox("Show debug panel", value=DEBUG_PANEL, help="Time spent in each stage of a review")
 
 
-# Function to call OpenAI API for code review
-def analyze_with_openai(code, language, api_key, model, depth):
-    if not api_key:
-        st.error("Please provide an OpenAI API key in the sidebar.")
-        return None
-    
-    prompt = create_review_prompt(code, language, depth, "OpenAI")
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are an expert code reviewer."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.2
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            result = response_data["choices"][0]["message"]["content"]
-            # Extract JSON from the response if it's wrapped in text
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                return json.loads(json_str.strip())
-            else:
-                try:
-                    return json.loads(result)
-                except:
-                    st.error("Failed to parse API response as JSON")
-                    return None
-        else:
-            st.error(f"API Error: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        st.error(f"Failed to call OpenAI API: {str(e)}")
-        return None
-
-
-# Function to call Anthropic API for code review
-def analyze_with_anthropic(code, language, api_key, model, depth):
-    if not api_key:
-        st.error("Please provide an Anthropic API key in the sidebar.")
-        return None
-    
-    prompt = create_review_prompt(code, language, depth, "Anthropic")
-    
-    headers = {
-        "Content-Type": "application/json",
-        "x-api-key": api_key,
-        "anthropic-version": "2023-06-01"
-    }
-    
-    payload = {
-        "model": model,
-        "max_tokens": 4000,
-        "temperature": 0.2,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            result = response_data["content"][0]["text"]
-            # Extract JSON from the response if it's wrapped in text
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                return json.loads(json_str.strip())
-            else:
-                try:
-                    return json.loads(result)
-                except:
-                    st.error("Failed to parse API response as JSON")
-                    return None
-        else:
-            st.error(f"API Error: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        st.error(f"Failed to call Anthropic API: {str(e)}")
-        return None
-
-
-# Function to analyze code based on selected provider
-def analyze_code(code, language, api_key, provider, model, depth):
-    if provider == "OpenAI":
-        return analyze_with_openai(code, language, api_key, model, depth)
-    elif provider == "Anthropic":
-        return analyze_with_anthropic(code, language, api_key, model, depth)
-    elif provider == "Ollama":
-        prompt = create_review_prompt(code, language, depth, "Ollama")
-        return analyze_with_ollama(code, language, model, prompt)
-    elif provider == "Google Gemini":
-        prompt = create_review_prompt(code, language, depth, "Google Gemini")
-        return analyze_with_gemini(code, language, model, prompt)
-    elif provider == "Groq":
-        prompt = create_review_prompt(code, language, depth, "Groq")
-        return analyze_with_groq(code, language, model, prompt)
-    elif provider == "Hugging Face":
-        prompt = create_review_prompt(code, language, depth, "Hugging Face")
-        return analyze_with_huggingface(code, language, model, prompt)
-    elif provider == "OpenRouter":
-        prompt = create_review_prompt(code, language, depth, "OpenRouter", model)
-        return analyze_with_openrouter(code, language, model, prompt)
-    else:
-        st.error(f"Unsupported provider: {provider}")
-        return None
+# Function to run the local rule checks before or instead of the AI review
+def analyze_code_with_rules(code, language, api_key, provider, model, depth, rule_mode, use_cache=True, stream=False, hedge=False,
+                            objective=ROUTER_OBJECTIVE):
+    # Runs on a background job thread, so everything to show goes into the returned review
+    extras = {}
+    if rule_mode != "Off" and supports_language(language):
+        rule_review = review_with_rules(code, language)
+        if rule_mode == "Instead of AI review":
+            return rule_review
+        extras["rule_issues"] = rule_review.get("issues", [])
+    elif rule_mode == "Instead of AI review":
+        extras["rule_warning"] = f"No local rules are available for {language}, running the AI review instead."
+    
+    # Let the router pick the provider and model for this file
+    if provider == AUTO_PROVIDER:
+        choice = choose_model(code, objective)
+        if choice is None:
+            return dict(extras, error="No configured provider is available for automatic selection.")
+        provider, model = choice["provider"], choice["model"]
+        extras["auto_selected"] = f"{provider} ({model})"
+    
+    # A hedged review can't be streamed: the answer may come from either provider
+    review = analyze_code(code, language, api_key, provider, model, depth, use_cache,
+                          analyze_with_stream if stream and not hedge else None, hedge)
+    # The rule findings and the router's choice are kept with the review so reruns can show them again
+    return dict(review, **extras) if review and extras else review
 
 
 # Function to format and display review output
-def display_review_output(review_data):
+def display_review_output(review_data, issue_index=None, key="review"):
+    # The issues are listed only when issue_index is given; reports of many files list them once for all files
     if not review_data:
         return
     
+    if review_data.get("rule_warning"):
+        st.warning(review_data["rule_warning"])
+    
+    if review_data.get("rule_issues") is not None:
+        rule_count = len(review_data["rule_issues"])
+        st.info(f"The local rule checks found {rule_count} issue(s); they are listed with the AI review's issues "
+                "and can be picked out with the Rule filter." if rule_count else "No issues found by the local rule checks.")
+    
+    if review_data.get("auto_selected"):
+        st.info(f"Auto selected {review_data['auto_selected']}")
+    
     # Check if there's an error in the response
     if "error" in review_data:
         st.error(f"Error: {review_data['error']}")
@@ -388,9 +321,30 @@ def display_review_output(review_data):
                 st.markdown(review_data["details"])
         if "raw_response" in review_data:
             with st.expander("Raw Response"):
-                st.code(review_data["raw_response"])
+                st.code(review_data["raw_response"][:1000])
         return
     
+    if review_data.get("recovered") == "repaired":
+        st.warning("The model's response wasn't valid JSON and was repaired; issues at the end of the response may be missing. "
+                   "Run the review again for a complete report.")
+    elif review_data.get("recovered") == "reformatted":
+        st.warning(f"The model's response wasn't valid JSON, so {review_data.get('reformatted_by', 'a smaller model')} "
+                   "reformatted it. Run the review again if the report looks incomplete.")
+    
+    if review_data.get("hedged_to"):
+        st.info(f"The selected provider was slower than usual, so this review came from {review_data['hedged_to']}.")
+    
+    if review_data.get("reused_definitions"):
+        st.info(f"Only {review_data['reviewed_definitions']} changed definition(s) were sent for review; "
+                f"findings for the other {review_data['reused_definitions']} came from the cache.")
+    
+    if review_data.get("chunk_count"):
+        st.info(f"This file was too large for one request and was reviewed in {review_data['chunk_count']} parts.")
+        if review_data.get("failed_chunks"):
+            with st.expander("Parts that could not be reviewed"):
+                for failure in review_data["failed_chunks"]:
+                    st.markdown(f"- {failure}")
+    
     # Display overall rating
     st.subheader("Overall Code Quality")
     rating = review_data.get("overall_rating", 0)
@@ -430,51 +384,410 @@ def display_review_output(review_data):
         st.write("No specific recommendations provided.")
     
     # Display detailed issues
+    if issue_index is not None:
+        display_issue_list(issue_index, key)
+
+
+# Function to show the part of a streamed review that has arrived so far
+def display_partial_review(partial):
+    # Drawn on every poll of a running job, so only what the parser has completed is shown
+    if isinstance(partial.get("overall_rating"), (int, float)):
+        st.progress(min(1.0, max(0.0, partial["overall_rating"] / 10.0)), text=f"Rating: {partial['overall_rating']}/10")
+    summary = partial.get("summary")
+    if isinstance(summary, dict) and (summary.get("strengths") or summary.get("weaknesses")):
+        col1, col2 = st.columns(2)
+        for col, title, points in ((col1, "Strengths", summary.get("strengths")), (col2, "Areas for Improvement", summary.get("weaknesses"))):
+            with col:
+                if isinstance(points, list) and points:
+                    st.markdown(f"##### {title}")
+                    for point in points:
+                        st.markdown(f"- {point}")
+    issues = [issue for issue in partial.get("issues") or [] if isinstance(issue, dict)]
+    if issues:
+        st.caption(f"{len(issues)} issue(s) found so far"
+                   + (f", showing the first {ISSUES_PAGE_SIZE}" if len(issues) > ISSUES_PAGE_SIZE else ""))
+        for number, issue in enumerate(issues[:ISSUES_PAGE_SIZE], 1):
+            display_issue(number, issue)
+
+
+# Function to show the issues of a report one page at a time
+def display_issue_list(issue_index, key):
+    # Only the selected page is rendered; the counts and sort orders were computed once with the index
     st.subheader("Detailed Feedback")
-    issues = review_data.get("issues", [])
-    
-    if not issues:
+    items = issue_index["items"]
+    counts = issue_index["counts"]
+    if not items:
         st.write("No specific issues found.")
         return
     
-    # Count issues by severity
-    severity_counts = {"Critical": 0, "High": 0, "Medium": 0, "Low": 0}
-    for issue in issues:
-        severity = issue.get("severity", "Low")
-        severity_counts[severity] += 1
-    
     # Display severity counts
     st.write("##### Issue Summary")
     cols = st.columns(4)
-    with cols[0]:
-        st.markdown(f"<div class='severity-critical'>Critical: {severity_counts['Critical']}</div>", unsafe_allow_html=True)
-    with cols[1]:
-        st.markdown(f"<div class='severity-high'>High: {severity_counts['High']}</div>", unsafe_allow_html=True)
-    with cols[2]:
-        st.markdown(f"<div class='severity-medium'>Medium: {severity_counts['Medium']}</div>", unsafe_allow_html=True)
-    with cols[3]:
-        st.markdown(f"<div class='severity-low'>Low: {severity_counts['Low']}</div>", unsafe_allow_html=True)
-    
-    # Display each issue
-    for i, issue in enumerate(issues, 1):
-        severity = issue.get("severity", "Low")
-        severity_class = f"severity-{severity.lower()}"
+    for col, severity in zip(cols, SEVERITIES):
+        with col:
+            st.markdown(f"<div class='severity-{severity.lower()}'>{severity}: {counts['severity'].get(severity, 0)}</div>",
+                        unsafe_allow_html=True)
+    
+    # Filter and sort
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        severities = st.multiselect("Severity", list(counts["severity"]), key=f"issue_severity_{key}",
+                                    format_func=lambda severity: f"{severity} ({counts['severity'][severity]})")
+    with col2:
+        files = []
+        if len(counts["file"]) > 1:
+            files = st.multiselect("File", list(counts["file"]), key=f"issue_file_{key}",
+                                   format_func=lambda path: f"{path} ({counts['file'][path]})")
+    with col3:
+        rules = []
+        if len(counts["rule"]) > 1:
+            rules = st.multiselect("Rule", list(counts["rule"]), key=f"issue_rule_{key}",
+                                   format_func=lambda rule: f"{rule} ({counts['rule'][rule]})")
+    with col4:
+        sort = st.selectbox("Sort by", ISSUE_SORT_ORDERS, key=f"issue_sort_{key}")
+    
+    positions = filter_issues(issue_index, sort, severities, files, rules)
+    if not positions:
+        st.write("No issues match the filters.")
+        return
+    
+    page_count = (len(positions) + ISSUES_PAGE_SIZE - 1) // ISSUES_PAGE_SIZE
+    page = 1
+    if page_count > 1:
+        # Keyed by the filters, so a narrower selection starts again at page 1
+        filters_key = hashlib.sha1(repr((sort, severities, files, rules)).encode("utf-8")).hexdigest()[:12]
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1,
+                               key=f"issue_page_{key}_{filters_key}")
+    start = (page - 1) * ISSUES_PAGE_SIZE
+    visible = positions[start:start + ISSUES_PAGE_SIZE]
+    st.caption(f"Showing issues {start + 1}-{start + len(visible)} of {len(positions)}"
+               + (f" ({len(items)} in total)" if len(positions) != len(items) else ""))
+    
+    # Display each issue of the page
+    for number, position in enumerate(visible, start + 1):
+        display_issue(number, items[position]["issue"], items[position]["file"] if len(counts["file"]) > 1 else None)
+
+
+# Function to display a single issue
+def display_issue(i, issue, file=None):
+    severity = issue.get("severity", "Low")
+    severity_class = f"severity-{severity.lower()}"
+    location = f"{file}, line {issue.get('line', 'N/A')}" if file else f"Line {issue.get('line', 'N/A')}"
+    
+    with st.expander(f"Issue #{i}: {issue.get('description', 'Unnamed Issue')} ({location})"): 
+        st.markdown(f"<span class='{severity_class}'>Severity: {severity}</span>", unsafe_allow_html=True)
+        st.markdown(f"**Line(s):** {issue.get('line', 'N/A')}")
+        if "rule" in issue:
+            st.markdown(f"**Rule:** `{issue['rule']}`")
+        st.markdown(f"**Description:** {issue.get('description', 'No description provided.')}")
         
-        with st.expander(f"Issue #{i}: {issue.get('description', 'Unnamed Issue')} (Line {issue.get('line', 'N/A')})"): 
-            st.markdown(f"<span class='{severity_class}'>Severity: {severity}</span>", unsafe_allow_html=True)
-            st.markdown(f"**Line(s):** {issue.get('line', 'N/A')}")
-            st.markdown(f"**Description:** {issue.get('description', 'No description provided.')}")
-            
-            st.markdown("**Recommendation:**")
-            st.markdown(issue.get("recommendation", "No specific recommendation provided."))
-            
-            if "improved_code" in issue and issue["improved_code"].strip():
-                st.markdown("**Suggested Improvement:**")
-                st.markdown(f"```{issue.get('improved_code', '')}```")
+        st.markdown("**Recommendation:**")
+        st.markdown(issue.get("recommendation", "No specific recommendation provided."))
+        
+        if "improved_code" in issue and issue["improved_code"].strip():
+            st.markdown("**Suggested Improvement:**")
+            st.markdown(f"```{issue.get('improved_code', '')}```")
+
+
+# Function to get the background job manager
+@st.cache_resource
+def get_review_jobs():
+    # One worker pool for the server process, shared by every session
+    return JobManager()
+
+
+# Function to set up the session state that survives reruns
+def init_session_state():
+    # Latest result of each input, this session's unfinished jobs, and past results, newest first
+    st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    st.session_state.setdefault("results", {})
+    st.session_state.setdefault("jobs", {})
+    st.session_state.setdefault("review_history", [])
+    st.session_state.setdefault("review_count", 0)
+
+
+# Function to describe what a review was run on
+def get_review_inputs(code, language, rule_mode, **extra):
+    return dict(
+        code_hash=hashlib.sha256(code.encode("utf-8")).hexdigest(),
+        language=language,
+        provider=api_provider,
+        model=model,
+        objective=router_objective if api_provider == AUTO_PROVIDER else None,
+        depth=review_depth,
+        rule_mode=rule_mode,
+        **extra
+    )
+
 
+# Function to run a review job inside its own trace
+def run_traced(title, analyze):
+    with trace(title) as review_trace:
+        result = analyze()
+    return dict(result, trace_id=review_trace.id)
+
+
+# Function to start a review in the background
+def submit_review(source, title, inputs, analyze, **result):
+    # analyze runs on a worker thread: it must not call st.* and returns the result fields
+    try:
+        job_id = get_review_jobs().submit(functools.partial(run_traced, title, analyze), title,
+                                          owner=st.session_state["session_id"])
+    except ValueError as e:
+        st.error(str(e))
+        return
+    st.session_state["jobs"][job_id] = {"source": source, "title": title, "inputs": inputs, "result": result}
+    # The running-jobs panel is drawn at the top of the page, so start over to show it
+    st.rerun()
+
+
+# Function to keep a finished review in the session and its history
+def finish_review(source, title, inputs, **result):
+    st.session_state["review_count"] += 1
+    entry = dict(
+        id=st.session_state["review_count"],
+        source=source,
+        title=title,
+        inputs=inputs,
+        finished=time.strftime("%H:%M:%S"),
+        **result
+    )
+    st.session_state["results"][source] = entry
+    history = st.session_state["review_history"]
+    history.insert(0, entry)
+    del history[REVIEW_HISTORY_SIZE:]
+
+
+# Function to move finished jobs into the session's results
+def collect_finished_jobs():
+    jobs = get_review_jobs()
+    for job_id, pending in list(st.session_state["jobs"].items()):
+        job = jobs.get(job_id)
+        if job is not None and job["status"] not in FINISHED:
+            continue
+        del st.session_state["jobs"][job_id]
+        jobs.forget(job_id)
+        if job is None:
+            st.warning(f"The review of {pending['title']} was lost (the server may have restarted). Click Analyze to run it again.")
+        elif job["status"] == DONE:
+            finish_review(pending["source"], pending["title"], pending["inputs"], **pending["result"], **job["result"])
+        elif job["status"] == FAILED:
+            finish_review(pending["source"], pending["title"], pending["inputs"], **pending["result"],
+                          review={"error": f"The review failed: {job['error']}"})
+
+
+# Function to show this session's reviews that are still running
+def display_running_jobs():
+    jobs = get_review_jobs()
+    for job_id in list(st.session_state["jobs"]):
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        with st.container(border=True):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                progress = job["progress"]
+                if job["status"] == QUEUED:
+                    st.markdown(f"**{job['title']}**: waiting for a free worker...")
+                elif progress["total"]:
+                    st.progress(min(1.0, progress["done"] / progress["total"]), text=f"**{job['title']}**: {progress['message']}")
+                else:
+                    st.markdown(f"**{job['title']}**: {progress['message'] or 'reviewing...'}")
+                partial = job["partial"] or {}
+                if partial.get("files"):
+                    st.dataframe(partial["files"], hide_index=True)
+                if "files" not in partial:
+                    display_partial_review(partial)
+            with col2:
+                if st.button("Cancel", key=f"cancel_{job_id}"):
+                    jobs.cancel(job_id)
+                    del st.session_state["jobs"][job_id]
+                    st.rerun()
+
+
+# Function to get the issue index of a review kept in the session
+def get_issue_index(entry):
+    # Built on first display and kept with the entry, so reruns and paging don't walk the reviews again
+    if "issue_index" not in entry:
+        if "file_reviews" in entry:
+            reviews = [(file_review["path"], file_review["review"]) for file_review in entry["file_reviews"]]
+        elif "batch_reviews" in entry:
+            reviews = [(record["path"], record["review"]) for record in entry["batch_reviews"] if "review" in record]
+        else:
+            reviews = [(None, entry["review"])]
+        entry["issue_index"] = build_issue_index(reviews)
+    return entry["issue_index"]
+
+
+# Function to show a review kept in the session
+@traced("render")
+def display_saved_review(entry, current_inputs=None, key="result"):
+    inputs = entry["inputs"]
+    provider_label = inputs["provider"] if inputs["model"] is None else f"{inputs['provider']} ({inputs['model']})"
+    st.caption(f"{entry['title']} · {provider_label} · {inputs['depth']} review · finished at {entry['finished']}")
+    if current_inputs is not None and current_inputs != inputs:
+        st.warning("The code or settings changed since this review. Click Analyze to review it again.")
+    for note in entry.get("notes", []):
+        st.info(note)
+    
+    if "file_reviews" in entry:
+        if not entry["file_reviews"]:
+            st.warning("The diff has no added or changed lines to review.")
+            return
+        for file_review in entry["file_reviews"]:
+            st.divider()
+            st.subheader(file_review["path"])
+            st.caption(f"{file_review['language']}: {file_review['changed_lines']} changed lines, "
+                       f"{file_review['excerpt_lines']} lines sent for review")
+            display_review_output(file_review["review"])
+        st.divider()
+        display_issue_list(get_issue_index(entry), f"{key}_{entry['id']}")
+        st.download_button(
+            label="Download Report (JSON)",
+            data=json.dumps(entry["file_reviews"], indent=2),
+            file_name="code_review_changes.json",
+            mime="application/json",
+            key=f"download_{key}_{entry['id']}"
+        )
+        return
+    
+    if "batch_reviews" in entry:
+        display_batch_reviews(entry, key)
+        return
+    
+    review_result = entry["review"]
+    if not review_result:
+        return
+    st.success("Analysis complete! (cached result)" if review_result.get("cached") else "Analysis complete!")
+    st.divider()
+    display_review_output(review_result, get_issue_index(entry), f"{key}_{entry['id']}")
+    
+    # Download report option
+    if entry.get("file_name") and "error" not in review_result:
+        st.download_button(
+            label="Download Report (JSON)",
+            data=json.dumps(review_result, indent=2),
+            file_name=f"code_review_{entry['file_name']}.json",
+            mime="application/json",
+            key=f"download_{key}_{entry['id']}"
+        )
+
+
+# Function to show the combined review of many uploaded files
+def display_batch_reviews(entry, key):
+    records = entry["batch_reviews"]
+    if "batch_summary" not in entry:
+        entry["batch_summary"] = summarize_file_reviews(records)
+    summary = entry["batch_summary"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Files reviewed", summary["files_reviewed"])
+    col2.metric("Failed", summary["files_failed"])
+    col3.metric("Skipped", summary["files_skipped"])
+    col4.metric("Average rating", "-" if summary["average_rating"] is None else f"{summary['average_rating']}/10")
+    
+    st.dataframe([{
+        "File": record["path"],
+        "Language": record.get("language"),
+        "Rating": (record.get("review") or {}).get("overall_rating"),
+        "Issues": count_issues(record.get("review")),
+        "Status": f"skipped: {record['skipped']}" if "skipped" in record
+                  else "failed" if "error" in (record.get("review") or {}) else "done"
+    } for record in records], hide_index=True)
+    
+    reviewed = [record for record in records if "review" in record]
+    if reviewed:
+        selected = st.selectbox("Show the review of", reviewed, format_func=lambda record: record["path"],
+                                key=f"batch_file_{key}_{entry['id']}")
+        display_review_output(selected["review"])
+        st.divider()
+        display_issue_list(get_issue_index(entry), f"{key}_{entry['id']}")
+    
+    st.download_button(
+        label="Download Combined Report (JSON)",
+        data=json.dumps({"summary": summary, "files": records}, indent=2),
+        file_name="code_review_files.json",
+        mime="application/json",
+        key=f"download_{key}_{entry['id']}"
+    )
+
+
+# Function to review one file on a job thread
+def review_code_job(*args):
+    return {"review": analyze_code_with_rules(*args)}
+
+
+# Function to review the changed files of a diff on a job thread
+def review_changes_job(diff_text, context_lines, api_key, provider, model, depth, use_cache, stream, hedge, objective):
+    total = sum(1 for file_diff in parse_unified_diff(diff_text) if file_diff["new_path"] is not None and file_diff["hunks"])
+    file_reviews = []
+    for file_review in review_diff(
+        diff_text,
+        lambda code, language: analyze_code_with_rules(
+            code, language, api_key, provider, model, depth, "Off", use_cache, stream, hedge, objective
+        ),
+        context_lines
+    ):
+        file_reviews.append(file_review)
+        report_progress(len(file_reviews), total, f"Reviewed {file_review['path']}")
+        raise_if_cancelled()
+    return {"file_reviews": file_reviews}
+
+
+# Function to review many uploaded files and archives on a job thread
+def review_uploads_job(uploads, api_key, provider, model, depth, rule_mode, use_cache, hedge, objective):
+    # Files are reviewed side by side, so they aren't streamed
+    records = review_uploaded_files(
+        [(name, io.BytesIO(data)) for name, data in uploads],
+        lambda code, language: analyze_code_with_rules(
+            code, language, api_key, provider, model, depth, rule_mode, use_cache, False, hedge, objective
+        )
+    )
+    return {"batch_reviews": records}
+
+
+# Function to show the stage timings of recent reviews
+def display_debug_panel():
+    tracer = get_tracer()
+    st.divider()
+    st.markdown("### Debug")
+    st.markdown("##### Stage Timings")
+    st.dataframe(tracer.stage_summary(), hide_index=True)
+    
+    trace_ids = {entry["trace_id"] for entry in st.session_state["review_history"] if "trace_id" in entry}
+    traces = tracer.get_traces(trace_ids)
+    if traces:
+        st.markdown("##### Recent Reviews")
+        selected_trace = st.selectbox(
+            "Trace",
+            traces,
+            format_func=lambda trace_data: f"{trace_data['name']} ({trace_data['duration']:.2f}s)",
+            key="debug_trace"
+        )
+        first_start = min((span_data["start"] for span_data in selected_trace["spans"]), default=selected_trace["started"])
+        st.dataframe([{
+            "Stage": span_data["name"],
+            "Start (ms)": round(1000 * (span_data["start"] - first_start), 1),
+            "Duration (ms)": round(1000 * span_data["duration"], 1),
+            "Provider": span_data["attributes"].get("provider"),
+            "Tokens in": span_data["attributes"].get("prompt_tokens"),
+            "Tokens out": span_data["attributes"].get("output_tokens"),
+            "Error": span_data["error"]
+        } for span_data in sorted(selected_trace["spans"], key=lambda span_data: span_data["start"])], hide_index=True)
+        if selected_trace["dropped_spans"]:
+            st.caption(f"{selected_trace['dropped_spans']} more spans were not kept")
+        st.download_button("Download Traces (JSON)", data=json.dumps(traces, indent=2), file_name="review_traces.json",
+                           mime="application/json", key="download_traces")
+    
+    st.download_button("Download Metrics (Prometheus)", data=tracer.render_prometheus(), file_name="metrics.txt",
+                       mime="text/plain", key="download_metrics")
+
+
+init_session_state()
+collect_finished_jobs()
+display_running_jobs()
 
 # Create tabs for different input methods
-tab1, tab2 = st.tabs(["Paste Code", "Upload File"])
+tab1, tab2, tab3 = st.tabs(["Paste Code", "Upload File", "History"])
 
 with tab1:
     # Code input
@@ -484,79 +797,193 @@ with tab1:
     )
     
     code_input = st.text_area("Paste your code here:", height=300)
+    pasted_inputs = get_review_inputs(code_input, input_language, rule_check_mode)
     
     # Process input
     if st.button("Analyze Code", key="analyze_pasted", disabled=not code_input.strip()):
         if not code_input.strip():
             st.error("Please paste some code to analyze.")
         else:
-            with st.spinner("Analyzing your code..."):
-                # Detect language if auto-detect is selected
-                detected_language = "Unknown"
-                if input_language == "Auto-detect":
-                    detected_language = detect_language(code_input)
-                    st.info(f"Detected language: {detected_language}")
-                else:
-                    detected_language = input_language
-                
-                # Analyze code
-                review_result = analyze_code(
+            # Detect language if auto-detect is selected
+            detected_language = "Unknown"
+            if input_language == "Auto-detect":
+                detected_language = detect_language(code_input)
+                notes = [f"Detected language: {detected_language}"]
+            else:
+                detected_language = input_language
+                notes = []
+            
+            # Analyze code in the background; the page polls the job
+            submit_review(
+                "pasted",
+                f"pasted {detected_language} code",
+                pasted_inputs,
+                functools.partial(
+                    review_code_job,
                     code_input,
                     detected_language,
                     api_key,
                     api_provider,
                     model,
-                    review_depth
-                )
-                
-                if review_result:
-                    st.success("Analysis complete!")
-                    st.divider()
-                    display_review_output(review_result)
+                    review_depth,
+                    rule_check_mode,
+                    use_review_cache,
+                    stream_output,
+                    hedge_requests,
+                    router_objective
+                ),
+                notes=notes
+            )
+    
+    # Results are kept in the session, so reruns show them again without calling the provider
+    if "pasted" in st.session_state["results"]:
+        display_saved_review(st.session_state["results"]["pasted"], pasted_inputs)
 
 with tab2:
-    # File upload
-    uploaded_file = st.file_uploader(
-        "Upload your code file:",
-        type=["py", "js", "ts", "java", "cpp", "c", "go", "rs", "php", "rb", "html", "css", "cs", "kt", "swift"]
+    upload_mode = st.radio(
+        "Review",
+        ["Whole file", "Changes only (diff)"],
+        horizontal=True,
+        help="Review only the changed lines of a pull request, with a few lines of context around each change"
     )
     
-    if uploaded_file is not None:
-        # Read and display the file
-        file_contents = uploaded_file.getvalue().decode("utf-8")
-        st.code(file_contents[:1000] + ("..." if len(file_contents) > 1000 else ""))
+    if upload_mode == "Whole file":
+        # File upload: one file, several files, or zip / tar.gz archives of a project
+        uploaded_files = st.file_uploader(
+            "Upload your code files or an archive (.zip, .tar.gz):",
+            type=UPLOAD_TYPES,
+            accept_multiple_files=True
+        )
+        uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 and not is_archive(uploaded_files[0].name) else None
         
-        # Process uploaded file
-        if st.button("Analyze Code", key="analyze_uploaded"):
-            with st.spinner("Analyzing your code..."):
+        uploaded_inputs = None
+        if len(uploaded_files) > 1 or (uploaded_files and uploaded_file is None):
+            names = ", ".join(upload.name for upload in uploaded_files)
+            st.caption(f"{len(uploaded_files)} upload(s): {names}. Each source file is reviewed on its own, several at a time.")
+            # Names and sizes stand in for the contents, which may be large archives
+            uploaded_inputs = get_review_inputs(
+                "\n".join(f"{upload.name}:{upload.size}" for upload in uploaded_files), None, rule_check_mode,
+                file_name=names
+            )
+            
+            if st.button("Analyze Files", key="analyze_uploaded_files"):
+                submit_review(
+                    "uploaded",
+                    names if len(uploaded_files) == 1 else f"{len(uploaded_files)} uploads",
+                    uploaded_inputs,
+                    functools.partial(
+                        review_uploads_job,
+                        [(upload.name, upload.getvalue()) for upload in uploaded_files],
+                        api_key,
+                        api_provider,
+                        model,
+                        review_depth,
+                        rule_check_mode,
+                        use_review_cache,
+                        hedge_requests,
+                        router_objective
+                    )
+                )
+        
+        elif uploaded_file is not None:
+            # Read and display the file
+            file_contents = uploaded_file.getvalue().decode("utf-8")
+            st.code(file_contents[:1000] + ("..." if len(file_contents) > 1000 else ""))
+            uploaded_inputs = get_review_inputs(file_contents, None, rule_check_mode, file_name=uploaded_file.name)
+            
+            # Process uploaded file
+            if st.button("Analyze Code", key="analyze_uploaded"):
                 # Detect language from file extension
                 detected_language = detect_language(file_contents, uploaded_file.name)
-                st.info(f"Detected language: {detected_language}")
                 
-                # Analyze code
-                review_result = analyze_code(
-                    file_contents,
-                    detected_language,
-                    api_key,
-                    api_provider,
-                    model,
-                    review_depth
+                # Analyze code in the background; another file can be submitted while it runs
+                submit_review(
+                    "uploaded",
+                    uploaded_file.name,
+                    uploaded_inputs,
+                    functools.partial(
+                        review_code_job,
+                        file_contents,
+                        detected_language,
+                        api_key,
+                        api_provider,
+                        model,
+                        review_depth,
+                        rule_check_mode,
+                        use_review_cache,
+                        stream_output,
+                        hedge_requests,
+                        router_objective
+                    ),
+                    notes=[f"Detected language: {detected_language}"],
+                    file_name=uploaded_file.name
                 )
-                
-                if review_result:
-                    st.success("Analysis complete!")
-                    st.divider()
-                    display_review_output(review_result)
-                    
-                    # Download report option
-                    if "error" not in review_result:
-                        report_json = json.dumps(review_result, indent=2)
-                        st.download_button(
-                            label="Download Report (JSON)",
-                            data=report_json,
-                            file_name=f"code_review_{uploaded_file.name}.json",
-                            mime="application/json"
-                        )
+        
+        if "uploaded" in st.session_state["results"]:
+            display_saved_review(st.session_state["results"]["uploaded"], uploaded_inputs)
+    
+    else:
+        # Comparing revisions runs git on the server, so it's only offered inside DIFF_REPO_ROOT
+        diff_sources = ["Diff or patch file", "Git revisions"] if DIFF_REPO_ROOT else ["Diff or patch file"]
+        diff_source = st.radio("Changes from", diff_sources, horizontal=True)
+        
+        if diff_source == "Diff or patch file":
+            diff_file = st.file_uploader("Upload a unified diff:", type=["diff", "patch"])
+        else:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                repo_path = st.text_input("Repository path", value=".", help=f"Relative to {DIFF_REPO_ROOT}")
+            with col2:
+                base_revision = st.text_input("Base revision", value="HEAD~1")
+            with col3:
+                head_revision = st.text_input("Head revision", value="HEAD", help="Leave empty to compare with the working tree")
+        
+        context_lines = st.number_input(
+            "Context lines",
+            min_value=0,
+            max_value=50,
+            value=DIFF_CONTEXT_LINES,
+            help="Unchanged lines sent with each change. Local rule checks are skipped, since they need whole files."
+        )
+        
+        ready = diff_file is not None if diff_source == "Diff or patch file" else bool(base_revision.strip())
+        if st.button("Analyze Changes", key="analyze_diff", disabled=not ready):
+            try:
+                if diff_source == "Diff or patch file":
+                    diff_text = diff_file.getvalue().decode("utf-8")
+                    diff_title = diff_file.name
+                else:
+                    diff_text = get_git_diff(resolve_repo_path(repo_path), base_revision.strip(), head_revision.strip() or None, context_lines)
+                    diff_title = f"{base_revision.strip()}..{head_revision.strip() or 'working tree'}"
+            except (ValueError, UnicodeDecodeError) as e:
+                st.error(f"Could not read the changes: {str(e)}")
+                diff_text = None
+            
+            if diff_text is not None:
+                submit_review(
+                    "diff",
+                    f"changes in {diff_title}",
+                    get_review_inputs(diff_text, None, "Off"),
+                    functools.partial(
+                        review_changes_job, diff_text, context_lines, api_key, api_provider, model, review_depth,
+                        use_review_cache, stream_output, hedge_requests, router_objective
+                    )
+                )
+        
+        if "diff" in st.session_state["results"]:
+            display_saved_review(st.session_state["results"]["diff"])
+
+with tab3:
+    history = st.session_state["review_history"]
+    if not history:
+        st.write("Reviews you run in this session are listed here.")
+    else:
+        selected_entry = st.selectbox(
+            f"Reviews in this session (last {REVIEW_HISTORY_SIZE})",
+            history,
+            format_func=lambda entry: f"#{entry['id']} {entry['finished']}: {entry['title']}"
+        )
+        display_saved_review(selected_entry, key="history")
 
 # Footer
 st.divider()
@@ -565,3 +992,12 @@ st.markdown("""
     AI Code Review Assistant | Built with Streamlit | Supports multiple AI providers
 </div>
 """, unsafe_allow_html=True)
+
+if show_debug_panel:
+    with st.sidebar:
+        display_debug_panel()
+
+# While this session has reviews running, check on them again shortly (a widget change reruns sooner)
+if st.session_state["jobs"]:
+    time.sleep(REVIEW_JOB_POLL_INTERVAL)
+    st.rerun()
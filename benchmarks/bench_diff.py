@@ -0,0 +1,66 @@
+# Compare prompt sizes of whole-file and diff-only reviews on real commits
+#
+# Run from the repository root:
+#     python benchmarks/bench_diff.py                      # last 10 commits of this repo
+#     python benchmarks/bench_diff.py --repo ../other --commits 50 --context 5
+#
+# For every commit, each changed file is turned into the prompt a whole-file
+# review sends and the prompt a diff-only review sends (utils.diff excerpt
+# with --context lines around each change). Provider latency grows with the
+# tokens processed, so the token ratio is also the expected speed-up.
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunking import estimate_tokens
+from utils.diff import build_excerpt, get_git_diff, parse_unified_diff
+from utils.language import detect_language
+from utils.prompts import create_review_prompt
+
+
+def git(repo, *args):
+    return subprocess.run(["git", "-C", repo, *args], capture_output=True, text=True, check=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens of whole-file vs diff-only reviews")
+    parser.add_argument("--repo", default=".")
+    parser.add_argument("--commits", type=int, default=10)
+    parser.add_argument("--context", type=int, default=3)
+    parser.add_argument("--provider", default="OpenAI")
+    args = parser.parse_args()
+
+    commits = git(args.repo, "rev-list", "--no-merges", f"--max-count={args.commits}", "HEAD").split()
+    print(f"{'commit':<10} {'files':>5} {'whole-file tokens':>18} {'diff tokens':>12} {'ratio':>7}")
+    total_full = total_diff = 0
+    for commit in commits:
+        try:
+            diff_text = get_git_diff(args.repo, f"{commit}~1", commit, args.context)
+        except ValueError:
+            continue  # root commit
+        full_tokens = diff_tokens = files = 0
+        for file_diff in parse_unified_diff(diff_text):
+            if file_diff["new_path"] is None or not file_diff["hunks"]:
+                continue
+            code, _ = build_excerpt(file_diff["hunks"], args.context)
+            if not code.strip():
+                continue
+            new_file = git(args.repo, "show", f"{commit}:{file_diff['new_path']}")
+            language = detect_language(new_file, file_diff["new_path"])
+            full_tokens += estimate_tokens(create_review_prompt(new_file, language, "Standard", args.provider))
+            diff_tokens += estimate_tokens(create_review_prompt(code, language, "Standard", args.provider))
+            files += 1
+        if files:
+            print(f"{commit[:10]:<10} {files:>5} {full_tokens:>18,} {diff_tokens:>12,} {full_tokens / diff_tokens:>6.1f}x")
+            total_full += full_tokens
+            total_diff += diff_tokens
+
+    if total_diff:
+        print(f"{'total':<10} {'':>5} {total_full:>18,} {total_diff:>12,} {total_full / total_diff:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
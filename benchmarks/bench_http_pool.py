@@ -0,0 +1,75 @@
+# Benchmark pooled keep-alive sessions against one-shot requests calls
+#
+# Run from the repository root:
+#     python benchmarks/bench_http_pool.py
+#
+# Starts a local HTTP/1.1 mock of a chat-completions endpoint and compares
+# the per-request latency of requests.post (new connection every call) with
+# utils.http_client.http_post (shared connection pool). Against a real
+# provider the gap is larger because each new connection also pays for the
+# TLS handshake and a longer round trip.
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from utils.http_client import close_sessions, http_post
+
+RESPONSE = json.dumps({"choices": [{"message": {"content": '{"overall_rating": 8, "issues": []}'}}]}).encode()
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    disable_nagle_algorithm = True  # like real API servers, avoid delayed-ACK stalls
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(post, url, payload, count):
+    """Return per-request latencies in milliseconds"""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        post(url, json=payload, timeout=5).json()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main(count=500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProviderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    payload = {"model": "mock", "messages": [{"role": "user", "content": "x" * 2000}]}
+
+    # Warm up both paths once
+    requests.post(url, json=payload, timeout=5)
+    http_post(url, json=payload, timeout=5)
+
+    print(f"{'client':<22} {'mean (ms)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, post in (("requests.post", requests.post), ("pooled http_post", http_post)):
+        latencies = sorted(measure(post, url, payload, count))
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:<22} {statistics.mean(latencies):>10.3f} {statistics.median(latencies):>9.3f} {p95:>9.3f}")
+
+    close_sessions()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Microbenchmark for the combined-pattern JavaScript rule scanner
+#
+# Run from the repository root:
+#     python benchmarks/bench_js_scanner.py
+#
+# Scans synthetic bundled JavaScript of growing size and prints the scan
+# time and throughput. The time per MB should stay flat as the input grows.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rule_engine.javascript_rules import JAVASCRIPT_RULES, scan_javascript
+
+# A slice of minified-bundle-like code: strings, templates, comments and rule hits
+BUNDLE_SNIPPET = (
+    '!function(e){var t={};function n(r){if(t[r])return t[r].exports;'
+    'var o=t[r]={i:r,l:!1,exports:{}};return e[r].call(o.exports,o,o.exports,n),o.l=!0,o.exports}'
+    'n.m=e,n.c=t,n.d=function(e,t,r){n.o(e,t)||Object.defineProperty(e,t,{enumerable:!0,get:r})}}([]);\n'
+    'const msg="var x == eval(1) // not code",tpl=`line ${a==b} /* still a template */`;\n'
+    '/* banner: var eval == forEach */ items.forEach(function(i){if(i!=null&&i.id===3){log(\'a != b\')}});\n'
+    'let s=\'it\\\'s == fine\';window.eval(src);new Function("return this")();\n'
+)
+
+
+def make_bundle(size_mb):
+    """Build roughly size_mb megabytes of bundled JavaScript"""
+    repeats = int(size_mb * 1024 * 1024 / len(BUNDLE_SNIPPET)) + 1
+    return BUNDLE_SNIPPET * repeats
+
+
+def bench(code, rules, rounds=3):
+    """Return the best wall time of several scans"""
+    best = float("inf")
+    findings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        findings = scan_javascript(code, rules)
+        best = min(best, time.perf_counter() - start)
+    return best, len(findings)
+
+
+def main():
+    rules = frozenset(JAVASCRIPT_RULES)
+    print(f"{'size':>8} {'time (ms)':>10} {'ms/MB':>8} {'MB/s':>8} {'findings':>9}")
+    for size_mb in (0.5, 1, 2, 4, 8):
+        code = make_bundle(size_mb)
+        elapsed, count = bench(code, rules)
+        mb = len(code) / (1024 * 1024)
+        print(f"{mb:>6.1f}MB {elapsed * 1000:>10.1f} {elapsed * 1000 / mb:>8.1f} {mb / elapsed:>8.1f} {count:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Benchmark and fuzz corpus for the review JSON extractor
+#
+# Run from the repository root:
+#     python benchmarks/bench_json_extract.py            # timing table
+#     python benchmarks/bench_json_extract.py --fuzz 5000
+#
+# The timing table compares utils.json_extract.extract_json with the greedy
+# regex the providers used before, on brace-heavy output where the regex
+# backtracks from every '{' to the end of the text. The fuzz mode builds
+# adversarial model outputs around a known review and checks that the
+# extractor returns exactly that review (or None when there is none).
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_extract import extract_json
+
+LEGACY_PATTERN = re.compile(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})')
+
+
+def legacy_extract(text):
+    """The regex extraction the providers used before extract_json"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = LEGACY_PATTERN.search(text)
+        if match:
+            try:
+                return json.loads((match.group(1) or match.group(2)).strip())
+            except json.JSONDecodeError:
+                pass
+    return None
+
+
+def adversarial_text(size):
+    """Brace-heavy output with no closing brace, e.g. a truncated code dump"""
+    return ("Here is code: if (x) { y = {" * (size // 28 + 1))[:size]
+
+
+def best_time(func, text, rounds=3):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark():
+    print(f"{'chars':>8} {'regex (ms)':>11} {'extract_json (ms)':>18}")
+    for size in (1000, 2000, 4000, 8000, 16000, 256000):
+        text = adversarial_text(size)
+        fast = best_time(extract_json, text) * 1000
+        # The regex is quadratic: skip it where it would take minutes
+        slow = f"{best_time(legacy_extract, text, rounds=1) * 1000:>11.1f}" if size <= 16000 else f"{'(skipped)':>11}"
+        print(f"{size:>8} {slow} {fast:>18.3f}")
+
+
+# Building blocks for adversarial outputs
+PROSE = [
+    "Sure! Here is the review:",
+    "I found a few issues {see below}.",
+    "Use {} or dict() to build maps, and {x} placeholders in templates.",
+    "Braces like } and { appear in prose too.",
+    "Note: \"quoted text\" and a stray quote \" here.",
+    "```python\nif x: d = {1: 2}\n```",
+    "{ this is not json }",
+    "{'single': 'quotes'}",
+]
+STRING_NOISE = ["{", "}", "\\\"", "\\\\", "```", "[", "]", ":", ",", "é", "\\n", "{\"", "\"}"]
+
+
+def random_string(rng):
+    return "".join(rng.choice(STRING_NOISE + ["a", "b", " "]) for _ in range(rng.randint(0, 12)))
+
+
+def random_review(rng):
+    return {
+        "overall_rating": rng.randint(1, 10),
+        "summary": {"strengths": [random_string(rng)], "weaknesses": [random_string(rng) for _ in range(rng.randint(0, 3))]},
+        "key_recommendations": [random_string(rng) for _ in range(rng.randint(0, 3))],
+        "issues": [
+            {
+                "line": rng.choice([rng.randint(1, 500), f"{rng.randint(1, 50)}-{rng.randint(51, 99)}"]),
+                "severity": rng.choice(["Critical", "High", "Medium", "Low"]),
+                "description": random_string(rng),
+                "recommendation": random_string(rng),
+                "improved_code": "def f():\n    return {'a': [1, 2]}" if rng.random() < 0.5 else random_string(rng)
+            }
+            for _ in range(rng.randint(0, 4))
+        ]
+    }
+
+
+def adversarial_case(rng):
+    """Return (model output, expected extraction) for one fuzz case"""
+    review = random_review(rng)
+    body = json.dumps(review, indent=rng.choice([None, 2, 4]), ensure_ascii=rng.random() < 0.5)
+    kind = rng.choice(["bare", "fenced", "prose", "decoy", "truncated", "trailing"])
+    before = "\n".join(rng.sample(PROSE, rng.randint(1, 3)))
+    if kind == "bare":
+        return body, review
+    if kind == "fenced":
+        return f"```json\n{body}\n```", review
+    if kind == "prose":
+        return f"{before}\n{body}\n{rng.choice(PROSE)}", review
+    if kind == "decoy":
+        # A balanced but invalid object precedes the real one
+        return f"{before}\n{{\"draft\": true, oops}}\n{body}", review
+    if kind == "trailing":
+        return f"{body}\n\nAlso consider {{\"extra\": 1}} {{ and more", review
+    cut = rng.randint(1, len(body) - 1)
+    return f"{before}\n{body[:cut]}", None
+
+
+def run_fuzz(count, seed):
+    rng = random.Random(seed)
+    failures = 0
+    for i in range(count):
+        text, expected = adversarial_case(rng)
+        result = extract_json(text)
+        if result != expected:
+            failures += 1
+            if failures <= 5:
+                print(f"case {i} failed:\n{text[:400]}\n-> {str(result)[:200]}\n")
+    print(f"{count - failures}/{count} fuzz cases passed (seed {seed})")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and fuzz the review JSON extractor")
+    parser.add_argument("--fuzz", type=int, default=0, help="number of adversarial outputs to check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.fuzz:
+        sys.exit(0 if run_fuzz(args.fuzz, args.seed) else 1)
+    run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Exercise the retry layer against a local fault-injecting HTTP server
+#
+# Run from the repository root:
+#     python benchmarks/bench_retry.py
+#     python benchmarks/bench_retry.py --requests 500 --fault-rate 0.5
+#
+# The server fails a share of requests the way providers do: 429 with
+# Retry-After, Hugging Face's 503 "model loading" with estimated_time, bare
+# 500/502 and dropped connections. The script compares one-shot requests
+# with utils.http_client.http_post (with the default retry budget and with
+# the budget lifted), then checks that a deadline bounds a hanging upstream
+# and that the retry budget caps load during an outage.
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Short delays so the run takes seconds; must be set before utils.config is imported
+os.environ.setdefault("RETRY_BASE_DELAY", "0.05")
+os.environ.setdefault("RETRY_MAX_DELAY", "0.5")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from utils.config import RETRY_BUDGET_RATIO
+from utils.http_client import http_post, close_sessions
+from utils.retry import deadline, get_retry_budget
+
+attempts = {"count": 0}
+attempts_lock = threading.Lock()
+
+
+class FaultyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    fault_rate = 0.3
+    rng = random.Random(0)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with attempts_lock:
+            attempts["count"] += 1
+            roll = self.rng.random()
+
+        if self.path == "/hang":
+            time.sleep(5)
+        if self.path == "/down" or roll < self.fault_rate:
+            fault = self.rng.choice(["429", "loading", "500", "502", "drop"]) if self.path != "/down" else "503"
+            if fault == "429":
+                return self._send(429, {"error": "rate limited"}, {"Retry-After": "0.1"})
+            if fault == "loading":
+                return self._send(503, {"error": "Model is currently loading", "estimated_time": 0.1})
+            if fault == "drop":
+                self.close_connection = True
+                self.connection.shutdown(2)
+                return
+            return self._send(int(fault), {"error": "upstream failure"})
+        return self._send(200, {"ok": True})
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def one_shot(url):
+    try:
+        return requests.post(url, json={}, timeout=5).status_code
+    except requests.exceptions.RequestException:
+        return None
+
+
+def with_retries(url):
+    try:
+        return http_post(url, json={}).status_code
+    except requests.exceptions.RequestException:
+        return None
+
+
+def run(label, func, url, count, workers):
+    attempts["count"] = 0
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        status = func(url)
+        latencies.append(time.perf_counter() - start)
+        return status
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = list(executor.map(timed, range(count)))
+    latencies.sort()
+    ok = sum(status == 200 for status in statuses)
+    print(f"{label:<18} {ok / count:>8.1%} {attempts['count'] / count:>9.2f} "
+          f"{latencies[len(latencies) // 2] * 1000:>9.1f} {latencies[int(len(latencies) * 0.95)] * 1000:>9.1f}")
+    return ok / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check retries, deadlines and retry budgets against injected faults")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--fault-rate", type=float, default=0.3)
+    args = parser.parse_args()
+
+    FaultyHandler.fault_rate = args.fault_rate
+    server, base_url = start_server()
+    passed = True
+
+    print(f"{'client':<18} {'success':>8} {'attempts':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    baseline = run("one-shot", one_shot, f"{base_url}/flaky", args.requests, args.workers)
+    budgeted = run("http_post", with_retries, f"{base_url}/flaky", args.requests, args.workers)
+    passed &= budgeted > baseline
+
+    # Without the budget, 4 independent attempts get almost every request through
+    budget = get_retry_budget(base_url)
+    budget.ratio, budget.capacity, budget.balance = 1e9, 1e9, 1e9
+    unlimited = run("http_post, no cap", with_retries, f"{base_url}/flaky", args.requests, args.workers)
+    passed &= unlimited >= 1 - args.fault_rate ** 4 - 0.02
+    budget.ratio, budget.capacity, budget.balance = RETRY_BUDGET_RATIO, 10.0, 0.0
+
+    # A hanging upstream must not outlive the deadline
+    start = time.perf_counter()
+    with deadline(1.0):
+        status = with_retries(f"{base_url}/hang")
+    elapsed = time.perf_counter() - start
+    print(f"deadline 1.0s on a hanging upstream: gave up after {elapsed:.2f}s (status {status})")
+    passed &= status is None and elapsed < 1.5
+
+    # During a full outage retries are capped by the budget, not multiplied by the attempt limit
+    close_sessions()
+    attempts["count"] = 0
+    for _ in range(100):
+        with_retries(f"{base_url}/down")
+    print(f"outage: {attempts['count']} attempts for 100 requests (up to 400 without a budget)")
+    passed &= attempts["count"] < 100 * (1 + RETRY_BUDGET_RATIO) + 20
+
+    server.shutdown()
+    print("PASS" if passed else "FAIL")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
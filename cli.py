@@ -0,0 +1,181 @@
+# Headless batch review: walk a directory and write one JSON line per file
+#
+#     python cli.py src/ --provider Groq --provider "OpenRouter:anthropic/claude-3-haiku" \
+#         --workers 16 --output reviews.jsonl
+#
+# Reviews run on a bounded thread pool. Each provider also has its own
+# concurrency limit (PROVIDER_CONCURRENCY in utils/config.py); when several
+# providers are given, every file goes to whichever has a free slot.
+# Results are written as soon as each file finishes, in completion order.
+import argparse
+import contextvars
+import fnmatch
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.config import PROVIDER_CONFIGS, PROVIDER_CONCURRENCY, get_models_for_provider
+from utils.language import EXTENSION_LANGUAGES, SKIP_DIRS, detect_language
+from utils.rate_limit import concurrency_limits, make_concurrency_limits
+from utils.review import analyze_code
+from utils.tracing import get_tracer
+from rule_engine import supports_language, review_with_rules
+
+
+class ProviderSlots:
+    """Hand out (provider, model) targets, at most the provider's limit at a time"""
+
+    def __init__(self, targets, limits=PROVIDER_CONCURRENCY):
+        self._free = {target: limits.get(target[0], 4) for target in targets}
+        self._condition = threading.Condition()
+
+    def capacity(self):
+        """Total number of reviews that can run at once"""
+        return sum(self._free.values())
+
+    def acquire(self):
+        """Block until some provider has a free slot and return its target"""
+        with self._condition:
+            while True:
+                target = max(self._free, key=self._free.get)
+                if self._free[target] > 0:
+                    self._free[target] -= 1
+                    return target
+                self._condition.wait()
+
+    def release(self, target):
+        """Give a slot back"""
+        with self._condition:
+            self._free[target] += 1
+            self._condition.notify()
+
+
+# Function to find the files to review under the given paths
+def find_code_files(paths, exclude=(), max_bytes=None):
+    """Yield reviewable source files, skipping hidden and vendored directories"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS)
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if os.path.splitext(name)[1].lower() not in EXTENSION_LANGUAGES:
+                    continue
+                if any(fnmatch.fnmatch(file_path, pattern) for pattern in exclude):
+                    continue
+                if max_bytes and os.path.getsize(file_path) > max_bytes:
+                    continue
+                yield file_path
+
+
+# Function to parse a --provider argument
+def parse_target(value):
+    """Turn "Provider" or "Provider:model" into (provider, model)"""
+    provider, _, model = value.partition(":")
+    if provider not in PROVIDER_CONFIGS:
+        raise argparse.ArgumentTypeError(f"unknown provider {provider!r} (choose from {', '.join(PROVIDER_CONFIGS)})")
+    models = get_models_for_provider(provider)
+    return provider, model or models[0]
+
+
+# Function to review one file
+def review_file(path, slots, depth, rule_mode, use_cache):
+    """Review a file and return its JSONL record"""
+    record = {"path": path}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        record["error"] = f"Could not read file: {str(e)}"
+        return record
+
+    start = time.perf_counter()
+    try:
+        language = detect_language(code, path)
+        record["language"] = language
+
+        if rule_mode != "off" and supports_language(language):
+            rule_review = review_with_rules(code, language)
+            if rule_mode == "instead":
+                record.update(provider="rules", model=None, review=rule_review, elapsed=round(time.perf_counter() - start, 3))
+                return record
+            record["rule_findings"] = rule_review.get("issues", [])
+
+        provider, model = slots.acquire()
+        record.update(provider=provider, model=model)
+        try:
+            review = analyze_code(code, language, None, provider, model, depth, use_cache)
+        finally:
+            slots.release((provider, model))
+    except Exception as e:
+        # One broken file shouldn't stop the batch
+        record.update(error=f"The review failed: {str(e) or type(e).__name__}", elapsed=round(time.perf_counter() - start, 3))
+        return record
+
+    record.update(provider=provider, model=model, review=review, elapsed=round(time.perf_counter() - start, 3))
+    if not review or "error" in review:
+        record["error"] = (review or {}).get("error", "No review returned")
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review every source file under a directory and write JSON lines")
+    parser.add_argument("paths", nargs="+", help="files or directories to review")
+    parser.add_argument("--provider", dest="targets", action="append", type=parse_target, metavar="PROVIDER[:MODEL]",
+                        help="provider to use, repeat to spread files over several (default: Ollama)")
+    parser.add_argument("--depth", choices=["Basic", "Standard", "Comprehensive"], default="Standard")
+    parser.add_argument("--workers", type=int, default=16, help="maximum reviews in flight across all providers")
+    parser.add_argument("--rules", choices=["before", "instead", "off"], default="before",
+                        help="run the local rule checks before or instead of the AI review")
+    parser.add_argument("--output", "-o", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB", help="skip matching paths")
+    parser.add_argument("--max-bytes", type=int, default=1_000_000, help="skip files larger than this")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached reviews")
+    parser.add_argument("--metrics", metavar="FILE", help="write stage timings and token counts in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    targets = args.targets or [parse_target("Ollama")]
+    slots = ProviderSlots(targets)
+    # Large files are reviewed in parallel chunks, so the providers' limits also
+    # apply to each request, not only to the files handed out by slots
+    concurrency_limits.set(make_concurrency_limits({provider: PROVIDER_CONCURRENCY.get(provider, 4) for provider, _ in targets}))
+    files = list(find_code_files(args.paths, args.exclude, args.max_bytes))
+    workers = max(1, min(args.workers, slots.capacity(), len(files) or 1))
+    print(f"Reviewing {len(files)} files with {workers} workers", file=sys.stderr)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review")
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, review_file, path, slots, args.depth, args.rules, not args.no_cache)
+                   for path in files]
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            if "error" in record:
+                failures += 1
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            print(f"[{done}/{len(files)}] {record['path']}{' (failed)' if 'error' in record else ''}", file=sys.stderr)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Reviewed {len(files)} files in {time.perf_counter() - start:.1f}s, {failures} failed", file=sys.stderr)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(get_tracer().render_prometheus())
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
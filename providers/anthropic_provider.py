@@ -0,0 +1,116 @@
+import json
+
+from utils.config import ANTHROPIC_API_KEY, get_setup_instructions
+from utils.json_extract import parse_review_response
+from utils.http_client import http_post, async_post
+from providers.streaming import ProviderStreamError, iter_sse_data
+
+# Function to check if Anthropic API is available
+def is_anthropic_available(api_key=None):
+    """Check if an Anthropic API key is available"""
+    return bool(api_key or ANTHROPIC_API_KEY)
+
+# Function to build the Anthropic request
+def build_anthropic_request(model, prompt, api_key):
+    """Build the headers and payload for a messages request"""
+    headers = {
+        "Content-Type": "application/json",
+        "x-api-key": api_key or ANTHROPIC_API_KEY,
+        "anthropic-version": "2023-06-01"
+    }
+
+    payload = {
+        "model": model,
+        "max_tokens": 4000,
+        "temperature": 0.2,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+    return headers, payload
+
+# Function to analyze code with Anthropic
+def analyze_with_anthropic(code, language, model, prompt, api_key=None):
+    """Analyze code using the Anthropic API (api_key overrides ANTHROPIC_API_KEY)"""
+    if not is_anthropic_available(api_key):
+        return {
+            "error": "Please provide an Anthropic API key.",
+            "setup_instructions": get_setup_instructions("Anthropic")
+        }
+
+    headers, payload = build_anthropic_request(model, prompt, api_key)
+
+    try:
+        response = http_post(
+            "https://api.anthropic.com/v1/messages",
+            headers=headers,
+            json=payload
+        )
+
+        if response.status_code == 200:
+            response_data = response.json()
+            result = response_data["content"][0]["text"]
+            # Extract the review JSON from the response
+            return parse_review_response(result, "Anthropic")
+        else:
+            return {
+                "error": f"Anthropic API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call Anthropic API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to analyze code with Anthropic without blocking a thread
+async def analyze_with_anthropic_async(code, language, model, prompt, api_key=None):
+    """Async version of analyze_with_anthropic"""
+    if not is_anthropic_available(api_key):
+        return {
+            "error": "Please provide an Anthropic API key.",
+            "setup_instructions": get_setup_instructions("Anthropic")
+        }
+
+    headers, payload = build_anthropic_request(model, prompt, api_key)
+
+    try:
+        response = await async_post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
+
+        if response.status_code == 200:
+            result = response.json()["content"][0]["text"]
+            return parse_review_response(result, "Anthropic")
+        else:
+            return {
+                "error": f"Anthropic API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call Anthropic API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to stream a code review from Anthropic
+def stream_with_anthropic(code, language, model, prompt, api_key=None):
+    """Stream a code review from Anthropic, yielding text as it is generated"""
+    if not is_anthropic_available(api_key):
+        raise ProviderStreamError("Please provide an Anthropic API key.", setup_instructions=get_setup_instructions("Anthropic"))
+
+    headers, payload = build_anthropic_request(model, prompt, api_key)
+    payload["stream"] = True
+
+    try:
+        with http_post("https://api.anthropic.com/v1/messages", headers=headers, json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise ProviderStreamError(f"Anthropic API Error: {response.status_code}", details=response.text)
+            for data in iter_sse_data(response):
+                event = json.loads(data)
+                if event.get("type") == "content_block_delta":
+                    yield event["delta"].get("text", "")
+                elif event.get("type") == "error":
+                    raise ProviderStreamError("Anthropic stream failed", details=str(event.get("error")))
+    except ProviderStreamError:
+        raise
+    except Exception as e:
+        raise ProviderStreamError(f"Failed to call Anthropic API: {str(e)}", details=str(e))
@@ -1,13 +1,53 @@
 import os
-import json
 import re
-from utils.config import GEMINI_API_KEY
+from utils.config import GEMINI_API_KEY, STRUCTURED_OUTPUT
+from utils.json_extract import parse_review_response
+from utils.review_schema import get_gemini_schema
+from utils.http_client import async_post
+from utils.rate_limit import observe_headers
+from providers.streaming import ProviderStreamError
 
 # Function to check if Gemini API is available
 def is_gemini_available():
     """Check if Google Gemini API is available"""
     return GEMINI_API_KEY is not None
 
+# Function to build the Gemini generation config
+def build_gemini_generation_config(rest=False):
+    """Generation settings for the SDK, or with the camelCase names of the REST API if rest is True"""
+    names = {
+        "temperature": "temperature",
+        "top_p": "topP",
+        "top_k": "topK",
+        "max_output_tokens": "maxOutputTokens",
+        "response_mime_type": "responseMimeType",
+        "response_schema": "responseSchema"
+    }
+    config = {
+        "temperature": 0.2,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 8192,
+    }
+    if STRUCTURED_OUTPUT:
+        # Have Gemini return JSON that follows the review schema
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = get_gemini_schema()
+    if rest:
+        return {names[name]: value for name, value in config.items()}
+    return config
+
+# Function to pass a Gemini quota error to the rate limiter
+def observe_gemini_quota_error(error):
+    """Treat a quota error of the SDK, which hides the HTTP response, as a 429 with the
+    retry_delay it reports as Retry-After; returns whether error was a quota error"""
+    message = str(error)
+    if "quota" not in message.lower() and "rate limit" not in message.lower():
+        return False
+    retry_delay = re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', message)
+    observe_headers(429, {"Retry-After": retry_delay.group(1)} if retry_delay else {})
+    return True
+
 # Function to analyze code with Google Gemini
 def analyze_with_gemini(code, language, model, prompt):
     """Analyze code using Google Gemini API"""
@@ -36,50 +76,25 @@ def analyze_with_gemini(code, language, model, prompt):
             # Default to gemini-1.5-flash if model not recognized
             gemini_model = genai.GenerativeModel('gemini-1.5-flash')
         
-        # Set generation config
-        generation_config = {
-            "temperature": 0.2,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-        }
-        
         # Generate the response
         response = gemini_model.generate_content(
             prompt,
-            generation_config=generation_config
+            generation_config=build_gemini_generation_config()
         )
         
         # Extract the text from the response
         result = response.text
         
-        # Try to extract JSON from the response
-        try:
-            # First, try to parse the entire response as JSON
-            return json.loads(result)
-        except json.JSONDecodeError:
-            # If that fails, try to extract JSON from the text
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                try:
-                    return json.loads(json_str.strip())
-                except json.JSONDecodeError:
-                    pass
-            
-            # If we couldn't extract valid JSON, return an error
-            return {
-                "error": "Failed to parse Gemini response as JSON",
-                "raw_response": result[:1000]  # Include part of the raw response for debugging
-            }
+        # Extract the review JSON from the response
+        return parse_review_response(result, "Gemini")
     except ImportError:
         return {
             "error": "Google Generative AI library is not installed",
-            "setup_instructions": "Install the required library using: pip install google-generativeai>=0.3.0"
+            "setup_instructions": "Install the required library using: pip install google-generativeai>=0.7.0"
         }
     except Exception as e:
         # Handle rate limiting errors
-        if "quota" in str(e).lower() or "rate limit" in str(e).lower():
+        if observe_gemini_quota_error(e):
             return {
                 "error": "Google Gemini API rate limit exceeded",
                 "details": str(e),
@@ -91,6 +106,81 @@ def analyze_with_gemini(code, language, model, prompt):
                 "details": str(e)
             }
 
+# Function to analyze code with Google Gemini without blocking a thread
+async def analyze_with_gemini_async(code, language, model, prompt):
+    """Async version of analyze_with_gemini, using the generateContent REST endpoint"""
+    if not is_gemini_available():
+        return {
+            "error": "Google Gemini API key is not available",
+            "setup_instructions": get_setup_instructions()
+        }
+    
+    model = model if model in ("gemini-1.5-flash", "gemini-1.5-pro") else "gemini-1.5-flash"
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": build_gemini_generation_config(rest=True)
+    }
+    
+    try:
+        response = await async_post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent",
+            headers={"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY},
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            candidates = response.json().get("candidates") or [{}]
+            parts = (candidates[0].get("content") or {}).get("parts", [])
+            result = "".join(part.get("text", "") for part in parts)
+            return parse_review_response(result, "Gemini")
+        elif response.status_code == 429:
+            return {
+                "error": "Google Gemini API rate limit exceeded",
+                "details": response.text,
+                "setup_instructions": """The free tier of Google Gemini API has a limit of 15 requests per minute. Please wait and try again later."""
+            }
+        else:
+            return {
+                "error": f"Google Gemini API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call Google Gemini API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to stream a code review from Google Gemini
+def stream_with_gemini(code, language, model, prompt):
+    """Stream a code review from Google Gemini, yielding text as it is generated"""
+    if not is_gemini_available():
+        raise ProviderStreamError("Google Gemini API key is not available", setup_instructions=get_setup_instructions())
+    
+    try:
+        # Import the library here to avoid dependency issues if not installed
+        import google.generativeai as genai
+    except ImportError:
+        raise ProviderStreamError(
+            "Google Generative AI library is not installed",
+            setup_instructions="Install the required library using: pip install google-generativeai>=0.7.0"
+        )
+    
+    genai.configure(api_key=GEMINI_API_KEY)
+    gemini_model = genai.GenerativeModel(model if model in ("gemini-1.5-flash", "gemini-1.5-pro") else "gemini-1.5-flash")
+    try:
+        response = gemini_model.generate_content(prompt, generation_config=build_gemini_generation_config(), stream=True)
+        for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+    except Exception as e:
+        if observe_gemini_quota_error(e):
+            raise ProviderStreamError(
+                "Google Gemini API rate limit exceeded",
+                details=str(e),
+                setup_instructions="The free tier of Google Gemini API has a limit of 15 requests per minute. Please wait and try again later."
+            )
+        raise ProviderStreamError(f"Failed to call Google Gemini API: {str(e)}", details=str(e))
+
 # Function to get available models
 def get_available_models():
     """Get a list of available models in Google Gemini"""
@@ -1,13 +1,72 @@
 import os
-import json
-import re
-from utils.config import GROQ_API_KEY
+from utils.config import GROQ_API_KEY, REQUEST_READ_TIMEOUT, RETRY_MAX_ATTEMPTS
+from utils.json_extract import parse_review_response
+from utils.review_schema import get_json_mode, get_response_format
+from utils.http_client import async_post
+from utils.rate_limit import observe_headers
+from providers.streaming import ProviderStreamError
 
 # Function to check if Groq API is available
 def is_groq_available():
     """Check if Groq API is available"""
     return GROQ_API_KEY is not None
 
+# Function to get a reusable Groq client
+_groq_client = None
+
+def get_groq_client():
+    """Get the shared Groq client so its connection pool is reused across reviews"""
+    global _groq_client
+    if _groq_client is None:
+        # Import the library here to avoid dependency issues if not installed
+        from groq import Groq
+        # The SDK retries 429/5xx itself; give it the same timeout and attempts as other providers
+        _groq_client = Groq(api_key=GROQ_API_KEY, timeout=REQUEST_READ_TIMEOUT, max_retries=RETRY_MAX_ATTEMPTS - 1)
+    return _groq_client
+
+# Function to build the Groq chat completion parameters
+def build_groq_request(model, prompt, stream=False):
+    """Build the chat completion parameters shared by the SDK and REST calls.
+
+    Groq's JSON mode doesn't support streaming, so streamed requests go
+    without response_format and rely on the prompt and the parser.
+    """
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are an expert code reviewer."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.2,
+        "max_tokens": 4096
+    }
+    if stream:
+        payload["stream"] = True
+        return payload
+    response_format = get_response_format(get_json_mode(model, "object"))
+    if response_format:
+        payload["response_format"] = response_format
+    return payload
+
+# Function to pass the rate-limit headers of a failed SDK call to the rate limiter
+def observe_groq_error(error):
+    """Feed the HTTP response of a Groq API error, if it has one, to the rate limiter"""
+    response = getattr(error, "response", None)
+    if response is not None and hasattr(response, "headers"):
+        observe_headers(response.status_code, response.headers)
+
+# Function to get the output Groq rejected in JSON mode
+def get_failed_generation(body):
+    """Return the failed_generation of a json_validate_failed error body, or None.
+
+    Groq answers 400 when JSON mode output doesn't parse; the output is
+    still worth a tolerant extraction before giving up on the review.
+    """
+    error = body.get("error") if isinstance(body, dict) else None
+    if isinstance(error, dict) and error.get("code") == "json_validate_failed":
+        return error.get("failed_generation")
+    return None
+
 # Function to analyze code with Groq
 def analyze_with_groq(code, language, model, prompt):
     """Analyze code using Groq API"""
@@ -21,56 +80,96 @@ def analyze_with_groq(code, language, model, prompt):
         }
     
     try:
-        # Import the library here to avoid dependency issues if not installed
-        from groq import Groq
+        # Reuse the client (and its keep-alive connections) across calls
+        client = get_groq_client()
         
-        # Initialize the client
-        client = Groq(api_key=GROQ_API_KEY)
-        
-        # Create the chat completion
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert code reviewer."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=4096
-        )
+        # Create the chat completion; the raw response carries the rate-limit headers
+        raw_response = client.chat.completions.with_raw_response.create(**build_groq_request(model, prompt))
+        observe_headers(raw_response.status_code, raw_response.headers)
+        response = raw_response.parse()
         
         # Extract the result
         result = response.choices[0].message.content
         
-        # Try to extract JSON from the response
-        try:
-            # First, try to parse the entire response as JSON
-            return json.loads(result)
-        except json.JSONDecodeError:
-            # If that fails, try to extract JSON from the text
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                try:
-                    return json.loads(json_str.strip())
-                except json.JSONDecodeError:
-                    pass
-            
-            # If we couldn't extract valid JSON, return an error
-            return {
-                "error": "Failed to parse Groq response as JSON",
-                "raw_response": result[:1000]  # Include part of the raw response for debugging
-            }
+        # Extract the review JSON from the response
+        return parse_review_response(result, "Groq")
     except ImportError:
         return {
             "error": "Groq library is not installed",
             "setup_instructions": "Install the required library using: pip install groq>=0.4.0"
         }
     except Exception as e:
+        observe_groq_error(e)
+        failed_generation = get_failed_generation(getattr(e, "body", None))
+        if failed_generation is not None:
+            return parse_review_response(failed_generation, "Groq")
         return {
             "error": f"Failed to call Groq API: {str(e)}",
             "details": str(e)
         }
 
+# Function to analyze code with Groq without blocking a thread
+async def analyze_with_groq_async(code, language, model, prompt):
+    """Async version of analyze_with_groq.
+
+    Calls Groq's OpenAI-compatible REST endpoint over the shared httpx
+    client, since SDK clients are tied to the event loop they were made on.
+    """
+    if not is_groq_available():
+        return {
+            "error": "Groq API key is not available",
+            "setup_instructions": get_setup_instructions()
+        }
+    
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {GROQ_API_KEY}"
+    }
+    payload = build_groq_request(model, prompt)
+    
+    try:
+        response = await async_post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
+        
+        if response.status_code == 200:
+            result = response.json()["choices"][0]["message"]["content"]
+            return parse_review_response(result, "Groq")
+        elif response.status_code == 400 and "json_validate_failed" in response.text:
+            return parse_review_response(get_failed_generation(response.json()), "Groq")
+        else:
+            return {
+                "error": f"Groq API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call Groq API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to stream a code review from Groq
+def stream_with_groq(code, language, model, prompt):
+    """Stream a code review from Groq, yielding text as it is generated"""
+    if not is_groq_available():
+        raise ProviderStreamError("Groq API key is not available", setup_instructions=get_setup_instructions())
+    
+    try:
+        client = get_groq_client()
+    except ImportError:
+        raise ProviderStreamError(
+            "Groq library is not installed",
+            setup_instructions="Install the required library using: pip install groq>=0.4.0"
+        )
+    
+    try:
+        raw_response = client.chat.completions.with_raw_response.create(**build_groq_request(model, prompt, stream=True))
+        observe_headers(raw_response.status_code, raw_response.headers)
+        for chunk in raw_response.parse():
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        observe_groq_error(e)
+        raise ProviderStreamError(f"Failed to call Groq API: {str(e)}", details=str(e))
+
 # Function to get available models
 def get_available_models():
     """Get a list of available models in Groq"""
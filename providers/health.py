@@ -0,0 +1,119 @@
+# Background, TTL-cached availability checks for every provider
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import PROVIDER_HEALTH_TTL, get_available_providers, validate_api_key
+from providers.ollama_provider import is_ollama_running
+from providers.gemini_provider import is_gemini_available
+from providers.groq_provider import is_groq_available
+from providers.huggingface_provider import is_huggingface_available
+from providers.openrouter_provider import is_openrouter_available
+
+# Availability probe for each provider shown in the sidebar
+PROVIDER_PROBES = {
+    "OpenAI": lambda: validate_api_key("OpenAI"),
+    "Anthropic": lambda: validate_api_key("Anthropic"),
+    "Ollama": is_ollama_running,
+    "Google Gemini": is_gemini_available,
+    "Groq": is_groq_available,
+    "Hugging Face": is_huggingface_available,
+    "OpenRouter": is_openrouter_available
+}
+
+# Providers that need no API key, so being configured says nothing about being reachable
+KEYLESS_PROVIDERS = ("Ollama",)
+
+
+class ProviderHealthRegistry:
+    """Probe all providers concurrently in the background and cache the results.
+
+    snapshot() never does I/O: it returns the last known status (None while
+    a provider has not been checked yet) and, if the results are older than
+    the TTL, starts a background refresh for the next caller.
+    """
+
+    def __init__(self, probes=None, ttl=PROVIDER_HEALTH_TTL):
+        self.probes = dict(probes or PROVIDER_PROBES)
+        self.ttl = ttl
+        self._status = {name: None for name in self.probes}
+        self._checked_at = 0.0
+        self._refreshing = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix="provider-health")
+
+    def snapshot(self):
+        """Return {provider: True/False/None} without blocking"""
+        self._refresh_if_stale()
+        with self._lock:
+            return dict(self._status)
+
+    def checked_at(self):
+        """Time of the last completed refresh (0 if none yet)"""
+        return self._checked_at
+
+    def invalidate(self):
+        """Make the next snapshot start a fresh round of probes"""
+        with self._lock:
+            self._checked_at = 0.0
+        self._refresh_if_stale()
+
+    def wait(self, timeout=None):
+        """Block until the in-flight refresh (if any) finishes, for non-UI callers"""
+        self._refresh_if_stale()
+        refreshing = self._refreshing
+        if refreshing is not None:
+            refreshing.wait(timeout)
+        return self.snapshot()
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            if self._refreshing is not None or time.time() - self._checked_at < self.ttl:
+                return
+            self._refreshing = threading.Event()
+        threading.Thread(target=self._refresh, name="provider-health-refresh", daemon=True).start()
+
+    def _refresh(self):
+        futures = {name: self._executor.submit(probe) for name, probe in self.probes.items()}
+        for name, future in futures.items():
+            try:
+                available = bool(future.result())
+            except Exception:
+                available = False
+            with self._lock:
+                self._status[name] = available
+
+        with self._lock:
+            self._checked_at = time.time()
+            done, self._refreshing = self._refreshing, None
+        done.set()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+# Function to get the shared provider health registry
+def get_health_registry():
+    """Get the process-wide health registry, shared by every session"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderHealthRegistry()
+        return _registry
+
+
+# Function to check whether a provider can be sent reviews without the user picking it
+def is_provider_usable(provider, status):
+    """Whether a configured provider may be used given a registry snapshot: not known
+    to be down, and for keyless providers (a local Ollama) checked and found running"""
+    if provider in KEYLESS_PROVIDERS:
+        return status.get(provider) is True
+    return status.get(provider) is not False
+
+
+# Function to list the providers that reviews can be routed to
+def get_usable_providers():
+    """Configured providers that is_provider_usable() accepts right now"""
+    status = get_health_registry().snapshot()
+    return [provider for provider in get_available_providers() if is_provider_usable(provider, status)]
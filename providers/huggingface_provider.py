@@ -1,26 +1,17 @@
-import requests
 import json
-import re
 from utils.config import HUGGINGFACE_API_KEY
+from utils.json_extract import parse_review_response
+from utils.http_client import http_post, async_post
+from providers.streaming import ProviderStreamError, iter_sse_data
 
 # Function to check if Hugging Face API is available
 def is_huggingface_available():
     """Check if Hugging Face API is available"""
     return HUGGINGFACE_API_KEY is not None
 
-# Function to analyze code with Hugging Face
-def analyze_with_huggingface(code, language, model, prompt):
-    """Analyze code using Hugging Face Inference API"""
-    if not is_huggingface_available():
-        return {
-            "error": "Hugging Face API key is not available",
-            "setup_instructions": """To use Hugging Face Inference API:
-1. Create an account at https://huggingface.co/
-2. Generate an API key in your account settings
-3. Add the key to your .env file as HUGGINGFACE_API_KEY"""
-        }
-    
-    # Prepare the request payload
+# Function to build the Hugging Face request
+def build_huggingface_request(model, prompt):
+    """Build the headers and payload for an Inference API request"""
     headers = {
         "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
         "Content-Type": "application/json"
@@ -47,12 +38,38 @@ def analyze_with_huggingface(code, language, model, prompt):
                 "return_full_text": False
             }
         }
+    return headers, payload
+
+# Function to get the generated text from an Inference API response
+def extract_huggingface_text(response_data):
+    """Get the generated text from the different response formats"""
+    if isinstance(response_data, list) and len(response_data) > 0:
+        if isinstance(response_data[0], dict) and "generated_text" in response_data[0]:
+            return response_data[0]["generated_text"]
+        return str(response_data[0])
+    elif isinstance(response_data, dict) and "generated_text" in response_data:
+        return response_data["generated_text"]
+    return str(response_data)
+
+# Function to analyze code with Hugging Face
+def analyze_with_huggingface(code, language, model, prompt):
+    """Analyze code using Hugging Face Inference API"""
+    if not is_huggingface_available():
+        return {
+            "error": "Hugging Face API key is not available",
+            "setup_instructions": """To use Hugging Face Inference API:
+1. Create an account at https://huggingface.co/
+2. Generate an API key in your account settings
+3. Add the key to your .env file as HUGGINGFACE_API_KEY"""
+        }
+    
+    headers, payload = build_huggingface_request(model, prompt)
     
     try:
         # API endpoint based on the model
         api_url = f"https://api-inference.huggingface.co/models/{model}"
         
-        response = requests.post(
+        response = http_post(
             api_url,
             headers=headers,
             json=payload
@@ -61,42 +78,55 @@ def analyze_with_huggingface(code, language, model, prompt):
         if response.status_code == 200:
             # Extract result based on model response format
             try:
-                response_data = response.json()
+                result = extract_huggingface_text(response.json())
                 
-                # Handle different response formats
-                if isinstance(response_data, list) and len(response_data) > 0:
-                    if isinstance(response_data[0], dict) and "generated_text" in response_data[0]:
-                        result = response_data[0]["generated_text"]
-                    else:
-                        result = str(response_data[0])
-                elif isinstance(response_data, dict) and "generated_text" in response_data:
-                    result = response_data["generated_text"]
-                else:
-                    result = str(response_data)
-                
-                # Try to extract JSON from the response
-                try:
-                    # First, try to parse the entire response as JSON
-                    return json.loads(result)
-                except json.JSONDecodeError:
-                    # If that fails, try to extract JSON from the text
-                    json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-                    if json_match:
-                        json_str = json_match.group(1) or json_match.group(2)
-                        try:
-                            return json.loads(json_str.strip())
-                        except json.JSONDecodeError:
-                            pass
-                    
-                    # If we couldn't extract valid JSON, return an error
-                    return {
-                        "error": "Failed to parse Hugging Face response as JSON",
-                        "raw_response": result[:1000]  # Include part of the raw response for debugging
-                    }
+                # Extract the review JSON from the response
+                return parse_review_response(result, "Hugging Face")
+            except json.JSONDecodeError:
+                return {
+                    "error": "Failed to parse Hugging Face response",
+                    # The API envelope isn't JSON, so there is no model output to recover
+                    "details": response.text[:1000]
+                }
+        elif response.status_code == 429:
+            return {
+                "error": "Hugging Face API rate limit exceeded",
+                "setup_instructions": """The free tier of Hugging Face Inference API has rate limits. Please wait and try again later."""
+            }
+        else:
+            return {
+                "error": f"Hugging Face API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call Hugging Face API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to analyze code with Hugging Face without blocking a thread
+async def analyze_with_huggingface_async(code, language, model, prompt):
+    """Async version of analyze_with_huggingface"""
+    if not is_huggingface_available():
+        return {
+            "error": "Hugging Face API key is not available",
+            "setup_instructions": get_setup_instructions()
+        }
+    
+    headers, payload = build_huggingface_request(model, prompt)
+    
+    try:
+        response = await async_post(f"https://api-inference.huggingface.co/models/{model}", headers=headers, json=payload)
+        
+        if response.status_code == 200:
+            try:
+                result = extract_huggingface_text(response.json())
+                return parse_review_response(result, "Hugging Face")
             except json.JSONDecodeError:
                 return {
                     "error": "Failed to parse Hugging Face response",
-                    "raw_response": response.text[:1000]
+                    # The API envelope isn't JSON, so there is no model output to recover
+                    "details": response.text[:1000]
                 }
         elif response.status_code == 429:
             return {
@@ -114,6 +144,58 @@ def analyze_with_huggingface(code, language, model, prompt):
             "details": str(e)
         }
 
+# Function to stream a code review from Hugging Face
+def stream_with_huggingface(code, language, model, prompt):
+    """Stream a code review from Hugging Face, yielding text as it is generated"""
+    if not is_huggingface_available():
+        raise ProviderStreamError("Hugging Face API key is not available", setup_instructions=get_setup_instructions())
+    
+    headers = {
+        "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": 1024,
+            "temperature": 0.2,
+            "return_full_text": False
+        },
+        "stream": True
+    }
+    
+    try:
+        with http_post(f"https://api-inference.huggingface.co/models/{model}", headers=headers, json=payload, stream=True) as response:
+            if response.status_code == 429:
+                raise ProviderStreamError(
+                    "Hugging Face API rate limit exceeded",
+                    setup_instructions="The free tier of Hugging Face Inference API has rate limits. Please wait and try again later."
+                )
+            if response.status_code != 200:
+                raise ProviderStreamError(f"Hugging Face API Error: {response.status_code}", details=response.text)
+            
+            # Models served by text-generation-inference stream tokens as
+            # server-sent events; others answer with the whole completion
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                response_data = response.json()
+                if isinstance(response_data, list) and response_data and isinstance(response_data[0], dict):
+                    yield response_data[0].get("generated_text", "")
+                elif isinstance(response_data, dict):
+                    yield response_data.get("generated_text", "")
+                return
+            
+            for data in iter_sse_data(response):
+                event = json.loads(data)
+                if "error" in event:
+                    raise ProviderStreamError("Hugging Face stream failed", details=str(event["error"]))
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+    except ProviderStreamError:
+        raise
+    except Exception as e:
+        raise ProviderStreamError(f"Failed to call Hugging Face API: {str(e)}", details=str(e))
+
 # Function to get available models
 def get_available_models():
     """Get a list of available models in Hugging Face"""
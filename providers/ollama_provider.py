@@ -1,36 +1,69 @@
+import httpx
 import requests
 import json
 import os
-from utils.config import OLLAMA_BASE_URL
+from utils.config import OLLAMA_BASE_URL, STRUCTURED_OUTPUT
+from utils.http_client import http_get, http_post, async_get, async_post
+from utils.json_extract import parse_review_response
+from providers.streaming import ProviderStreamError
+
+# Function to fetch the models installed in Ollama
+def fetch_ollama_models():
+    """Get installed model names, or None if Ollama can't be reached"""
+    try:
+        response = http_get(f"{OLLAMA_BASE_URL}/api/tags", timeout=2, max_attempts=1)
+        if response.status_code != 200:
+            return None
+        return [model["name"] for model in response.json().get("models", [])]
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+# Function to fetch the installed models without blocking a thread
+async def fetch_ollama_models_async():
+    """Async version of fetch_ollama_models"""
+    try:
+        # Only the request itself is bounded: waiting for a pooled connection
+        # behind other reviews doesn't mean Ollama is down
+        response = await async_get(f"{OLLAMA_BASE_URL}/api/tags", timeout=httpx.Timeout(2, pool=None), max_attempts=1)
+        if response.status_code != 200:
+            return None
+        return [model["name"] for model in response.json().get("models", [])]
+    except (httpx.HTTPError, ValueError):
+        return None
 
 # Function to check if Ollama is running locally
 def is_ollama_running():
     """Check if Ollama is running locally"""
-    try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=2)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+    return fetch_ollama_models() is not None
 
 # Function to get available Ollama models
 def get_available_models():
     """Get a list of available models in Ollama"""
-    if not is_ollama_running():
-        return []
-    
-    try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags")
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            return [model["name"] for model in models]
-        return []
-    except requests.exceptions.RequestException:
-        return []
+    return fetch_ollama_models() or []
+
+# Function to build the Ollama request
+def build_ollama_request(model, prompt):
+    """Build the payload for a non-streaming /api/generate request"""
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "options": {
+            "temperature": 0.2,
+            "num_predict": 4096  # Increase token limit for longer responses
+        }
+    }
+    if STRUCTURED_OUTPUT:
+        # Constrain generation to valid JSON
+        payload["format"] = "json"
+    return payload
 
 # Function to analyze code with Ollama
 def analyze_with_ollama(code, language, model, prompt):
     """Analyze code using Ollama API"""
-    if not is_ollama_running():
+    # One /api/tags call answers both "is it running" and "is the model pulled"
+    available_models = fetch_ollama_models()
+    if available_models is None:
         return {
             "error": "Ollama is not running",
             "setup_instructions": """To use Ollama:
@@ -41,7 +74,6 @@ def analyze_with_ollama(code, language, model, prompt):
         }
     
     # Check if the model is available
-    available_models = get_available_models()
     if model not in available_models:
         return {
             "error": f"Model '{model}' is not available in Ollama",
@@ -51,46 +83,16 @@ def analyze_with_ollama(code, language, model, prompt):
 3. Try again after the model is downloaded"""
         }
     
-    # Prepare the request payload
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.2,
-            "num_predict": 4096  # Increase token limit for longer responses
-        }
-    }
+    payload = build_ollama_request(model, prompt)
     
     try:
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
+        response = http_post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
         
         if response.status_code == 200:
             result = response.json().get("response", "")
             
-            # Try to extract JSON from the response
-            try:
-                # First, try to parse the entire response as JSON
-                return json.loads(result)
-            except json.JSONDecodeError:
-                # If that fails, try to extract JSON from the text
-                json_match = None
-                # Look for JSON pattern with curly braces
-                start_idx = result.find('{')
-                end_idx = result.rfind('}')
-                
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                    json_str = result[start_idx:end_idx+1]
-                    try:
-                        return json.loads(json_str)
-                    except json.JSONDecodeError:
-                        pass
-                
-                # If we couldn't extract valid JSON, return an error
-                return {
-                    "error": "Failed to parse Ollama response as JSON",
-                    "raw_response": result[:1000]  # Include part of the raw response for debugging
-                }
+            # Extract the review JSON from the response
+            return parse_review_response(result, "Ollama")
         else:
             return {
                 "error": f"Ollama API Error: {response.status_code}",
@@ -105,6 +107,73 @@ def analyze_with_ollama(code, language, model, prompt):
 3. Ensure your firewall isn't blocking the connection"""
         }
 
+# Function to analyze code with Ollama without blocking a thread
+async def analyze_with_ollama_async(code, language, model, prompt):
+    """Async version of analyze_with_ollama"""
+    available_models = await fetch_ollama_models_async()
+    if available_models is None:
+        return {
+            "error": "Ollama is not running",
+            "setup_instructions": get_setup_instructions()
+        }
+    
+    if model not in available_models:
+        return {
+            "error": f"Model '{model}' is not available in Ollama",
+            "setup_instructions": f"Pull the model using: ollama pull {model}"
+        }
+    
+    try:
+        response = await async_post(f"{OLLAMA_BASE_URL}/api/generate", json=build_ollama_request(model, prompt))
+        
+        if response.status_code == 200:
+            return parse_review_response(response.json().get("response", ""), "Ollama")
+        else:
+            return {
+                "error": f"Ollama API Error: {response.status_code}",
+                "details": response.text
+            }
+    except httpx.HTTPError as e:
+        return {
+            "error": f"Failed to call Ollama API: {str(e)}",
+            "setup_instructions": get_setup_instructions()
+        }
+
+# Function to stream a code review from Ollama
+def stream_with_ollama(code, language, model, prompt):
+    """Stream a code review from Ollama, yielding text as it is generated"""
+    available_models = fetch_ollama_models()
+    if available_models is None:
+        raise ProviderStreamError("Ollama is not running", setup_instructions=get_setup_instructions())
+    
+    if model not in available_models:
+        raise ProviderStreamError(
+            f"Model '{model}' is not available in Ollama",
+            setup_instructions=f"Pull the model using: ollama pull {model}"
+        )
+    
+    payload = build_ollama_request(model, prompt)
+    payload["stream"] = True
+    
+    try:
+        with http_post(f"{OLLAMA_BASE_URL}/api/generate", json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise ProviderStreamError(f"Ollama API Error: {response.status_code}", details=response.text)
+            
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise ProviderStreamError("Ollama stream failed", details=chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+    except requests.exceptions.RequestException as e:
+        raise ProviderStreamError(f"Failed to call Ollama API: {str(e)}", setup_instructions=get_setup_instructions())
+
 # Function to get setup instructions
 def get_setup_instructions():
     """Get setup instructions for Ollama"""
@@ -0,0 +1,112 @@
+from utils.config import OPENAI_API_KEY, get_setup_instructions
+from utils.json_extract import parse_review_response
+from utils.review_schema import get_json_mode, get_response_format
+from utils.http_client import http_post, async_post
+from providers.streaming import ProviderStreamError, iter_chat_deltas
+
+# Function to check if OpenAI API is available
+def is_openai_available(api_key=None):
+    """Check if an OpenAI API key is available"""
+    return bool(api_key or OPENAI_API_KEY)
+
+# Function to build the OpenAI request
+def build_openai_request(model, prompt, api_key):
+    """Build the headers and payload for a chat completion request"""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key or OPENAI_API_KEY}"
+    }
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are an expert code reviewer."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.2
+    }
+    response_format = get_response_format(get_json_mode(model))
+    if response_format:
+        payload["response_format"] = response_format
+    return headers, payload
+
+# Function to analyze code with OpenAI
+def analyze_with_openai(code, language, model, prompt, api_key=None):
+    """Analyze code using the OpenAI API (api_key overrides OPENAI_API_KEY)"""
+    if not is_openai_available(api_key):
+        return {
+            "error": "Please provide an OpenAI API key.",
+            "setup_instructions": get_setup_instructions("OpenAI")
+        }
+
+    headers, payload = build_openai_request(model, prompt, api_key)
+
+    try:
+        response = http_post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=headers,
+            json=payload
+        )
+
+        if response.status_code == 200:
+            response_data = response.json()
+            result = response_data["choices"][0]["message"]["content"]
+            # Extract the review JSON from the response
+            return parse_review_response(result, "OpenAI")
+        else:
+            return {
+                "error": f"OpenAI API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call OpenAI API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to analyze code with OpenAI without blocking a thread
+async def analyze_with_openai_async(code, language, model, prompt, api_key=None):
+    """Async version of analyze_with_openai"""
+    if not is_openai_available(api_key):
+        return {
+            "error": "Please provide an OpenAI API key.",
+            "setup_instructions": get_setup_instructions("OpenAI")
+        }
+
+    headers, payload = build_openai_request(model, prompt, api_key)
+
+    try:
+        response = await async_post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+
+        if response.status_code == 200:
+            result = response.json()["choices"][0]["message"]["content"]
+            return parse_review_response(result, "OpenAI")
+        else:
+            return {
+                "error": f"OpenAI API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call OpenAI API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to stream a code review from OpenAI
+def stream_with_openai(code, language, model, prompt, api_key=None):
+    """Stream a code review from OpenAI, yielding text as it is generated"""
+    if not is_openai_available(api_key):
+        raise ProviderStreamError("Please provide an OpenAI API key.", setup_instructions=get_setup_instructions("OpenAI"))
+
+    headers, payload = build_openai_request(model, prompt, api_key)
+    payload["stream"] = True
+
+    try:
+        with http_post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise ProviderStreamError(f"OpenAI API Error: {response.status_code}", details=response.text)
+            yield from iter_chat_deltas(response)
+    except ProviderStreamError:
+        raise
+    except Exception as e:
+        raise ProviderStreamError(f"Failed to call OpenAI API: {str(e)}", details=str(e))
@@ -0,0 +1,157 @@
+# Cached, indexed copy of the OpenRouter model catalog
+import json
+import os
+import threading
+import time
+
+from utils.config import CACHE_DIR, OPENROUTER_API_KEY, OPENROUTER_CATALOG_TTL
+from utils.http_client import http_get
+
+OPENROUTER_MODELS_URL = "https://openrouter.ai/api/v1/models"
+
+
+# Function to build the index entry for one catalog model
+def index_model(model_data):
+    """Keep the fields the app needs, with prices converted to USD per 1M tokens"""
+    pricing = model_data.get("pricing") or {}
+    top_provider = model_data.get("top_provider") or {}
+    architecture = model_data.get("architecture") or {}
+    return {
+        "id": model_data["id"],
+        "name": model_data.get("name", model_data["id"]),
+        "prompt_price": float(pricing.get("prompt") or 0) * 1_000_000,
+        "completion_price": float(pricing.get("completion") or 0) * 1_000_000,
+        "context_length": model_data.get("context_length") or top_provider.get("context_length"),
+        "max_completion_tokens": top_provider.get("max_completion_tokens"),
+        "modality": architecture.get("modality"),
+        "supported_parameters": model_data.get("supported_parameters") or []
+    }
+
+
+class OpenRouterCatalog:
+    """Model catalog fetched once, refreshed in the background and indexed by id.
+
+    Lookups never touch the network: they read the in-memory index and, if
+    it is older than the TTL, start a background refresh that uses
+    If-None-Match / If-Modified-Since so an unchanged catalog costs a 304.
+    The index is also saved to disk so a restart doesn't start empty.
+    """
+
+    def __init__(self, ttl=OPENROUTER_CATALOG_TTL, cache_path=None):
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self._index = {}
+        self._etag = None
+        self._last_modified = None
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, model_id):
+        """Return the index entry for a model, or None if unknown or not loaded yet"""
+        self._refresh_if_stale()
+        return self._index.get(model_id)
+
+    def model_ids(self):
+        """Return every model id in the catalog"""
+        self._refresh_if_stale()
+        return list(self._index)
+
+    def is_loaded(self):
+        """Check if a catalog has been fetched (now or in a previous run)"""
+        return bool(self._index)
+
+    def refresh(self):
+        """Fetch the catalog now, sending the validators from the last fetch"""
+        headers = {"HTTP-Referer": "https://github.com/NoLongerHumanHQ/AI-Code-Review-Assistant"}
+        if OPENROUTER_API_KEY:
+            headers["Authorization"] = f"Bearer {OPENROUTER_API_KEY}"
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        response = http_get(OPENROUTER_MODELS_URL, headers=headers, timeout=10)
+        if response.status_code == 304:
+            with self._lock:
+                self._fetched_at = time.time()
+            return
+        response.raise_for_status()
+
+        index = {}
+        for model_data in response.json().get("data", []):
+            if model_data.get("id"):
+                index[model_data["id"]] = index_model(model_data)
+
+        with self._lock:
+            self._index = index
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            self._fetched_at = time.time()
+        self._save()
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            if self._refreshing or time.time() - self._fetched_at < self.ttl:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="openrouter-catalog", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the old index and try again after the next TTL
+            print(f"OpenRouter catalog refresh failed: {str(e)}")
+            with self._lock:
+                self._fetched_at = time.time()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r") as f:
+                data = json.load(f)
+            self._index = data["index"]
+            self._etag = data.get("etag")
+            self._last_modified = data.get("last_modified")
+            self._fetched_at = data.get("fetched_at", 0.0)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring OpenRouter catalog cache: {str(e)}")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            data = {
+                "index": self._index,
+                "etag": self._etag,
+                "last_modified": self._last_modified,
+                "fetched_at": self._fetched_at
+            }
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not save OpenRouter catalog cache: {str(e)}")
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+# Function to get the shared OpenRouter catalog
+def get_openrouter_catalog():
+    """Get the process-wide OpenRouter catalog, shared by every session"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = OpenRouterCatalog(cache_path=os.path.join(CACHE_DIR, "openrouter_models.json"))
+        return _catalog
@@ -1,26 +1,18 @@
-import requests
-import json
-import re
 from utils.config import OPENROUTER_API_KEY
+from utils.json_extract import parse_review_response
+from utils.review_schema import get_json_mode, get_response_format
+from utils.http_client import http_post, async_post
+from providers.openrouter_catalog import get_openrouter_catalog
+from providers.streaming import ProviderStreamError, iter_chat_deltas
 
 # Function to check if OpenRouter API is available
 def is_openrouter_available():
     """Check if OpenRouter API is available"""
     return OPENROUTER_API_KEY is not None
 
-# Function to analyze code with OpenRouter
-def analyze_with_openrouter(code, language, model, prompt):
-    """Analyze code using OpenRouter API"""
-    if not is_openrouter_available():
-        return {
-            "error": "OpenRouter API key is not available",
-            "setup_instructions": """To use OpenRouter API:
-1. Create an account at https://openrouter.ai/
-2. Generate an API key in your account settings
-3. Add the key to your .env file as OPENROUTER_API_KEY"""
-        }
-    
-    # Prepare the request payload
+# Function to build the OpenRouter request
+def build_openrouter_request(model, prompt):
+    """Build the headers and payload for a chat completion request"""
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -37,9 +29,28 @@ def analyze_with_openrouter(code, language, model, prompt):
         "temperature": 0.2,
         "max_tokens": 4000
     }
+    # Models that don't support JSON mode ignore it and follow the prompt
+    response_format = get_response_format(get_json_mode(model, "object"))
+    if response_format:
+        payload["response_format"] = response_format
+    return headers, payload
+
+# Function to analyze code with OpenRouter
+def analyze_with_openrouter(code, language, model, prompt):
+    """Analyze code using OpenRouter API"""
+    if not is_openrouter_available():
+        return {
+            "error": "OpenRouter API key is not available",
+            "setup_instructions": """To use OpenRouter API:
+1. Create an account at https://openrouter.ai/
+2. Generate an API key in your account settings
+3. Add the key to your .env file as OPENROUTER_API_KEY"""
+        }
+    
+    headers, payload = build_openrouter_request(model, prompt)
     
     try:
-        response = requests.post(
+        response = http_post(
             "https://openrouter.ai/api/v1/chat/completions",
             headers=headers,
             json=payload
@@ -49,25 +60,8 @@ def analyze_with_openrouter(code, language, model, prompt):
             response_data = response.json()
             result = response_data["choices"][0]["message"]["content"]
             
-            # Try to extract JSON from the response
-            try:
-                # First, try to parse the entire response as JSON
-                return json.loads(result)
-            except json.JSONDecodeError:
-                # If that fails, try to extract JSON from the text
-                json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', result)
-                if json_match:
-                    json_str = json_match.group(1) or json_match.group(2)
-                    try:
-                        return json.loads(json_str.strip())
-                    except json.JSONDecodeError:
-                        pass
-                
-                # If we couldn't extract valid JSON, return an error
-                return {
-                    "error": "Failed to parse OpenRouter response as JSON",
-                    "raw_response": result[:1000]  # Include part of the raw response for debugging
-                }
+            # Extract the review JSON from the response
+            return parse_review_response(result, "OpenRouter")
         else:
             return {
                 "error": f"OpenRouter API Error: {response.status_code}",
@@ -79,43 +73,75 @@ def analyze_with_openrouter(code, language, model, prompt):
             "details": str(e)
         }
 
-# Function to get available models
-def get_available_models():
-    """Get a list of available models in OpenRouter"""
+# Function to analyze code with OpenRouter without blocking a thread
+async def analyze_with_openrouter_async(code, language, model, prompt):
+    """Async version of analyze_with_openrouter"""
     if not is_openrouter_available():
-        return []
+        return {
+            "error": "OpenRouter API key is not available",
+            "setup_instructions": get_setup_instructions()
+        }
+    
+    headers, payload = build_openrouter_request(model, prompt)
     
     try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "HTTP-Referer": "https://github.com/NoLongerHumanHQ/AI-Code-Review-Assistant"
-        }
-        
-        response = requests.get(
-            "https://openrouter.ai/api/v1/models",
-            headers=headers
-        )
+        response = await async_post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
         
         if response.status_code == 200:
-            models_data = response.json()["data"]
-            # Filter for models that are good for code review
-            recommended_models = [
-                "anthropic/claude-3-haiku",
-                "meta-llama/llama-3-8b",
-                "google/gemini-pro",
-                "anthropic/claude-3-sonnet",
-                "mistralai/mistral-7b"
-            ]
-            
-            # Return models that are in both the recommended list and available from API
-            available_models = [model["id"] for model in models_data]
-            return [model for model in recommended_models if model in available_models]
+            result = response.json()["choices"][0]["message"]["content"]
+            return parse_review_response(result, "OpenRouter")
         else:
-            # Return a default list if API call fails
-            return ["anthropic/claude-3-haiku", "meta-llama/llama-3-8b", "google/gemini-pro"]
-    except Exception:
-        # Return a default list if API call fails
+            return {
+                "error": f"OpenRouter API Error: {response.status_code}",
+                "details": response.text
+            }
+    except Exception as e:
+        return {
+            "error": f"Failed to call OpenRouter API: {str(e)}",
+            "details": str(e)
+        }
+
+# Function to stream a code review from OpenRouter
+def stream_with_openrouter(code, language, model, prompt):
+    """Stream a code review from OpenRouter, yielding text as it is generated"""
+    if not is_openrouter_available():
+        raise ProviderStreamError("OpenRouter API key is not available", setup_instructions=get_setup_instructions())
+    
+    headers, payload = build_openrouter_request(model, prompt)
+    payload["stream"] = True
+    
+    try:
+        with http_post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise ProviderStreamError(f"OpenRouter API Error: {response.status_code}", details=response.text)
+            yield from iter_chat_deltas(response)
+    except ProviderStreamError:
+        raise
+    except Exception as e:
+        raise ProviderStreamError(f"Failed to call OpenRouter API: {str(e)}", details=str(e))
+
+# Models recommended for code review, in order of preference
+RECOMMENDED_MODELS = [
+    "anthropic/claude-3-haiku",
+    "meta-llama/llama-3-8b",
+    "google/gemini-pro",
+    "anthropic/claude-3-sonnet",
+    "mistralai/mistral-7b"
+]
+
+# Function to get available models
+def get_available_models():
+    """Get a list of available models in OpenRouter"""
+    if not is_openrouter_available():
+        return []
+    
+    catalog = get_openrouter_catalog()
+    if not catalog.is_loaded():
+        # Return a default list until the catalog has been fetched
         return ["anthropic/claude-3-haiku", "meta-llama/llama-3-8b", "google/gemini-pro"]
+    
+    # Return models that are in both the recommended list and the catalog
+    return [model for model in RECOMMENDED_MODELS if catalog.get(model) is not None]
 
 # Function to get model pricing
 def get_model_pricing(model):
@@ -123,31 +149,14 @@ def get_model_pricing(model):
     if not is_openrouter_available():
         return "Pricing information not available"
     
-    try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "HTTP-Referer": "https://github.com/NoLongerHumanHQ/AI-Code-Review-Assistant"
-        }
-        
-        response = requests.get(
-            "https://openrouter.ai/api/v1/models",
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            models_data = response.json()["data"]
-            for model_data in models_data:
-                if model_data["id"] == model:
-                    pricing = model_data.get("pricing", {})
-                    input_price = pricing.get("input", 0)
-                    output_price = pricing.get("output", 0)
-                    return f"Input: ${input_price}/1M tokens, Output: ${output_price}/1M tokens"
-            
-            return "Pricing information not available for this model"
-        else:
-            return "Pricing information not available"
-    except Exception:
-        return "Pricing information not available"
+    catalog = get_openrouter_catalog()
+    model_info = catalog.get(model)
+    if model_info is None:
+        if not catalog.is_loaded():
+            return "Pricing information is loading..."
+        return "Pricing information not available for this model"
+    
+    return f"Input: ${model_info['prompt_price']:.2f}/1M tokens, Output: ${model_info['completion_price']:.2f}/1M tokens"
 
 # Function to get setup instructions
 def get_setup_instructions():
@@ -0,0 +1,50 @@
+# Helpers shared by the streaming provider functions
+import json
+
+
+class ProviderStreamError(Exception):
+    """Raised by a streaming provider when the request can't be completed"""
+
+    def __init__(self, message, details=None, setup_instructions=None):
+        super().__init__(message)
+        self.details = details
+        self.setup_instructions = setup_instructions
+
+    def to_review(self):
+        """Convert the error into the error dict the non-streaming providers return"""
+        review = {"error": str(self)}
+        if self.details:
+            review["details"] = self.details
+        if self.setup_instructions:
+            review["setup_instructions"] = self.setup_instructions
+        return review
+
+
+# Function to read server-sent events from a streaming response
+def iter_sse_data(response):
+    """Yield the data payload of each server-sent event until [DONE]"""
+    # text/event-stream often has no charset, which requests would decode as latin-1
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        # Blank lines separate events and ':' lines are keep-alive comments
+        if not line or line.startswith(":"):
+            continue
+        if line.startswith("data:"):
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield data
+
+
+# Function to read OpenAI-style chat completion deltas
+def iter_chat_deltas(response):
+    """Yield the content of each chat.completion.chunk (OpenAI, OpenRouter)"""
+    for data in iter_sse_data(response):
+        event = json.loads(data)
+        if "error" in event:
+            raise ProviderStreamError("Stream interrupted by provider error", details=str(event["error"]))
+        choices = event.get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
@@ -0,0 +1,3 @@
+# This file makes the rule_engine directory a Python package
+from rule_engine.config import RuleConfig, DEFAULT_CONFIG
+from rule_engine.engine import supports_language, run_rules, create_rule_review, review_with_rules
@@ -0,0 +1,59 @@
+# Local rule engine entry points
+from typing import Dict, Any, List, Optional
+
+from rule_engine.config import RuleConfig
+from rule_engine.python_rules import run_python_rules
+from rule_engine.javascript_rules import run_javascript_rules
+
+# Map detected languages to the rule runner for that language
+RULE_RUNNERS = {
+    "python": run_python_rules,
+    "javascript": run_javascript_rules,
+    "typescript": run_javascript_rules
+}
+
+
+def supports_language(language: str) -> bool:
+    """Check if the local rule engine has rules for a language"""
+    return bool(language) and language.lower() in RULE_RUNNERS
+
+
+def run_rules(code: str, language: str, config: Optional[RuleConfig] = None) -> List[Dict[str, Any]]:
+    """Run all enabled local rules for a language and return the issues found"""
+    if not supports_language(language):
+        return []
+    return RULE_RUNNERS[language.lower()](code, config or RuleConfig())
+
+
+def create_rule_review(issues: List[Dict[str, Any]], config: Optional[RuleConfig] = None) -> Dict[str, Any]:
+    """Build a review in the same structure the AI providers return"""
+    config = config or RuleConfig()
+
+    penalty = sum(config.get_rating_weight(issue["severity"]) for issue in issues)
+    rating = max(1, round(10 - penalty))
+
+    counts = {}
+    for issue in issues:
+        counts[issue["rule"]] = counts.get(issue["rule"], 0) + 1
+
+    # Rules with the most hits give the most useful recommendations
+    recommendations = []
+    for rule in sorted(counts, key=counts.get, reverse=True)[:3]:
+        recommendation = next(issue["recommendation"] for issue in issues if issue["rule"] == rule)
+        recommendations.append(recommendation)
+
+    return {
+        "overall_rating": rating,
+        "summary": {
+            "strengths": [] if issues else ["No problems found by the local rule checks."],
+            "weaknesses": [f"{count} finding(s) from {rule}" for rule, count in counts.items()]
+        },
+        "key_recommendations": recommendations,
+        "issues": issues
+    }
+
+
+def review_with_rules(code: str, language: str, config: Optional[RuleConfig] = None) -> Dict[str, Any]:
+    """Run the local rules and return a complete review"""
+    config = config or RuleConfig()
+    return create_rule_review(run_rules(code, language, config), config)
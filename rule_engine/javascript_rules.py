@@ -0,0 +1,145 @@
+# JavaScript rules implemented as one combined-pattern scan
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, FrozenSet
+
+from rule_engine.config import RuleConfig
+
+# Rule metadata: default severity, category, pattern and the text shown in the review
+JAVASCRIPT_RULES = {
+    "javascript_var_usage": {
+        "severity": "medium",
+        "category": "quality",
+        "pattern": r'(?<![\w$.])var(?![\w$])',
+        "first_chars": "v",
+        "description": "'var' declaration is function-scoped and hoisted",
+        "recommendation": "Use 'const' for bindings that are never reassigned and 'let' otherwise."
+    },
+    "javascript_equality": {
+        "severity": "high",
+        "category": "bug",
+        "pattern": r'(?<![=!<>])[=!]=(?!=)',
+        "first_chars": "=!",
+        "description": "Loose equality operator performs type coercion",
+        "recommendation": "Use strict equality ('===' / '!==') to avoid surprising type coercion."
+    },
+    "javascript_eval": {
+        "severity": "critical",
+        "category": "security",
+        "pattern": r'(?<![\w$])eval\s*\(|(?<![\w$.])new\s+Function\s*\(',
+        "first_chars": "en",
+        "description": "Dynamic code execution with eval() or new Function()",
+        "recommendation": "Avoid executing strings as code; use JSON.parse, a lookup table or explicit functions instead."
+    },
+    "javascript_array_foreach": {
+        "severity": "low",
+        "category": "performance",
+        "pattern": r'\.forEach\s*\(',
+        "first_chars": ".",
+        "description": "Array.forEach callback on a potentially hot path",
+        "recommendation": "Use a for...of loop (supports break/await) or map/filter/reduce when building a new array."
+    }
+}
+
+# A slash starts a regular expression literal rather than a division when it
+# follows an operator, an opening bracket, a comma or "return", possibly
+# after a couple of blanks, or at the start of the file. Lookbehinds must be
+# fixed width, so each preceder and blank count gets its own; they are only
+# tried at a slash.
+REGEX_PRECEDERS = [r'[(\[{,;:?!=&|+\-*%<>~^]', r'\breturn']
+REGEX_START = "|".join([r'\A'] + [
+    f"(?<={preceder}{blanks})" for preceder in REGEX_PRECEDERS for blanks in ("", r"[ \t]", r"[ \t]{2}")
+])
+REGEX_LITERAL = r'/(?![/*])(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*'
+
+# A ")" closing the head of an if, while or for is followed by a statement,
+# so a slash after it starts a regular expression too. No lookbehind can
+# find the matching "(", so the keyword looks ahead over the head (nested
+# up to three deep) and scan_javascript() steps over the literal it finds.
+# That alternative slows the scan by a third, so it is only compiled in
+# for code with a slash after a ")" at all.
+CONTROL_HEAD = r'\((?:[^()]|\((?:[^()]|\([^()]*\))*\))*\)'
+CONTROL_HEAD_PATTERN = rf'(?P<head>(?<![\w$.])(?:if|while|for)(?=\s*{CONTROL_HEAD}\s*(?P<head_regex>{REGEX_LITERAL})))'
+SLASH_AFTER_PAREN = re.compile(r'\)\s*/(?![/*])')
+
+# Regions the scan steps over so rule patterns never match inside them.
+# Block comments also match when unterminated, and quoted strings,
+# regular expressions and template literals without a closing backtick
+# stop at the end of the line, so no alternative can make the scan
+# rescan the rest of the file. Skipping regular expressions keeps quotes,
+# backticks and "//" inside them from being taken for the start of a
+# string or comment.
+SKIP_PATTERNS = [
+    r'(?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))',
+    rf'(?P<regex>(?=/)(?:{REGEX_START}){REGEX_LITERAL})',
+    r'(?P<string>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`(?:[^`\\]|\\[\s\S])*`|`[^\n]*)'
+]
+SKIP_FIRST_CHARS = "/\"'`"
+
+
+@lru_cache(maxsize=32)
+def compile_scanner(rules: FrozenSet[str], control_heads: bool = False) -> re.Pattern:
+    """Compile the enabled rules and skip regions (and if/while/for heads) into one alternation"""
+    alternatives = SKIP_PATTERNS + [f"(?P<{rule}>{JAVASCRIPT_RULES[rule]['pattern']})" for rule in sorted(rules)]
+    # A leading character-class lookahead lets most positions fail before
+    # any alternative is tried, which roughly halves the scan time
+    first_chars = SKIP_FIRST_CHARS + "".join(JAVASCRIPT_RULES[rule]["first_chars"] for rule in sorted(rules))
+    if control_heads:
+        alternatives.append(CONTROL_HEAD_PATTERN)
+        first_chars += "ifw"
+    return re.compile(f"(?=[{re.escape(first_chars)}])(?:{'|'.join(alternatives)})")
+
+
+def scan_javascript(code: str, rules: FrozenSet[str]) -> List[Dict[str, Any]]:
+    """Walk the source once and return (rule, line) findings outside strings, regular expressions and comments"""
+    scanner = compile_scanner(rules, SLASH_AFTER_PAREN.search(code) is not None)
+    findings = []
+    line = 1
+    last_pos = 0
+    # Span of the regular expression after the last if/while/for head
+    head_regex = None
+    pos = 0
+
+    while pos is not None:
+        matches, pos = scanner.finditer(code, pos), None
+        for match in matches:
+            if head_regex and match.start() >= head_regex[0]:
+                # Scan on from the end of the literal, or of a skipped region running past it
+                pos, head_regex = max(end, head_regex[1]), None
+                break
+            end = match.end()
+            kind = match.lastgroup
+            if kind == "head":
+                head_regex = match.span("head_regex")
+                continue
+            if kind in ("comment", "regex", "string"):
+                continue
+            # Count newlines only since the previous finding to keep the scan linear
+            line += code.count("\n", last_pos, match.start())
+            last_pos = match.start()
+            findings.append({"rule": kind, "line": line})
+
+    return findings
+
+
+def run_javascript_rules(code: str, config: Optional[RuleConfig] = None) -> List[Dict[str, Any]]:
+    """Scan the code once and return issues for all enabled JavaScript rules"""
+    config = config or RuleConfig()
+    enabled = frozenset(rule for rule in config.get_enabled_rules("javascript")
+                        if rule in JAVASCRIPT_RULES and config.is_category_enabled(JAVASCRIPT_RULES[rule]["category"]))
+    if not enabled:
+        return []
+
+    issues = []
+    for finding in scan_javascript(code, enabled):
+        rule = JAVASCRIPT_RULES[finding["rule"]]
+        severity = config.get_rule_severity(finding["rule"], "javascript", rule["severity"])
+        issues.append({
+            "rule": finding["rule"],
+            "line": finding["line"],
+            "severity": severity.capitalize(),
+            "description": rule["description"],
+            "recommendation": rule["recommendation"],
+            "improved_code": ""
+        })
+    return issues
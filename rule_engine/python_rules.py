@@ -0,0 +1,244 @@
+# Python rules implemented as a single AST pass
+import ast
+import re
+from typing import Dict, Any, List, Optional, Set
+
+from rule_engine.config import RuleConfig
+
+# Rule metadata: default severity, category and the text shown in the review
+PYTHON_RULES = {
+    "python_naming_convention": {
+        "severity": "medium",
+        "category": "style",
+        "recommendation": "Use snake_case for functions, arguments and variables, CapWords for classes and UPPER_CASE for constants (PEP 8)."
+    },
+    "python_unused_import": {
+        "severity": "low",
+        "category": "maintainability",
+        "recommendation": "Remove the unused import to keep dependencies explicit and module load time down."
+    },
+    "python_except_pass": {
+        "severity": "high",
+        "category": "bug",
+        "recommendation": "Handle the exception, log it, or catch a narrower exception type instead of silently discarding it."
+    },
+    "python_sql_injection": {
+        "severity": "critical",
+        "category": "security",
+        "recommendation": "Pass query values as parameters (e.g. cursor.execute(sql, params)) instead of building the SQL string."
+    },
+    "python_nested_loop": {
+        "severity": "medium",
+        "category": "performance",
+        "recommendation": "Consider a dict/set lookup, itertools.product or a vectorized operation to avoid quadratic iteration."
+    }
+}
+
+SNAKE_CASE = re.compile(r'^_{0,2}[a-z][a-z0-9_]*$|^_+$')
+CAP_WORDS = re.compile(r'^_{0,2}[A-Z][a-zA-Z0-9]*$')
+UPPER_CASE = re.compile(r'^_{0,2}[A-Z][A-Z0-9_]*$')
+MODULE_NAME = re.compile(f"{SNAKE_CASE.pattern}|{UPPER_CASE.pattern}")
+DUNDER = re.compile(r'^__[a-z0-9_]+__$')
+
+SQL_EXECUTE_METHODS = {"execute", "executemany", "executescript", "raw"}
+
+
+class PythonRuleVisitor(ast.NodeVisitor):
+    """Run every enabled Python rule during one walk of the syntax tree"""
+
+    def __init__(self, enabled_rules: Set[str]):
+        self.enabled = enabled_rules
+        self.findings: List[Dict[str, Any]] = []
+        self._loop_depth = 0
+        self._scope_depth = 0
+        self._imports: Dict[str, ast.AST] = {}
+        self._used_names: Set[str] = set()
+        self._named: Set[tuple] = set()
+        self._dynamic_sql: Set[str] = set()
+
+    def report(self, rule: str, node: ast.AST, description: str) -> None:
+        """Record a finding for a rule at the node's line"""
+        self.findings.append({
+            "rule": rule,
+            "line": getattr(node, "lineno", "N/A"),
+            "description": description
+        })
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Emit findings that can only be decided after the walk"""
+        if "python_unused_import" in self.enabled:
+            for name, node in self._imports.items():
+                if name not in self._used_names:
+                    self.report("python_unused_import", node, f"'{name}' is imported but never used")
+        return sorted(self.findings, key=lambda f: f["line"] if isinstance(f["line"], int) else 0)
+
+    # Naming convention
+
+    def _check_name(self, name: str, node: ast.AST, kind: str, pattern: re.Pattern) -> None:
+        if "python_naming_convention" not in self.enabled or DUNDER.match(name):
+            return
+        if not pattern.match(name) and (kind, name) not in self._named:
+            self._named.add((kind, name))
+            self.report("python_naming_convention", node, f"{kind.capitalize()} name '{name}' does not follow PEP 8 naming")
+
+    def _check_arguments(self, args: ast.arguments) -> None:
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self._check_name(arg.arg, arg, "argument", SNAKE_CASE)
+
+    def _visit_function(self, node) -> None:
+        self._check_name(node.name, node, "function", SNAKE_CASE)
+        self._check_arguments(node.args)
+        self._visit_scope(node)
+
+    def _visit_scope(self, node) -> None:
+        # Loops in a nested function are not nested in the enclosing loop
+        loop_depth, dynamic_sql = self._loop_depth, self._dynamic_sql
+        self._loop_depth, self._dynamic_sql = 0, set()
+        self._scope_depth += 1
+        self.generic_visit(node)
+        self._scope_depth -= 1
+        self._loop_depth, self._dynamic_sql = loop_depth, dynamic_sql
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._visit_function(node)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        self._visit_function(node)
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        self._check_arguments(node.args)
+        self._visit_scope(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._check_name(node.name, node, "class", CAP_WORDS)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Store):
+            # Module-level names may be constants, locals must be snake_case
+            self._check_name(node.id, node, "variable", SNAKE_CASE if self._scope_depth else MODULE_NAME)
+        else:
+            self._used_names.add(node.id)
+
+    # Unused imports
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            name = alias.asname or alias.name.split(".")[0]
+            self._imports.setdefault(name, node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.module == "__future__":
+            return
+        for alias in node.names:
+            if alias.name != "*":
+                self._imports.setdefault(alias.asname or alias.name, node)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                # Names listed in __all__ are re-exports, not unused imports
+                if target.id == "__all__" and isinstance(node.value, (ast.List, ast.Tuple)):
+                    for elt in node.value.elts:
+                        if isinstance(elt, ast.Constant) and isinstance(elt.value, str):
+                            self._used_names.add(elt.value)
+                if self._is_dynamic_string(node.value):
+                    self._dynamic_sql.add(target.id)
+                else:
+                    self._dynamic_sql.discard(target.id)
+        self.generic_visit(node)
+
+    # Silently swallowed exceptions
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if "python_except_pass" in self.enabled and all(self._is_noop(stmt) for stmt in node.body):
+            caught = ast.unparse(node.type) if node.type is not None else "all exceptions"
+            self.report("python_except_pass", node, f"Exception handler for {caught} silently ignores the error")
+        self.generic_visit(node)
+
+    @staticmethod
+    def _is_noop(stmt: ast.stmt) -> bool:
+        return isinstance(stmt, ast.Pass) or (
+            isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and stmt.value.value is Ellipsis
+        )
+
+    # SQL built from string formatting
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if ("python_sql_injection" in self.enabled and isinstance(node.func, ast.Attribute)
+                and node.func.attr in SQL_EXECUTE_METHODS and node.args):
+            query = node.args[0]
+            if self._is_dynamic_string(query) or (isinstance(query, ast.Name) and query.id in self._dynamic_sql):
+                self.report("python_sql_injection", node, f"SQL passed to {node.func.attr}() is built with string formatting")
+        self.generic_visit(node)
+
+    @staticmethod
+    def _is_dynamic_string(node: ast.AST) -> bool:
+        """Check for f-strings, % formatting, concatenation or .format() on a string literal"""
+        if isinstance(node, ast.JoinedStr):
+            return any(isinstance(value, ast.FormattedValue) for value in node.values)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mod, ast.Add)):
+            sides = (node.left, node.right)
+            has_literal = any(isinstance(side, ast.JoinedStr) or (isinstance(side, ast.Constant) and isinstance(side.value, str))
+                              for side in sides)
+            return has_literal and not all(isinstance(side, ast.Constant) for side in sides)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format":
+            return isinstance(node.func.value, ast.Constant) and isinstance(node.func.value.value, str)
+        return False
+
+    # Nested loops
+
+    def _visit_loop(self, node) -> None:
+        if "python_nested_loop" in self.enabled and self._loop_depth >= 1:
+            self.report("python_nested_loop", node, f"Loop nested {self._loop_depth + 1} levels deep")
+        self._loop_depth += 1
+        self.generic_visit(node)
+        self._loop_depth -= 1
+
+    def visit_For(self, node: ast.For) -> None:
+        self._visit_loop(node)
+
+    def visit_AsyncFor(self, node: ast.AsyncFor) -> None:
+        self._visit_loop(node)
+
+    def visit_While(self, node: ast.While) -> None:
+        self._visit_loop(node)
+
+
+def run_python_rules(code: str, config: Optional[RuleConfig] = None) -> List[Dict[str, Any]]:
+    """Parse the code once and return issues for all enabled Python rules"""
+    config = config or RuleConfig()
+    enabled = {rule for rule in config.get_enabled_rules("python")
+               if rule in PYTHON_RULES and config.is_category_enabled(PYTHON_RULES[rule]["category"])}
+    if not enabled:
+        return []
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{
+            "rule": "python_syntax_error",
+            "line": e.lineno or "N/A",
+            "severity": "Critical",
+            "description": f"Code could not be parsed: {e.msg}",
+            "recommendation": "Fix the syntax error so the code can run and be analyzed.",
+            "improved_code": ""
+        }]
+
+    visitor = PythonRuleVisitor(enabled)
+    visitor.visit(tree)
+
+    issues = []
+    for finding in visitor.finish():
+        rule = PYTHON_RULES[finding["rule"]]
+        severity = config.get_rule_severity(finding["rule"], "python", rule["severity"])
+        issues.append({
+            "rule": finding["rule"],
+            "line": finding["line"],
+            "severity": severity.capitalize(),
+            "description": finding["description"],
+            "recommendation": rule["recommendation"],
+            "improved_code": ""
+        })
+    return issues
@@ -0,0 +1,182 @@
+# Content-addressed cache for review results
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.config import (
+    CACHE_DIR,
+    REVIEW_CACHE_TTL,
+    REVIEW_CACHE_MEMORY_ENTRIES,
+    REVIEW_CACHE_MAX_ENTRIES,
+    REVIEW_CACHE_MAX_BYTES
+)
+from utils.prompts import PROMPT_TEMPLATE_VERSION
+from utils.chunking import INDENT_LANGUAGES
+
+
+# Function to build the cache key for a review
+def make_cache_key(code, language, depth, provider, model, kind=None):
+    """Hash everything that can change the review into a stable key.
+
+    kind separates other entries (such as per-definition findings) from
+    whole-file reviews of the same text.
+    """
+    digest = hashlib.sha256()
+    parts = (PROMPT_TEMPLATE_VERSION, provider, model, language, depth, code)
+    for part in parts + ((kind,) if kind else ()):
+        value = str(part or "").encode("utf-8")
+        # Length-prefix each part so field boundaries can't collide
+        digest.update(len(value).to_bytes(8, "big"))
+        digest.update(value)
+    return digest.hexdigest()
+
+
+# Function to build the cache key for one definition's findings
+def make_definition_key(code, language, depth, provider, model):
+    """Key of a top-level definition that ignores blank lines and whitespace changes.
+
+    Runs of spaces inside a line are collapsed; leading indentation is kept
+    for indentation-based languages, where it changes the meaning.
+    """
+    keep_indent = (language or "").lower() in INDENT_LANGUAGES
+    normalized = []
+    for line in code.splitlines():
+        if not line.strip():
+            continue
+        indent = line[:len(line) - len(line.lstrip())].expandtabs(4) if keep_indent else ""
+        normalized.append(indent + " ".join(line.split()))
+    return make_cache_key("\n".join(normalized), language, depth, provider, model, kind="definition")
+
+
+class ReviewCache:
+    """Bounded in-memory LRU in front of a persistent SQLite store"""
+
+    def __init__(self, path=None, ttl=REVIEW_CACHE_TTL, memory_entries=REVIEW_CACHE_MEMORY_ENTRIES,
+                 max_entries=REVIEW_CACHE_MAX_ENTRIES, max_bytes=REVIEW_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        """Open the SQLite store, falling back to memory only if it can't be created"""
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS reviews (
+                    key TEXT PRIMARY KEY,
+                    review TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS reviews_accessed ON reviews (accessed)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Review cache disabled on disk: {str(e)}")
+            self._db = None
+
+    def get(self, key):
+        """Return a cached review or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, review = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    return review
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+
+            row = self._db.execute("SELECT review, created FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._db.execute("DELETE FROM reviews WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+
+            review = json.loads(row[0])
+            self._db.execute("UPDATE reviews SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[1], review)
+            return review
+
+    def set(self, key, review):
+        """Store a review in memory and on disk"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, review)
+            if self._db is None:
+                return
+
+            data = json.dumps(review)
+            self._db.execute(
+                "INSERT OR REPLACE INTO reviews (key, review, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, data, now, now, len(data))
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def clear(self):
+        """Remove every cached review"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM reviews")
+                self._db.commit()
+
+    def _remember(self, key, created, review):
+        self._memory[key] = (created, review)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired rows, then least recently used rows until under the size limits"""
+        self._db.execute("DELETE FROM reviews WHERE created <= ?", (now - self.ttl,))
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        excess_bytes = total - self.max_bytes
+        excess_count = count - self.max_entries
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM reviews ORDER BY accessed"):
+            if excess_count <= 0 and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_count -= 1
+            excess_bytes -= size
+        self._db.executemany("DELETE FROM reviews WHERE key = ?", doomed)
+        for (key,) in doomed:
+            self._memory.pop(key, None)
+
+
+_review_cache = None
+_review_cache_lock = threading.Lock()
+
+
+# Function to get the shared review cache
+def get_review_cache():
+    """Get the process-wide review cache, shared by every session"""
+    global _review_cache
+    with _review_cache_lock:
+        if _review_cache is None:
+            _review_cache = ReviewCache(os.path.join(CACHE_DIR, "reviews.sqlite3"))
+        return _review_cache
@@ -0,0 +1,328 @@
+# Split large files at definition boundaries and merge per-chunk reviews
+import ast
+import re
+
+from utils.config import (
+    MODEL_CONTEXT_TOKENS,
+    DEFAULT_CONTEXT_TOKENS,
+    PROVIDER_OUTPUT_TOKENS,
+    CHUNK_REVIEW_WORKERS
+)
+from utils.jobs import map_in_parallel, raise_if_cancelled, report_progress
+from utils.review_schema import normalize_review
+
+# Rough size of the review instructions wrapped around the code
+PROMPT_OVERHEAD_TOKENS = 700
+MIN_CHUNK_TOKENS = 256
+
+# Languages whose blocks are delimited by indentation rather than braces
+INDENT_LANGUAGES = {"python", "ruby", "yaml", "coffeescript"}
+STRING_LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`(?:[^`\\]|\\.)*`')
+LINE_COMMENT = re.compile(r'(//|#).*$')
+COMMENT_PREFIXES = ("#", "//", "/*", "*")
+
+
+# Function to estimate the number of tokens in a text
+def estimate_tokens(text):
+    """Approximate token count (about 4 characters per token for code)"""
+    return len(text) // 4 + 1
+
+
+# Function to get the code budget per request for a model
+def get_code_token_budget(provider, model, context_tokens=None):
+    """Tokens of code that fit in one request after the prompt and the answer"""
+    context = context_tokens or MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    # Never reserve more than half the window for the answer
+    output = min(PROVIDER_OUTPUT_TOKENS.get(provider, 4096), context // 2)
+    return max(MIN_CHUNK_TOKENS, context - output - PROMPT_OVERHEAD_TOKENS)
+
+
+# Function to find top-level definition boundaries in Python code
+def python_boundaries(code):
+    """Return the 1-based lines where top-level statements start, or None on a syntax error"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    return [statement_start(node) for node in tree.body]
+
+
+# Function to find the first line of a statement
+def statement_start(node):
+    """1-based line where an ast statement starts; decorators belong to the definition they decorate"""
+    return min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+
+
+# Function to find block boundaries in brace- or indent-delimited code
+def block_boundaries(lines, indent_based, level=0, indent=0):
+    """Return the 1-based lines that start a new block at brace depth level
+    (for indentation-based languages, at indent columns); the defaults find
+    the top-level blocks"""
+    starts = []
+    depth = 0
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if stripped and depth == level:
+            at_level = not indent_based or len(line) - len(line.lstrip()) == indent
+            # Closing braces and continuation keywords still belong to the previous block
+            if at_level and not stripped.startswith(("}", ")", "]", "else", "elif", "except", "finally", "catch")):
+                starts.append(number)
+        if not indent_based:
+            code_only = LINE_COMMENT.sub("", STRING_LITERAL.sub("", line))
+            depth = max(0, depth + code_only.count("{") - code_only.count("}"))
+    return starts
+
+
+# Function to find the top-level units of a file
+def top_level_units(code, lines, language):
+    """Return (start, end) 1-based, inclusive line ranges of the top-level statements or blocks.
+
+    Python is split with ast; other languages where the brace depth (or,
+    for indentation-based languages, the indentation) returns to zero.
+    """
+    lang = (language or "").lower()
+    starts = python_boundaries(code) if lang == "python" else None
+    if not starts:
+        starts = block_boundaries(lines, lang in INDENT_LANGUAGES)
+
+    # The first unit also carries anything before the first boundary (imports, headers)
+    starts = sorted(set([1] + [start for start in starts if start > 1]))
+    return [(start, end - 1) for start, end in zip(starts, starts[1:] + [len(lines) + 1])]
+
+
+# Function to find the units one level inside an oversized unit
+def inner_units(lines, start, end, language, tree):
+    """Return (start, end) line ranges splitting lines[start..end] at its members, or [] if it has none.
+
+    In Python (tree is the parsed file, or None on a syntax error) only a
+    class is split, at the statements of its body; a function is left
+    whole. Other languages are split where the brace depth returns to one
+    (or, for indentation-based languages, the indentation to that of the
+    block's first indented line).
+    """
+    lang = (language or "").lower()
+    if lang == "python" and tree is not None:
+        classes = {statement_start(node): node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)}
+        node = classes.get(start)
+        starts = [statement_start(member) for member in node.body] if node is not None else []
+    else:
+        block = lines[start - 1:end]
+        indent_based = lang in INDENT_LANGUAGES
+        indent = 0
+        if indent_based:
+            base = len(block[0]) - len(block[0].lstrip())
+            indents = [len(line) - len(line.lstrip()) for line in block[1:] if line.strip()]
+            indent = next((width for width in indents if width > base), None)
+            if indent is None:
+                return []
+        starts = [start - 1 + number for number in block_boundaries(block, indent_based, 0 if indent_based else 1, indent)]
+
+    # The first part also carries the block's header (class line, docstring)
+    starts = sorted(set([start] + [line for line in starts if start < line <= end]))
+    if len(starts) < 2:
+        return []
+    return [(first, following - 1) for first, following in zip(starts, starts[1:] + [end + 1])]
+
+
+# Function to split code into its top-level definitions
+def split_definitions(code, language):
+    """Split code into top-level definitions, as {"code", "start_line", "end_line"}.
+
+    Each function, class or other multi-line block is its own definition;
+    runs of one-line statements (imports, constants) are kept together.
+    """
+    lines = code.splitlines(keepends=True)
+    definitions = []
+    previous_simple = False
+    for start, end in top_level_units(code, lines, language) if lines else []:
+        simple = sum(1 for line in lines[start - 1:end] if line.strip()) <= 1
+        if simple and previous_simple:
+            definitions[-1]["end_line"] = end
+            continue
+        # Comments right above a definition belong to it, not to the block before
+        while definitions and start > definitions[-1]["start_line"] and lines[start - 2].lstrip().startswith(COMMENT_PREFIXES):
+            start -= 1
+        if definitions:
+            definitions[-1]["end_line"] = start - 1
+            if definitions[-1]["end_line"] < definitions[-1]["start_line"]:
+                definitions.pop()  # it was only the comment
+        definitions.append({"start_line": start, "end_line": end})
+        previous_simple = simple
+    for definition in definitions:
+        definition["code"] = "".join(lines[definition["start_line"] - 1:definition["end_line"]])
+    return definitions
+
+
+# Function to split code into chunks under a token budget
+def chunk_code(code, language, max_tokens):
+    """Split code into chunks of whole definitions, each under max_tokens.
+
+    Returns a list of {"code", "start_line", "end_line"} with 1-based,
+    inclusive line numbers in the original file. Python is split with ast
+    at top-level statements; other languages at lines where the brace depth
+    (or, for indentation-based languages, the indentation) returns to zero.
+    A definition larger than the budget is split the same way one level
+    down (a Python class at its methods, a brace block at its members);
+    only one without members, such as a single oversized function, is split
+    by lines.
+    """
+    lines = code.splitlines(keepends=True)
+    if estimate_tokens(code) <= max_tokens or not lines:
+        return [{"code": code, "start_line": 1, "end_line": max(1, len(lines))}]
+
+    tree = None
+    if (language or "").lower() == "python":
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            pass
+    chunks = pack_units(lines, top_level_units(code, lines, language), max_tokens,
+                        lambda start, end: inner_units(lines, start, end, language, tree))
+    return [{"code": "".join(lines[start - 1:end]), "start_line": start, "end_line": end} for start, end in chunks]
+
+
+# Function to group consecutive units into chunks under a token budget
+def pack_units(lines, units, max_tokens, split_unit):
+    """Return (start, end) ranges of consecutive units, each under max_tokens where possible.
+
+    A unit over the budget is replaced by split_unit(start, end), packed
+    the same way, or by line windows if that returns no parts.
+    """
+    chunks = []
+    current_start, current_end, current_tokens = None, None, 0
+    for start, end in units:
+        unit_tokens = estimate_tokens("".join(lines[start - 1:end]))
+        if unit_tokens > max_tokens:
+            if current_start is not None:
+                chunks.append((current_start, current_end))
+                current_start, current_tokens = None, 0
+            parts = split_unit(start, end)
+            chunks.extend(pack_units(lines, parts, max_tokens, split_unit) if parts else split_lines(lines, start, end, max_tokens))
+            continue
+        if current_start is not None and current_tokens + unit_tokens > max_tokens:
+            chunks.append((current_start, current_end))
+            current_start, current_tokens = None, 0
+        if current_start is None:
+            current_start = start
+        current_end = end
+        current_tokens += unit_tokens
+    if current_start is not None:
+        chunks.append((current_start, current_end))
+    return chunks
+
+
+# Function to split an oversized block into line windows
+def split_lines(lines, start, end, max_tokens):
+    """Split lines[start..end] (1-based, inclusive) into windows under max_tokens"""
+    windows = []
+    window_start, window_tokens = start, 0
+    for number in range(start, end + 1):
+        line_tokens = estimate_tokens(lines[number - 1])
+        if window_tokens and window_tokens + line_tokens > max_tokens:
+            windows.append((window_start, number - 1))
+            window_start, window_tokens = number, 0
+        window_tokens += line_tokens
+    windows.append((window_start, end))
+    return windows
+
+
+# Function to shift an issue's line reference into file coordinates
+def shift_line(line, offset):
+    """Add offset to a line number or "a-b" range; leave anything else unchanged"""
+    if isinstance(line, bool):
+        return line
+    if isinstance(line, int):
+        return line + offset
+    if isinstance(line, str):
+        match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d+)\s*)?', line)
+        if match:
+            first = int(match.group(1)) + offset
+            if match.group(2):
+                return f"{first}-{int(match.group(2)) + offset}"
+            return str(first)
+    return line
+
+
+# Function to merge chunk reviews into one report
+def merge_reviews(chunks, reviews):
+    """Merge per-chunk reviews into one review in file coordinates"""
+    succeeded = [(chunk, review) for chunk, review in zip(chunks, reviews) if review and "error" not in review]
+    failed = [(chunk, review) for chunk, review in zip(chunks, reviews) if not review or "error" in review]
+    if not succeeded:
+        return next((review for _, review in failed if review), None)
+
+    issues = []
+    strengths, weaknesses, recommendations = [], [], []
+    weighted_rating, total_weight = 0.0, 0
+    for chunk, review in succeeded:
+        # A chunk review of the wrong shape (text summary, null lists) still merges
+        review = normalize_review(review)
+        offset = chunk["start_line"] - 1
+        for issue in review["issues"]:
+            issues.append(dict(issue, line=shift_line(issue.get("line", "N/A"), offset)))
+
+        for item in review["summary"]["strengths"]:
+            if item not in strengths:
+                strengths.append(item)
+        for item in review["summary"]["weaknesses"]:
+            if item not in weaknesses:
+                weaknesses.append(item)
+        for item in review["key_recommendations"]:
+            if item not in recommendations:
+                recommendations.append(item)
+
+        # Larger chunks count for more of the overall rating
+        try:
+            rating = float(review.get("overall_rating", 0))
+        except (TypeError, ValueError):
+            continue
+        weight = chunk["end_line"] - chunk["start_line"] + 1
+        weighted_rating += rating * weight
+        total_weight += weight
+
+    issues.sort(key=lambda issue: issue_sort_key(issue.get("line")))
+    merged = {
+        "overall_rating": round(weighted_rating / total_weight, 1) if total_weight else 0,
+        "summary": {"strengths": strengths, "weaknesses": weaknesses},
+        "key_recommendations": recommendations[:5],
+        "issues": issues,
+        "chunk_count": len(chunks)
+    }
+    # The merged review is only as complete as its least complete chunk
+    recovered = [review["recovered"] for _, review in succeeded if review.get("recovered")]
+    if recovered:
+        merged["recovered"] = recovered[0]
+    if failed:
+        merged["failed_chunks"] = [
+            f"Lines {chunk['start_line']}-{chunk['end_line']}: {(review or {}).get('error', 'No response')}"
+            for chunk, review in failed
+        ]
+    return merged
+
+
+# Function to order issues by their first line
+def issue_sort_key(line):
+    """Sort key for a line reference; issues without a line number go last"""
+    match = re.match(r'\s*(\d+)', str(line))
+    return int(match.group(1)) if match else float("inf")
+
+
+# Function to review chunks concurrently and merge the results
+def review_in_chunks(chunks, analyze_chunk, max_workers=CHUNK_REVIEW_WORKERS):
+    """Call analyze_chunk(chunk_code) for every chunk in parallel and merge the reviews.
+
+    The chunks run on the shared task pool, each in a copy of the caller's
+    context, so the deadline and the background job (cancellation,
+    progress) carry over to the workers.
+    """
+    finished = []
+
+    def analyze(chunk):
+        raise_if_cancelled()
+        review = analyze_chunk(chunk["code"])
+        finished.append(chunk)
+        report_progress(len(finished), len(chunks), f"Reviewed {len(finished)} of {len(chunks)} parts")
+        return review
+
+    reviews = map_in_parallel(analyze, chunks, max_workers)
+    return merge_reviews(chunks, reviews)
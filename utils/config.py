@@ -13,10 +13,187 @@ HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
+# Connections kept alive per provider host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+# Open connections across all hosts for async reviews (more requests wait for one)
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 100))
+
+# Timeouts in seconds: connecting, waiting for data, and a whole review including retries
+REQUEST_CONNECT_TIMEOUT = float(os.getenv("REQUEST_CONNECT_TIMEOUT", 10))
+REQUEST_READ_TIMEOUT = float(os.getenv("REQUEST_READ_TIMEOUT", 300))
+REVIEW_DEADLINE = float(os.getenv("REVIEW_DEADLINE", 600))
+
+# Seconds an async review may take before it is cancelled
+ASYNC_REVIEW_TIMEOUT = float(os.getenv("ASYNC_REVIEW_TIMEOUT", REVIEW_DEADLINE))
+
+# Retries of rate-limited (429) and failed (5xx, connection error) provider calls
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 4))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1.0))  # seconds, doubled per attempt
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 30))
+# Retries allowed per request sent, plus a small allowance per second, for each host
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.2))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", 0.5))
+
+# Hedged reviews: send a backup request to another provider once the primary
+# has taken longer than this percentile of its recent review latencies
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.95))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))  # before then, wait HEDGE_DEFAULT_DELAY
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 30))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 1))
+# Backups to try, as "Provider:model" separated by commas (default: every other configured provider)
+HEDGE_TARGETS = [target.strip() for target in os.getenv("HEDGE_TARGETS", "").split(",") if target.strip()]
+
+# Small, fast models that reformat a response that couldn't be parsed or repaired, as
+# "Provider:model" entries; the first configured one is used (set it empty to turn this off)
+REFORMAT_TARGETS = [target.strip() for target in os.getenv(
+    "REFORMAT_TARGETS",
+    "Groq:llama3-70b-8192,Google Gemini:gemini-1.5-flash,OpenAI:gpt-3.5-turbo,"
+    "OpenRouter:anthropic/claude-3-haiku,Anthropic:claude-instant-1"
+).split(",") if target.strip()]
+
+# Recent calls kept per model for latency, failure and throughput statistics,
+# and seconds between saves of those statistics to CACHE_DIR
+PROVIDER_STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", 200))
+PROVIDER_STATS_SAVE_INTERVAL = float(os.getenv("PROVIDER_STATS_SAVE_INTERVAL", 30))
+
+# "Auto" provider: what to optimize ("fastest", "cheapest" or "balanced"),
+# the share of reviews sent to models with fewer than ROUTER_MIN_SAMPLES
+# calls so their statistics fill in, and the latency assumed until then
+ROUTER_OBJECTIVE = os.getenv("ROUTER_OBJECTIVE", "balanced")
+ROUTER_EXPLORATION = float(os.getenv("ROUTER_EXPLORATION", 0.1))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", 5))
+ROUTER_DEFAULT_LATENCY = float(os.getenv("ROUTER_DEFAULT_LATENCY", 20))
+
+# Unchanged lines kept around each change when reviewing only a diff
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", 3))
+
+# Directory whose git repositories the app may diff; unset turns the git revisions option off,
+# since the repository path is typed in by whoever uses the page
+DIFF_REPO_ROOT = os.getenv("DIFF_REPO_ROOT", "")
+
+# Seconds a provider availability check stays fresh
+PROVIDER_HEALTH_TTL = float(os.getenv("PROVIDER_HEALTH_TTL", 30))
+
+# Seconds before the OpenRouter model catalog is revalidated
+OPENROUTER_CATALOG_TTL = float(os.getenv("OPENROUTER_CATALOG_TTL", 3600))
+
+# Review cache settings
+CACHE_DIR = os.path.expanduser(os.getenv("REVIEW_CACHE_DIR", "~/.cache/ai-code-review"))
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", 7 * 24 * 3600))  # seconds
+REVIEW_CACHE_MEMORY_ENTRIES = int(os.getenv("REVIEW_CACHE_MEMORY_ENTRIES", 256))
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 5000))
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Stage timing: on/off, traces kept for the debug panel, spans kept per trace, one JSON
+# log line per span on stderr, and the address serving Prometheus metrics (port 0 turns it off;
+# the default host only accepts local scrapers)
+TRACING = os.getenv("TRACING", "true").lower() in ("1", "true", "yes")
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", 50))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 500))
+TRACE_JSON_LOG = os.getenv("TRACE_JSON_LOG", "false").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Show the stage timing panel in the sidebar by default
+DEBUG_PANEL = os.getenv("DEBUG_PANEL", "false").lower() in ("1", "true", "yes")
+
+# Reviews kept in each browser session's history
+REVIEW_HISTORY_SIZE = int(os.getenv("REVIEW_HISTORY_SIZE", 20))
+
+# Issues shown per page of a review's issue list
+ISSUES_PAGE_SIZE = int(os.getenv("ISSUES_PAGE_SIZE", 25))
+
+# Background review jobs: worker threads shared by all sessions, unfinished jobs per
+# session, seconds an uncollected result is kept, and how often the page checks on them
+REVIEW_JOB_WORKERS = int(os.getenv("REVIEW_JOB_WORKERS", 8))
+REVIEW_JOBS_PER_SESSION = int(os.getenv("REVIEW_JOBS_PER_SESSION", 4))
+REVIEW_JOB_RETENTION = float(os.getenv("REVIEW_JOB_RETENTION", 3600))
+REVIEW_JOB_POLL_INTERVAL = float(os.getenv("REVIEW_JOB_POLL_INTERVAL", 1.0))
+
+# Threads shared by all jobs for their parallel parts (the files of an upload, the chunks of a file)
+REVIEW_TASK_WORKERS = int(os.getenv("REVIEW_TASK_WORKERS", 16))
+
+# Only review the changed definitions of a file while they make up at most this share of its lines
+INCREMENTAL_MAX_CHANGED_FRACTION = float(os.getenv("INCREMENTAL_MAX_CHANGED_FRACTION", 0.5))
+
+# Context window (in tokens) of each model, used to split large files into chunks
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "claude-2": 100000,
+    "claude-instant-1": 100000,
+    "claude-3-opus": 200000,
+    "claude-3-sonnet": 200000,
+    # Ollama serves every model with its default num_ctx unless told otherwise
+    "codellama": 4096,
+    "deepseek-coder": 4096,
+    "starcoder": 4096,
+    "llama3": 4096,
+    "gemini-1.5-flash": 1000000,
+    "gemini-1.5-pro": 1000000,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "microsoft/DialoGPT-medium": 1024,
+    "codeparrot/codeparrot": 1024,
+    "anthropic/claude-3-haiku": 200000,
+    "meta-llama/llama-3-8b": 8192,
+    "google/gemini-pro": 32768
+}
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("DEFAULT_CONTEXT_TOKENS", 8192))
+
+# Ask providers for native JSON output where the backend supports it
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+# Native JSON mode of each model: "schema" constrains the output to the review
+# schema, "object" to any JSON object; models not listed only get the prompt
+MODEL_JSON_MODES = {
+    "gpt-3.5-turbo": "object",
+    "gpt-4-turbo": "object",
+    "gpt-4o": "schema",
+    "gpt-4o-mini": "schema",
+    "llama3-70b-8192": "object",
+    "mixtral-8x7b-32768": "object"
+}
+
+# Tokens each provider is asked to generate for the review
+PROVIDER_OUTPUT_TOKENS = {
+    "OpenAI": 4096,
+    "Anthropic": 4000,
+    "Ollama": 4096,
+    "Google Gemini": 8192,
+    "Groq": 4096,
+    "Hugging Face": 1024,
+    "OpenRouter": 4000
+}
+
+# Chunks of a large file reviewed at the same time
+CHUNK_REVIEW_WORKERS = int(os.getenv("CHUNK_REVIEW_WORKERS", 4))
+
+# Uploaded files reviewed at the same time, the largest source file reviewed (in bytes),
+# and the most source files taken from one upload of files and archives
+UPLOAD_REVIEW_WORKERS = int(os.getenv("UPLOAD_REVIEW_WORKERS", 4))
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 1_000_000))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", 500))
+
+# Files the batch CLI reviews at the same time on each provider
+PROVIDER_CONCURRENCY = {
+    "OpenAI": 8,
+    "Anthropic": 4,
+    "Ollama": 1,  # A local server mostly processes one request at a time
+    "Google Gemini": 2,
+    "Groq": 4,
+    "Hugging Face": 2,
+    "OpenRouter": 8
+}
+
 # Provider configurations
 PROVIDER_CONFIGS = {
     "OpenAI": {
-        "models": ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"],
+        "models": ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo", "gpt-4o", "gpt-4o-mini"],
         "api_key": OPENAI_API_KEY,
         "free_tier": False,
         "setup_instructions": """To use OpenAI's API:
@@ -47,6 +224,12 @@ PROVIDER_CONFIGS = {
         "models": ["gemini-1.5-flash", "gemini-1.5-pro"],
         "api_key": GEMINI_API_KEY,
         "free_tier": True,
+        # Free tier limits; requests wait for a slot instead of failing with 429
+        "rate_limits": {
+            "rpm": 15,
+            "tpm": 1000000,
+            "models": {"gemini-1.5-pro": {"rpm": 2, "tpm": 32000}}
+        },
         "setup_instructions": """To use Google Gemini API (free tier available):
 1. Create an account at https://ai.google.dev/
 2. Generate an API key in your Google AI Studio
@@ -57,6 +240,12 @@ PROVIDER_CONFIGS = {
         "models": ["llama3-70b-8192", "mixtral-8x7b-32768"],
         "api_key": GROQ_API_KEY,
         "free_tier": True,
+        "rate_limits": {
+            "models": {
+                "llama3-70b-8192": {"rpm": 30, "tpm": 6000},
+                "mixtral-8x7b-32768": {"rpm": 30, "tpm": 5000}
+            }
+        },
         "setup_instructions": """To use Groq API (free tier available):
 1. Create an account at https://console.groq.com/
 2. Generate an API key in your account settings
@@ -75,6 +264,7 @@ PROVIDER_CONFIGS = {
         "models": ["anthropic/claude-3-haiku", "meta-llama/llama-3-8b", "google/gemini-pro"],
         "api_key": OPENROUTER_API_KEY,
         "free_tier": False,  # Not free but cost-effective
+        "rate_limits": {"rpm": 20},
         "setup_instructions": """To use OpenRouter API (cost-effective):
 1. Create an account at https://openrouter.ai/
 2. Generate an API key in your account settings
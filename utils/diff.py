@@ -0,0 +1,227 @@
+# Review only the changed regions of a unified diff or two git revisions
+import os
+import re
+import subprocess
+
+from utils.config import DIFF_CONTEXT_LINES, DIFF_REPO_ROOT
+from utils.language import detect_language
+
+HUNK_HEADER = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# Stands in for the unchanged lines left out between two changed regions
+OMITTED_MARKER = "..."
+
+
+# Function to strip the a/ or b/ prefix git puts on diff paths
+def clean_diff_path(path):
+    """Return the file path of a ---/+++ line, or None for /dev/null"""
+    path = path.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        return path[2:]
+    return path
+
+
+# Function to parse a unified diff
+def parse_unified_diff(text):
+    """Split a unified diff (git diff or diff -u) into files and hunks.
+
+    Returns a list of {"old_path", "new_path", "hunks"}, where each hunk is
+    {"old_start", "new_start", "lines"} and lines are (tag, text) pairs
+    with tag " ", "+" or "-". Deleted files have new_path None; binary
+    files have no hunks.
+    """
+    files = []
+    current = None
+    old_remaining = new_remaining = 0
+    for line in text.splitlines():
+        # Inside a hunk the header counts say which lines belong to it
+        if old_remaining > 0 or new_remaining > 0:
+            tag, body = (line[0], line[1:]) if line else (" ", "")
+            if tag in " +-":
+                current["hunks"][-1]["lines"].append((tag, body))
+                if tag != "+":
+                    old_remaining -= 1
+                if tag != "-":
+                    new_remaining -= 1
+                continue
+            if tag != "\\":  # "\ No newline at end of file" stays inside the hunk
+                old_remaining = new_remaining = 0
+
+        if line.startswith("diff --git "):
+            current = {"old_path": None, "new_path": None, "hunks": []}
+            files.append(current)
+            paths = re.match(r'diff --git a/(.*) b/(.*)', line)
+            if paths:
+                current["old_path"], current["new_path"] = paths.group(1), paths.group(2)
+        elif line.startswith("--- "):
+            # A plain diff -u has no "diff --git" line before each file
+            if current is None or current["hunks"]:
+                current = {"old_path": None, "new_path": None, "hunks": []}
+                files.append(current)
+            current["old_path"] = clean_diff_path(line[4:])
+        elif line.startswith("+++ ") and current is not None:
+            current["new_path"] = clean_diff_path(line[4:])
+        elif line.startswith("deleted file mode") and current is not None:
+            current["deleted"] = True
+        elif line.startswith("@@") and current is not None:
+            header = HUNK_HEADER.match(line)
+            if header:
+                old_remaining = int(header.group(2) if header.group(2) is not None else 1)
+                new_remaining = int(header.group(4) if header.group(4) is not None else 1)
+                current["hunks"].append({
+                    "old_start": int(header.group(1)),
+                    "new_start": int(header.group(3)),
+                    "lines": []
+                })
+
+    for file_diff in files:
+        if file_diff.pop("deleted", False):
+            file_diff["new_path"] = None
+    return files
+
+
+# Function to measure how far each hunk line is from a change
+def change_distances(hunk_lines):
+    """For each line of a hunk, the number of lines to the nearest added or removed line"""
+    distances = [len(hunk_lines)] * len(hunk_lines)
+    for order in (range(len(hunk_lines)), reversed(range(len(hunk_lines)))):
+        last_change = None
+        for index in order:
+            if hunk_lines[index][0] != " ":
+                last_change = index
+            if last_change is not None:
+                distances[index] = min(distances[index], abs(index - last_change))
+    return distances
+
+
+# Function to build the code sent for review from a file's hunks
+def build_excerpt(hunks, context_lines=DIFF_CONTEXT_LINES):
+    """Join the new side of each changed region with context_lines lines around it.
+
+    Returns (code, line_map): line_map[i] is the line in the new file of
+    line i + 1 of code, or None for the OMITTED_MARKER lines that replace
+    skipped lines. Removed lines aren't sent; context beyond context_lines
+    that the diff carries is dropped.
+    """
+    lines, line_map = [], []
+    last_line = 0
+    for hunk in hunks:
+        distances = change_distances(hunk["lines"])
+        new_line = hunk["new_start"]
+        for (tag, text), distance in zip(hunk["lines"], distances):
+            if tag == "-":
+                continue
+            if distance <= context_lines:
+                if new_line != last_line + 1:
+                    lines.append(OMITTED_MARKER)
+                    line_map.append(None)
+                lines.append(text)
+                line_map.append(new_line)
+                last_line = new_line
+            new_line += 1
+    return "\n".join(lines), line_map
+
+
+# Function to map a line reference in an excerpt to the new file
+def map_excerpt_line(line, line_map):
+    """Map a line number or "a-b" range in the excerpt to new-file lines.
+
+    A reference to an omitted-lines marker moves to the next real line;
+    anything that isn't a line inside the excerpt is returned unchanged.
+    """
+    def lookup(number):
+        for mapped in line_map[number - 1:]:
+            if mapped is not None:
+                return mapped
+        return None
+
+    if isinstance(line, bool):
+        return line
+    match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d+)\s*)?', str(line)) if isinstance(line, (int, str)) else None
+    if not match or not 1 <= int(match.group(1)) <= len(line_map):
+        return line
+    first = lookup(int(match.group(1)))
+    if first is None:
+        return line
+    if match.group(2) and 1 <= int(match.group(2)) <= len(line_map):
+        last = lookup(int(match.group(2)))
+        if last is not None and last != first:
+            return f"{first}-{last}"
+    return first if isinstance(line, int) else str(first)
+
+
+# Function to put a review of an excerpt into new-file line numbers
+def map_review_lines(review, line_map):
+    """Return a copy of review with issue lines mapped through line_map"""
+    if not review or "error" in review:
+        return review
+    issues = [
+        dict(issue, line=map_excerpt_line(issue.get("line", "N/A"), line_map)) if isinstance(issue, dict) else issue
+        for issue in review.get("issues") or []
+    ]
+    return dict(review, issues=issues)
+
+
+# Function to check a repository path typed into the page
+def resolve_repo_path(repo_path, root=DIFF_REPO_ROOT):
+    """Return repo_path (relative paths are taken from root) with links resolved.
+
+    Raises ValueError if no root is configured or the path lies outside it.
+    """
+    if not root:
+        raise ValueError("Diffs of git revisions are turned off; set DIFF_REPO_ROOT to allow them")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, repo_path or "."))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"The repository must be inside {root}")
+    return path
+
+
+# Function to get the diff between two git revisions
+def get_git_diff(repo_path, base, head=None, context_lines=DIFF_CONTEXT_LINES):
+    """Run git diff base [head] in repo_path (head None compares with the working tree).
+
+    Raises ValueError with git's message if the diff can't be produced.
+    """
+    for revision in (base, head):
+        if revision and revision.startswith("-"):
+            raise ValueError(f"Invalid revision: {revision}")
+    command = ["git", "-C", repo_path, "diff", "--no-color", "--no-ext-diff", f"--unified={context_lines}", base]
+    if head:
+        command.append(head)
+    command.append("--")
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ValueError(f"Could not run git: {str(e)}")
+    if result.returncode != 0:
+        raise ValueError(result.stderr.strip() or f"git diff exited with status {result.returncode}")
+    return result.stdout
+
+
+# Function to review the changed regions of every file in a diff
+def review_diff(diff_text, analyze_excerpt, context_lines=DIFF_CONTEXT_LINES):
+    """Review each changed file's excerpt and map the issues back to the new file.
+
+    analyze_excerpt(code, language) returns the review of one excerpt.
+    Yields one {"path", "language", "changed_lines", "excerpt_lines",
+    "review"} per file that has lines left after the change, as each
+    review finishes.
+    """
+    for file_diff in parse_unified_diff(diff_text):
+        if file_diff["new_path"] is None or not file_diff["hunks"]:
+            continue
+        code, line_map = build_excerpt(file_diff["hunks"], context_lines)
+        if not code.strip():
+            continue
+        language = detect_language(code, file_diff["new_path"])
+        review = analyze_excerpt(code, language)
+        yield {
+            "path": file_diff["new_path"],
+            "language": language,
+            "changed_lines": sum(tag == "+" for hunk in file_diff["hunks"] for tag, _ in hunk["lines"]),
+            "excerpt_lines": sum(mapped is not None for mapped in line_map),
+            "review": map_review_lines(review, line_map)
+        }
@@ -0,0 +1,228 @@
+# Shared keep-alive HTTP sessions for provider calls
+import asyncio
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.config import (
+    HTTP_POOL_SIZE,
+    ASYNC_MAX_CONNECTIONS,
+    REQUEST_CONNECT_TIMEOUT,
+    REQUEST_READ_TIMEOUT,
+    RETRY_MAX_ATTEMPTS
+)
+from utils.retry import RETRY_STATUSES, backoff_delay, get_retry_budget, retry_hint, time_remaining
+from utils.tracing import record_first_byte
+
+# One session per scheme://host, kept for the life of the process so that
+# Streamlit reruns and sessions reuse the same TCP/TLS connections
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+# Function to get the pooled session for a URL's host
+def get_session(url):
+    """Get the shared keep-alive session for the host of a URL"""
+    origin = _origin(url)
+
+    session = _sessions.get(origin)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount(origin, adapter)
+            _sessions[origin] = session
+        return session
+
+
+# Callables run on every response, e.g. to read rate-limit headers
+_response_hooks = []
+
+
+# Function to register a response hook
+def add_response_hook(hook):
+    """Call hook(response) after every request made through this module"""
+    if hook not in _response_hooks:
+        _response_hooks.append(hook)
+
+
+def _run_response_hooks(response):
+    for hook in _response_hooks:
+        hook(response)
+    return response
+
+
+def _cap_timeout(timeout, remaining):
+    """Shorten a (connect, read) timeout so one attempt can't outlive the deadline"""
+    if remaining is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _error_body(response):
+    """Parse a retryable JSON error body (e.g. Hugging Face's estimated_time), if any"""
+    if response.status_code != 503 or "json" not in response.headers.get("Content-Type", ""):
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def _retry_delay(attempt, max_attempts, budget, hint=None):
+    """Return the wait before another attempt, or None if we should give up"""
+    if attempt >= max_attempts:
+        return None
+    delay = backoff_delay(attempt, hint)
+    remaining = time_remaining()
+    # Don't sleep past the deadline only to fail afterwards
+    if remaining is not None and delay >= remaining:
+        return None
+    if not budget.try_retry():
+        return None
+    return delay
+
+
+def _request(method, url, max_attempts=RETRY_MAX_ATTEMPTS, timeout=(REQUEST_CONNECT_TIMEOUT, REQUEST_READ_TIMEOUT), **kwargs):
+    """Send a request with timeouts, retrying connection errors, 429 and 5xx"""
+    session = get_session(url)
+    budget = get_retry_budget(_origin(url))
+    budget.record_request()
+    attempt = 1
+    while True:
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            raise requests.exceptions.Timeout(f"Deadline exceeded before calling {url}")
+        try:
+            response = session.request(method, url, timeout=_cap_timeout(timeout, remaining), **kwargs)
+        except requests.exceptions.ConnectionError:
+            delay = _retry_delay(attempt, max_attempts, budget)
+            if delay is None:
+                raise
+        else:
+            # requests measures elapsed up to the parsed headers, before the body is read
+            record_first_byte(response.elapsed.total_seconds(), path=urlsplit(url).path)
+            _run_response_hooks(response)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            delay = _retry_delay(attempt, max_attempts, budget, retry_hint(response.status_code, response.headers, _error_body(response)))
+            if delay is None:
+                return response
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+# Function to send a GET request over the pooled session
+def http_get(url, **kwargs):
+    """requests.get over the shared connection pool for the URL's host.
+
+    Applies default timeouts and retries connection errors, 429 and 5xx
+    with jittered backoff (max_attempts=1 disables retries), within the
+    current deadline.
+    """
+    return _request("GET", url, **kwargs)
+
+
+# Function to send a POST request over the pooled session
+def http_post(url, **kwargs):
+    """requests.post over the shared connection pool, with the retries of http_get"""
+    return _request("POST", url, **kwargs)
+
+
+# Function to close all pooled connections
+def close_sessions():
+    """Close every pooled session, e.g. on shutdown or in benchmarks"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# One async client per event loop: httpx clients can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+# Function to get the async client for the running event loop
+def get_async_client():
+    """Get the shared httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_CONNECTIONS),
+            # Requests beyond max_connections wait for a free connection instead of failing
+            timeout=httpx.Timeout(REQUEST_READ_TIMEOUT, connect=REQUEST_CONNECT_TIMEOUT, pool=None)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def _request_async(method, url, max_attempts=RETRY_MAX_ATTEMPTS, timeout=(REQUEST_CONNECT_TIMEOUT, REQUEST_READ_TIMEOUT), **kwargs):
+    """Async _request over the event loop's shared client"""
+    client = get_async_client()
+    budget = get_retry_budget(_origin(url))
+    budget.record_request()
+    attempt = 1
+    while True:
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            raise httpx.TimeoutException(f"Deadline exceeded before calling {url}")
+        if isinstance(timeout, httpx.Timeout):
+            attempt_timeout = timeout
+        else:
+            capped = _cap_timeout(timeout, remaining)
+            connect, read = capped if isinstance(capped, tuple) else (capped, capped)
+            # pool=None: waiting for a free connection isn't a failure of this request
+            attempt_timeout = httpx.Timeout(read, connect=connect, pool=None)
+        try:
+            response = await client.request(method, url, timeout=attempt_timeout, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            delay = _retry_delay(attempt, max_attempts, budget)
+            if delay is None:
+                raise
+        else:
+            _run_response_hooks(response)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            delay = _retry_delay(attempt, max_attempts, budget, retry_hint(response.status_code, response.headers, _error_body(response)))
+            if delay is None:
+                return response
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+# Function to send an async GET request over the shared client
+async def async_get(url, **kwargs):
+    """httpx GET over the event loop's shared connection pool, with the retries of http_get"""
+    return await _request_async("GET", url, **kwargs)
+
+
+# Function to send an async POST request over the shared client
+async def async_post(url, **kwargs):
+    """httpx POST over the event loop's shared connection pool, with the retries of http_get"""
+    return await _request_async("POST", url, **kwargs)
+
+
+# Function to close the async client of the running event loop
+async def close_async_client():
+    """Close the running loop's async client, e.g. before the loop shuts down"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
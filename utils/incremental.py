@@ -0,0 +1,178 @@
+# Reuse the findings of unchanged top-level definitions when a file is edited
+from utils.config import INCREMENTAL_MAX_CHANGED_FRACTION
+from utils.cache import get_review_cache, make_definition_key
+from utils.chunking import split_definitions, shift_line, issue_sort_key
+from utils.diff import OMITTED_MARKER, map_review_lines
+from utils.review_schema import normalize_review
+
+
+# Function to split a review into the findings of each definition
+def split_review_by_definition(definitions, review):
+    """Return one findings dict per definition, with issue lines relative to its first line.
+
+    Each definition keeps the issues that start inside it; issues without a
+    line number stay with the first definition. The rating and summary of
+    the review are shared by all of them.
+    """
+    review = normalize_review(review)
+    findings = [{
+        "issues": [],
+        "rating": review.get("overall_rating"),
+        "strengths": review["summary"]["strengths"],
+        "weaknesses": review["summary"]["weaknesses"],
+        "recommendations": review["key_recommendations"]
+    } for _ in definitions]
+
+    for issue in review["issues"]:
+        if not isinstance(issue, dict):
+            continue
+        first_line = issue_sort_key(issue.get("line"))
+        index = 0
+        for position, definition in enumerate(definitions):
+            if definition["start_line"] <= first_line <= definition["end_line"]:
+                index = position
+                break
+        offset = definitions[index]["start_line"] - 1 if first_line != float("inf") else 0
+        findings[index]["issues"].append(dict(issue, line=shift_line(issue.get("line", "N/A"), -offset)))
+    return findings
+
+
+# Function to combine the findings of every definition into one review
+def merge_definition_findings(definitions, findings):
+    """Build a review in file coordinates from per-definition findings"""
+    issues = []
+    strengths, weaknesses, recommendations = [], [], []
+    weighted_rating, total_weight = 0.0, 0
+    for definition, finding in zip(definitions, findings):
+        offset = definition["start_line"] - 1
+        for issue in finding.get("issues") or []:
+            if isinstance(issue, dict):
+                issues.append(dict(issue, line=shift_line(issue.get("line", "N/A"), offset)))
+        for target, items in ((strengths, finding.get("strengths")),
+                              (weaknesses, finding.get("weaknesses")),
+                              (recommendations, finding.get("recommendations"))):
+            # Findings cached before reviews were normalized may hold anything here
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if item not in target:
+                    target.append(item)
+        try:
+            rating = float(finding.get("rating"))
+        except (TypeError, ValueError):
+            continue
+        weight = definition["end_line"] - definition["start_line"] + 1
+        weighted_rating += rating * weight
+        total_weight += weight
+
+    issues.sort(key=lambda issue: issue_sort_key(issue.get("line")))
+    return {
+        "overall_rating": round(weighted_rating / total_weight, 1) if total_weight else 0,
+        "summary": {"strengths": strengths, "weaknesses": weaknesses},
+        "key_recommendations": recommendations[:5],
+        "issues": issues
+    }
+
+
+# Function to save a review's findings under each definition of the file
+def store_definition_findings(code, language, depth, provider, model, review):
+    """Cache the findings of every definition in code from a review of the whole file"""
+    definitions = split_definitions(code, language)
+    if len(definitions) < 2:
+        return
+    review_cache = get_review_cache()
+    for definition, finding in zip(definitions, split_review_by_definition(definitions, review)):
+        review_cache.set(make_definition_key(definition["code"], language, depth, provider, model), finding)
+
+
+# Function to find the definitions that changed since they were last reviewed
+def plan_changed_definitions(code, language, depth, provider, model):
+    """Look up the cached findings of every top-level definition of code.
+
+    Returns None when nothing can be reused or too much of the file
+    changed, so the caller reviews the whole file instead. Otherwise a plan
+    for merge_changed_definitions(), whose "excerpt" is the changed
+    definitions joined with OMITTED_MARKER lines between them (None if
+    nothing changed).
+    """
+    definitions = split_definitions(code, language)
+    if len(definitions) < 2:
+        return None
+    review_cache = get_review_cache()
+    keys = [make_definition_key(definition["code"], language, depth, provider, model) for definition in definitions]
+    findings = [review_cache.get(key) for key in keys]
+    changed = [index for index, finding in enumerate(findings) if finding is None]
+
+    if len(changed) == len(definitions):
+        return None
+    changed_lines = sum(definitions[index]["end_line"] - definitions[index]["start_line"] + 1 for index in changed)
+    if changed_lines > INCREMENTAL_MAX_CHANGED_FRACTION * definitions[-1]["end_line"]:
+        return None
+
+    lines, line_map = [], []
+    for index in changed:
+        definition = definitions[index]
+        if line_map and line_map[-1] != definition["start_line"] - 1:
+            lines.append(OMITTED_MARKER)
+            line_map.append(None)
+        lines.extend(definition["code"].splitlines())
+        line_map.extend(range(definition["start_line"], definition["end_line"] + 1))
+    return {
+        "definitions": definitions,
+        "keys": keys,
+        "findings": findings,
+        "changed": changed,
+        "excerpt": "\n".join(lines) if changed else None,
+        "line_map": line_map
+    }
+
+
+# Function to merge the review of the changed definitions with the cached findings
+def merge_changed_definitions(plan, review):
+    """Cache the findings of the changed definitions from review (of plan["excerpt"]) and
+    return the review of the whole file; a failed review is returned as it is"""
+    definitions, changed, findings = plan["definitions"], plan["changed"], plan["findings"]
+    if changed:
+        if not review or "error" in review:
+            return review
+        review_cache = get_review_cache()
+        changed_definitions = [definitions[index] for index in changed]
+        new_findings = split_review_by_definition(changed_definitions, map_review_lines(review, plan["line_map"]))
+        for index, finding in zip(changed, new_findings):
+            # A recovered review may be missing findings, so it isn't reused
+            if not review.get("recovered"):
+                review_cache.set(plan["keys"][index], finding)
+            findings[index] = finding
+
+    merged = merge_definition_findings(definitions, findings)
+    merged["reused_definitions"] = len(definitions) - len(changed)
+    merged["reviewed_definitions"] = len(changed)
+    if changed and review.get("recovered"):
+        merged["recovered"] = review["recovered"]
+    return merged
+
+
+# Function to review only the definitions that changed since they were last reviewed
+def review_changed_definitions(code, language, depth, provider, model, analyze_excerpt):
+    """Review the new or changed definitions of code and merge in cached findings for the rest.
+
+    analyze_excerpt(code) reviews the changed definitions, joined with
+    OMITTED_MARKER lines between them. Returns None when nothing can be
+    reused or too much of the file changed, so the caller reviews the whole
+    file instead.
+    """
+    plan = plan_changed_definitions(code, language, depth, provider, model)
+    if plan is None:
+        return None
+    review = analyze_excerpt(plan["excerpt"]) if plan["excerpt"] is not None else None
+    return merge_changed_definitions(plan, review)
+
+
+# Function to review only the changed definitions on the running event loop
+async def review_changed_definitions_async(code, language, depth, provider, model, analyze_excerpt):
+    """Async review_changed_definitions; analyze_excerpt(code) is awaited"""
+    plan = plan_changed_definitions(code, language, depth, provider, model)
+    if plan is None:
+        return None
+    review = await analyze_excerpt(plan["excerpt"]) if plan["excerpt"] is not None else None
+    return merge_changed_definitions(plan, review)
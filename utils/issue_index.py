@@ -0,0 +1,66 @@
+# Index of a report's issues for filtering, sorting and paging without re-reading the reviews
+from utils.chunking import issue_sort_key
+from utils.review_schema import SEVERITIES
+
+# Rule name shown for issues that came from the AI review rather than a local rule
+AI_REVIEW_RULE = "AI review"
+
+# Orders the issue list can be sorted in
+ISSUE_SORT_ORDERS = ["File and line", "Severity", "Rule"]
+
+
+# Function to rank a severity, most severe first
+def severity_rank(severity):
+    return SEVERITIES.index(severity) if severity in SEVERITIES else len(SEVERITIES)
+
+
+# Function to index the issues of one or more reviews
+def build_issue_index(reviews):
+    """Flatten the issues of reviews, a list of (file path or None, review), for display.
+
+    Local rule findings kept with a review are included. Counts per
+    severity, file and rule and the positions of the items in every sort
+    order are computed here once, so filtering a page is a single pass.
+    """
+    items = []
+    for path, review in reviews:
+        if not review or "error" in review:
+            continue
+        for issue in list(review.get("rule_issues") or []) + list(review.get("issues") or []):
+            if not isinstance(issue, dict):
+                continue
+            items.append({
+                "file": path,
+                "severity": issue.get("severity", "Low"),
+                "rule": issue.get("rule") or AI_REVIEW_RULE,
+                "line": issue_sort_key(issue.get("line")),
+                "issue": issue
+            })
+
+    counts = {"severity": {}, "file": {}, "rule": {}}
+    for item in items:
+        for field in counts:
+            counts[field][item[field]] = counts[field].get(item[field], 0) + 1
+    # Most severe first, then as the report lists them
+    counts["severity"] = dict(sorted(counts["severity"].items(), key=lambda entry: severity_rank(entry[0])))
+
+    positions = range(len(items))
+    orders = {
+        "Severity": sorted(positions, key=lambda i: (severity_rank(items[i]["severity"]), items[i]["file"] or "", items[i]["line"])),
+        "File and line": sorted(positions, key=lambda i: (items[i]["file"] or "", items[i]["line"])),
+        "Rule": sorted(positions, key=lambda i: (items[i]["rule"], severity_rank(items[i]["severity"]), items[i]["file"] or "", items[i]["line"]))
+    }
+    return {"items": items, "counts": counts, "orders": orders}
+
+
+# Function to pick the issues that pass the filters
+def filter_issues(issue_index, sort="File and line", severities=None, files=None, rules=None):
+    """Positions in issue_index["items"] of the matching issues, in sort order; an empty filter matches everything"""
+    severities, files, rules = set(severities or ()), set(files or ()), set(rules or ())
+    items = issue_index["items"]
+    return [
+        position for position in issue_index["orders"][sort]
+        if (not severities or items[position]["severity"] in severities)
+        and (not files or items[position]["file"] in files)
+        and (not rules or items[position]["rule"] in rules)
+    ]
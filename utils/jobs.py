@@ -0,0 +1,292 @@
+# Background review jobs on a bounded worker pool, with ids, progress and cancellation
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import REVIEW_JOB_WORKERS, REVIEW_JOBS_PER_SESSION, REVIEW_JOB_RETENTION, REVIEW_TASK_WORKERS
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Job the current thread or task works for, so long-running steps can report to it
+current_job = contextvars.ContextVar("current_review_job", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled"""
+
+
+# Function to stop the current job's work if it was cancelled
+def raise_if_cancelled():
+    """Raise JobCancelled if the current job was cancelled; a no-op outside jobs"""
+    job = current_job.get()
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled()
+
+
+# Function to report the progress of the current job
+def report_progress(done=None, total=None, message=None, partial=None):
+    """Update the current job's progress; a no-op outside jobs"""
+    job = current_job.get()
+    if job is not None:
+        job.report(done, total, message, partial)
+
+
+# Function to run part of a job without letting it report progress
+def run_without_progress(fn, *args):
+    """Call fn(*args) so that it still stops when the current job is cancelled,
+    but its progress reports are ignored; for parts run side by side, whose
+    caller reports the progress of the whole"""
+    job = current_job.get()
+    token = current_job.set(None if job is None else MutedJob(job))
+    try:
+        return fn(*args)
+    finally:
+        current_job.reset(token)
+
+
+# Global pool for the parallel parts of jobs
+_task_pool = None
+_task_pool_lock = threading.Lock()
+
+
+# Function to get the thread pool the parallel parts of all jobs share
+def get_task_pool():
+    """Get or create the global pool of REVIEW_TASK_WORKERS threads.
+
+    Work submitted here must not block a pool thread waiting for other
+    work in the pool; map_in_parallel() takes care of that.
+    """
+    global _task_pool
+    if _task_pool is None:
+        with _task_pool_lock:
+            if _task_pool is None:
+                _task_pool = ThreadPoolExecutor(max_workers=REVIEW_TASK_WORKERS, thread_name_prefix="review-task")
+    return _task_pool
+
+
+# Function to run a function over several items on the shared task pool
+def map_in_parallel(fn, items, max_workers):
+    """Return [fn(item) for item in items], computing up to max_workers at once.
+
+    Each call runs in a copy of the caller's context, so the deadline and
+    the job (cancellation, progress) carry over. The calling thread takes
+    items as well, so the work goes on when the pool is busy, including
+    when the caller is itself a pool thread. After an exception no further
+    items are started, and the first one is raised once the running calls
+    have returned.
+    """
+    items = list(items)
+    contexts = [contextvars.copy_context() for _ in items]
+    results = [None] * len(items)
+    errors = []
+    pending = iter(range(len(items)))
+    counts = {"started": 0, "finished": 0}
+    condition = threading.Condition()
+
+    def work():
+        while True:
+            with condition:
+                index = None if errors else next(pending, None)
+                if index is None:
+                    return
+                counts["started"] += 1
+            try:
+                results[index] = contexts[index].run(fn, items[index])
+            except BaseException as e:
+                with condition:
+                    errors.append(e)
+            finally:
+                with condition:
+                    counts["finished"] += 1
+                    condition.notify_all()
+
+    pool = get_task_pool()
+    for _ in range(min(max_workers, len(items)) - 1):
+        pool.submit(work)
+    work()
+    # Helpers still queued in the pool find nothing left to do; only wait for those that took an item
+    with condition:
+        condition.wait_for(lambda: counts["finished"] == counts["started"])
+    if errors:
+        raise errors[0]
+    return results
+
+
+class MutedJob:
+    """Stand-in for a job that shares its cancellation and ignores progress reports"""
+
+    def __init__(self, job):
+        self.cancel_requested = job.cancel_requested
+
+    def report(self, done=None, total=None, message=None, partial=None):
+        pass
+
+
+class Job:
+    """State of one submitted job; read it through snapshot(), which is thread-safe"""
+
+    def __init__(self, title, owner=None):
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = {"done": 0, "total": None, "message": ""}
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+        self._lock = threading.Lock()
+
+    def report(self, done=None, total=None, message=None, partial=None):
+        """Record progress: done of total steps, a status message and the partial result so far"""
+        with self._lock:
+            if done is not None:
+                self.progress["done"] = done
+            if total is not None:
+                self.progress["total"] = total
+            if message is not None:
+                self.progress["message"] = message
+            if partial is not None:
+                self.partial = partial
+
+    def set_status(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            if status == RUNNING:
+                self.started = time.time()
+            elif status in FINISHED:
+                self.finished = time.time()
+                self.result = result
+                self.error = error
+
+    def snapshot(self):
+        """A copy of the job's state as a dict"""
+        with self._lock:
+            return {
+                "id": self.id,
+                "title": self.title,
+                "owner": self.owner,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "partial": self.partial,
+                "result": self.result,
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished
+            }
+
+
+class JobManager:
+    """Run jobs on a fixed pool of worker threads, shared by every session.
+
+    However many sessions submit work, at most max_workers jobs run at a
+    time; the rest wait in the queue, so the server never needs a thread
+    per request. Their parallel parts share the get_task_pool() threads.
+    Each owner (a browser session) may have max_per_owner unfinished
+    jobs. Cancelling a queued job drops it; a running job stops at its
+    next raise_if_cancelled() check, and whatever a request already in
+    flight returns is discarded. Finished jobs are kept for retention
+    seconds so their owner can collect them.
+    """
+
+    def __init__(self, max_workers=REVIEW_JOB_WORKERS, max_per_owner=REVIEW_JOBS_PER_SESSION,
+                 retention=REVIEW_JOB_RETENTION):
+        self.max_per_owner = max_per_owner
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="review-job")
+
+    def submit(self, fn, title, owner=None):
+        """Queue fn() as a job and return its id.
+
+        Raises ValueError if owner already has max_per_owner unfinished jobs.
+        """
+        job = Job(title, owner)
+        with self._lock:
+            self._prune()
+            if owner is not None and self.max_per_owner:
+                active = sum(1 for other in self._jobs.values() if other.owner == owner and other.status not in FINISHED)
+                if active >= self.max_per_owner:
+                    raise ValueError(f"At most {self.max_per_owner} reviews can run at once; wait for one to finish or cancel it")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn)
+        return job.id
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if it is unknown or was forgotten"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return None if job is None else job.snapshot()
+
+    def list_jobs(self, owner=None):
+        """Snapshots of every job of owner (all jobs if None), oldest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.owner == owner]
+        return sorted((job.snapshot() for job in jobs), key=lambda snapshot: snapshot["created"])
+
+    def cancel(self, job_id):
+        """Ask a job to stop; returns False if it is unknown or already finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.snapshot()["status"] in FINISHED:
+            return False
+        job.cancel_requested.set()
+        if job.future is not None and job.future.cancel():
+            # It never started
+            job.set_status(CANCELLED)
+        return True
+
+    def forget(self, job_id):
+        """Drop a finished job once its result has been collected"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in FINISHED:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait=False):
+        """Cancel queued jobs and stop the worker threads"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_requested.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, fn):
+        if job.cancel_requested.is_set():
+            job.set_status(CANCELLED)
+            return
+        job.set_status(RUNNING)
+        token = current_job.set(job)
+        try:
+            result = fn()
+        except JobCancelled:
+            job.set_status(CANCELLED)
+        except Exception as e:
+            job.set_status(FAILED, error=str(e) or type(e).__name__)
+        else:
+            # A request that was in flight when the job was cancelled still returns; drop its result
+            if job.cancel_requested.is_set():
+                job.set_status(CANCELLED)
+            else:
+                job.set_status(DONE, result)
+        finally:
+            current_job.reset(token)
+
+    def _prune(self):
+        # Caller holds self._lock
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
@@ -0,0 +1,109 @@
+# Linear-time extraction of the review JSON from model output
+import json
+import re
+
+from utils.json_repair import repair_json
+from utils.review_schema import normalize_review
+from utils.tracing import span, annotate
+
+# A '{' only starts a candidate object if its first token is a key, so
+# prose like "use {} or {x}" is never mistaken for the review
+CANDIDATE_START = re.compile(r'\{\s*"')
+STRUCTURAL = re.compile(r'[{}"]')
+STRING_SPECIAL = re.compile(r'["\\]')
+
+
+# Function to find where a JSON object starting at a brace ends
+def match_object_end(text, start):
+    """Return the index just past the brace that balances text[start], or -1.
+
+    Braces inside strings are ignored, and escapes inside strings are
+    honored. Each character is visited at most once.
+    """
+    depth = 0
+    pos = start
+    while True:
+        match = STRUCTURAL.search(text, pos)
+        if match is None:
+            return -1
+        char = match.group()
+        pos = match.end()
+        if char == '"':
+            while True:
+                match = STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    return -1
+                if match.group() == "\\":
+                    pos = match.end() + 1
+                    continue
+                pos = match.end()
+                break
+        elif char == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+# Function to extract the first JSON object from model output
+def extract_json(text):
+    """Return the first balanced JSON object in text as a dict, or None.
+
+    Handles bare JSON, ```json fences and prose around the object in one
+    forward pass, so brace-heavy output can't trigger the quadratic
+    backtracking of a greedy regex.
+    """
+    if not text:
+        return None
+
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except json.JSONDecodeError:
+        pass
+
+    pos = 0
+    while True:
+        candidate = CANDIDATE_START.search(text, pos)
+        if candidate is None:
+            return None
+        start = candidate.start()
+        end = match_object_end(text, start)
+        if end == -1:
+            # Unbalanced to the end of the text: anything later is nested inside it
+            return None
+        try:
+            parsed = json.loads(text[start:end])
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+        pos = end
+
+
+# Function to parse a provider response into a review
+def parse_review_response(result, provider):
+    """Parse model output into a review dict, or the error dict the UI shows.
+
+    A review recovered by repair_json is tagged with recovered="repaired".
+    Either way the review is normalized to the schema's shape.
+    """
+    with span("parse", provider=provider, characters=len(result or "")) as attributes:
+        review = extract_json(result)
+        if review is not None:
+            return normalize_review(review)
+
+        # Truncated or slightly malformed output is repaired locally before giving up on it
+        review = repair_json(result)
+        if review is not None:
+            attributes["recovered"] = "repaired"
+            return dict(normalize_review(review), recovered="repaired")
+
+        # If we couldn't extract valid JSON, return an error; the full response is kept for a reformat pass
+        annotate(error=True)
+        return {
+            "error": f"Failed to parse {provider} response as JSON",
+            "raw_response": result or ""
+        }
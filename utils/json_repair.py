@@ -0,0 +1,111 @@
+# Tolerant local repair of review JSON that doesn't parse as it is
+import json
+import re
+
+from utils.review_schema import REVIEW_SCHEMA
+
+# Same rule as utils.json_extract: the object starts at a '{' whose first token is a key
+CANDIDATE_START = re.compile(r'\{\s*"')
+
+# Cut points tried, from the end of the text back, before giving up
+MAX_REPAIR_ATTEMPTS = 50
+
+ISSUE_FIELDS = REVIEW_SCHEMA["properties"]["issues"]["items"]["required"]
+CLOSERS = {"{": "}", "[": "]"}
+
+
+# Function to scan broken JSON for the places it can be cut and closed
+def scan_json(text, start):
+    """Walk the object starting at text[start] and drop trailing commas.
+
+    Returns (cleaned, cut_points, stack): cleaned is the text up to the
+    end of the object (or of the input, if it never closes), cut_points
+    are (position, open brackets) after which cleaned holds only complete
+    values, and stack is the brackets still open at the end.
+    """
+    out = []
+    cut_points = []
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char == ",":
+            # Everything before a comma is a complete element
+            cut_points.append((len(out), tuple(stack)))
+        elif char in "}]":
+            # Drop a trailing comma before the closing bracket
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1]
+                cut_points = [point for point in cut_points if point[0] < end - 1]
+            if stack:
+                stack.pop()
+            out.append(char)
+            cut_points.append((len(out), tuple(stack)))
+            if not stack:
+                break
+            continue
+        out.append(char)
+    return "".join(out), cut_points, stack
+
+
+# Function to close the brackets left open at a cut point
+def close_brackets(text, stack):
+    """text followed by the closing bracket of every open bracket in stack"""
+    return text.rstrip().rstrip(",") + "".join(CLOSERS[bracket] for bracket in reversed(stack))
+
+
+# Function to drop issues that were cut off part-way
+def salvage_issues(review, truncated):
+    """Keep the issues that can be shown; after a cut, the last issue only if it has every field"""
+    issues = review.get("issues") or []
+    issues = [issue for issue in issues if isinstance(issue, dict) and issue.get("description")] if isinstance(issues, list) else []
+    if truncated and issues and not all(field in issues[-1] for field in ISSUE_FIELDS):
+        issues.pop()
+    return dict(review, issues=issues)
+
+
+# Function to repair model output that is almost a review
+def repair_json(text):
+    """Return the review in text as a dict after tolerant repair, or None.
+
+    Fixes trailing commas, unescaped control characters in strings and
+    output that stops before the object is closed: the text is cut back
+    to the last complete value and the open brackets are closed, keeping
+    every complete issue.
+    """
+    if not text:
+        return None
+    candidate = CANDIDATE_START.search(text)
+    if candidate is None:
+        return None
+
+    cleaned, cut_points, stack = scan_json(text, candidate.start())
+    truncated = bool(stack)
+    attempts = [cleaned] if not truncated else []
+    attempts.extend(close_brackets(cleaned[:position], open_brackets)
+                    for position, open_brackets in reversed(cut_points[-MAX_REPAIR_ATTEMPTS:]))
+    for attempt in attempts:
+        try:
+            parsed = json.loads(attempt, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return salvage_issues(parsed, truncated or attempt != cleaned)
+    return None
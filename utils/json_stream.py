@@ -0,0 +1,166 @@
+# Incremental parser for review JSON arriving in chunks
+import json
+import re
+
+# Characters that change the parser state outside and inside strings
+STRUCTURAL = re.compile(r'[{}\[\]",:]')
+STRING_SPECIAL = re.compile(r'["\\]')
+NOT_WHITESPACE = re.compile(r'\S')
+
+
+class ReviewStreamParser:
+    """Parse the review object from streamed text and emit fields as they complete.
+
+    Each call to feed() scans only the new text, so the work over a whole
+    response is linear in its length. Leading prose and code fences are
+    skipped: parsing starts at the first '{' followed by a key.
+    Every element of "issues" is emitted as soon as its object closes;
+    other top-level fields (overall_rating, summary, ...) are emitted once
+    their value is complete.
+    """
+
+    def __init__(self):
+        self.review = {}
+        self.complete = False
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._expect_key = False
+        self._key = None
+        self._value_start = None
+        self._item_start = None
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return a list of (field, value) events"""
+        if self.complete or not chunk:
+            return []
+        self._buf += chunk
+        events = []
+        if not self._started and not self._find_start():
+            return events
+        self._scan(events)
+        self._trim()
+        return events
+
+    def _find_start(self):
+        """Skip prose until a '{' that starts a JSON object"""
+        while True:
+            start = self._buf.find("{", self._pos)
+            if start == -1:
+                # Nothing before the end of the buffer can start the object
+                self._buf, self._pos = "", 0
+                return False
+            following = NOT_WHITESPACE.search(self._buf, start + 1)
+            if following is None:
+                # Need more text to tell if this brace opens the review
+                self._buf, self._pos = self._buf[start:], 0
+                return False
+            if following.group() == '"':
+                self._buf, self._pos = self._buf[start:], 0
+                self._started = True
+                return True
+            self._pos = start + 1
+
+    def _scan(self, events):
+        buf = self._buf
+        pos = self._pos
+        while not self.complete:
+            if self._in_string:
+                match = STRING_SPECIAL.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                if match.group() == "\\":
+                    # Skip the escaped character, waiting for it if needed
+                    if match.end() >= len(buf):
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                if self._depth == 1 and self._expect_key:
+                    self._key = json.loads(buf[self._string_start:pos])
+                    self._expect_key = False
+                continue
+
+            match = STRUCTURAL.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                if self._depth == 2 and char == "{" and self._key == "issues":
+                    self._item_start = index
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    self._emit_issue(buf[self._item_start:pos], events)
+                    self._item_start = None
+                elif self._depth == 1 and self._key != "issues":
+                    self._emit_field(buf[self._value_start:pos], events)
+                elif self._depth == 0:
+                    if self._value_start is not None and self._key != "issues":
+                        self._emit_field(buf[self._value_start:index], events)
+                    self.complete = True
+            elif self._depth == 1:
+                if char == ":":
+                    self._value_start = pos
+                elif char == ",":
+                    if self._value_start is not None and self._key != "issues":
+                        self._emit_field(buf[self._value_start:index], events)
+                    self._expect_key = True
+                    self._value_start = None
+        self._pos = pos
+
+    def _emit_issue(self, text, events):
+        try:
+            issue = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        self.review.setdefault("issues", []).append(issue)
+        events.append(("issue", issue))
+
+    def _emit_field(self, text, events):
+        key = self._key
+        self._value_start = None
+        if key is None:
+            return
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        self.review[key] = value
+        events.append((key, value))
+
+    def _trim(self):
+        """Drop text that no pending value still needs"""
+        keep = [self._pos]
+        if self._in_string:
+            keep.append(self._string_start)
+        if self._item_start is not None:
+            keep.append(self._item_start)
+        if self._value_start is not None and self._key != "issues":
+            keep.append(self._value_start)
+        cut = min(keep)
+        if cut > 0:
+            self._buf = self._buf[cut:]
+            self._pos -= cut
+            if self._string_start is not None:
+                self._string_start -= cut
+            if self._item_start is not None:
+                self._item_start -= cut
+            if self._value_start is not None:
+                self._value_start -= cut
@@ -0,0 +1,57 @@
+import os
+import re
+
+from utils.tracing import span
+
+# Languages recognised from a file extension
+EXTENSION_LANGUAGES = {
+    '.py': 'Python',
+    '.js': 'JavaScript',
+    '.ts': 'TypeScript',
+    '.html': 'HTML',
+    '.css': 'CSS',
+    '.java': 'Java',
+    '.cpp': 'C++',
+    '.c': 'C',
+    '.go': 'Go',
+    '.rs': 'Rust',
+    '.php': 'PHP',
+    '.rb': 'Ruby',
+    '.swift': 'Swift',
+    '.kt': 'Kotlin',
+    '.scala': 'Scala',
+    '.sh': 'Shell',
+    '.pl': 'Perl',
+    '.cs': 'C#'
+}
+
+# Directories that hold dependencies or build output rather than the project's own code
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", "env", "dist", "build", "site-packages"}
+
+
+# Function to detect programming language from code or filename
+def detect_language(code, filename=None):
+    """Detect the language from the filename extension, falling back to code patterns"""
+    with span("detect_language", characters=len(code)):
+        # Check filename extension first if available
+        if filename:
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in EXTENSION_LANGUAGES:
+                return EXTENSION_LANGUAGES[ext]
+    
+        # Basic detection based on code patterns
+        language_patterns = {
+            'Python': [r'import\s+[a-zA-Z0-9_]+', r'def\s+[a-zA-Z0-9_]+\s*\(', r'class\s+[a-zA-Z0-9_]+\s*:'],
+            'JavaScript': [r'const\s+[a-zA-Z0-9_]+\s*=', r'function\s+[a-zA-Z0-9_]+\s*\(', r'let\s+[a-zA-Z0-9_]+\s*='],
+            'Java': [r'public\s+class\s+[a-zA-Z0-9_]+', r'public\s+static\s+void\s+main'],
+            'C++': [r'#include\s+<[a-zA-Z0-9_]+>', r'int\s+main\s*\('],
+            'HTML': [r'<!DOCTYPE\s+html>', r'<html.*>.*</html>'],
+            'CSS': [r'[a-zA-Z0-9_]+\s*{[^}]*}', r'\.[a-zA-Z0-9_-]+\s*{']
+        }
+    
+        for lang, patterns in language_patterns.items():
+            for pattern in patterns:
+                if re.search(pattern, code):
+                    return lang
+    
+        return "Unknown"
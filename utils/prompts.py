@@ -1,4 +1,11 @@
 # Prompt optimization for different providers
+from utils.review_schema import describe_schema
+
+# Bump whenever a prompt template changes so cached reviews are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+
+# The JSON structure the prompts ask for, rendered from the review schema
+REVIEW_JSON_FORMAT = describe_schema(indent=4)
 
 # Base prompt template for code review
 def create_base_review_prompt(code, language, depth):
@@ -33,23 +40,7 @@ def create_base_review_prompt(code, language, depth):
     - 2-3 key recommendations for improvement
 
     Format your response as JSON with the following structure:
-    {{
-        "overall_rating": number,
-        "summary": {{
-            "strengths": [list of strings],
-            "weaknesses": [list of strings]
-        }},
-        "key_recommendations": [list of strings],
-        "issues": [
-            {{
-                "line": number or range (e.g., "10" or "10-15"),
-                "severity": "Critical|High|Medium|Low",
-                "description": "string",
-                "recommendation": "string",
-                "improved_code": "string"
-            }}
-        ]
-    }}
+    {REVIEW_JSON_FORMAT}
 
     Here is the code to review:
     ```{language}
@@ -80,23 +71,7 @@ def create_ollama_prompt(code, language, depth):
 
     Include: quality rating (1-10), strengths, weaknesses, key recommendations.
 
-    Format as JSON: {{
-        "overall_rating": number,
-        "summary": {{
-            "strengths": [list],
-            "weaknesses": [list]
-        }},
-        "key_recommendations": [list],
-        "issues": [
-            {{
-                "line": number or range,
-                "severity": "Critical|High|Medium|Low",
-                "description": "string",
-                "recommendation": "string",
-                "improved_code": "string"
-            }}
-        ]
-    }}
+    Format as JSON: {REVIEW_JSON_FORMAT}
 
     Code:
     ```{language}
@@ -179,6 +154,21 @@ def create_openrouter_prompt(code, language, depth, model):
     
     return prompt
 
+# Prompt for turning a malformed review into valid JSON
+def create_reformat_prompt(raw_response):
+    """Create a prompt asking a small model to rewrite a review response as valid JSON"""
+    prompt = f"""
+    The following code review was supposed to be JSON but could not be parsed.
+    Rewrite it as valid JSON with exactly this structure, keeping every issue and all of its text.
+    Do not review anything yourself and do not add issues. Output only the JSON.
+
+    {REVIEW_JSON_FORMAT}
+
+    Review to rewrite:
+    {raw_response}
+    """
+    return prompt
+
 # Function to select the appropriate prompt based on provider
 def create_review_prompt(code, language, depth, provider, model=None):
     """Create a review prompt optimized for the selected provider"""
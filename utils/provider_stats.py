@@ -0,0 +1,129 @@
+# Running per-model review statistics, saved across restarts
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from utils.config import CACHE_DIR, PROVIDER_STATS_WINDOW, PROVIDER_STATS_SAVE_INTERVAL
+
+# Outcomes of a provider call
+OK = "ok"
+PARSE_ERROR = "parse_error"
+ERROR = "error"
+
+
+class ProviderStats:
+    """Keep the last window calls of each (provider, model) and summarize them.
+
+    Each sample is [outcome, seconds, prompt_tokens, output_tokens]; seconds
+    is None for calls that failed without an answer. Samples are written to
+    a JSON file at most every save_interval seconds and on exit.
+    """
+
+    def __init__(self, window=PROVIDER_STATS_WINDOW, path=None, save_interval=PROVIDER_STATS_SAVE_INTERVAL):
+        self.window = window
+        self.path = path
+        self.save_interval = save_interval
+        self._samples = {}
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def record(self, provider, model, outcome, seconds=None, prompt_tokens=0, output_tokens=0):
+        """Add the result of one provider call"""
+        with self._lock:
+            samples = self._samples.get((provider, model))
+            if samples is None:
+                samples = self._samples[(provider, model)] = deque(maxlen=self.window)
+            samples.append([outcome, seconds, prompt_tokens, output_tokens])
+            self._dirty = True
+            save_now = time.monotonic() - self._saved_at >= self.save_interval
+        if save_now:
+            self.save()
+
+    def _get(self, provider, model):
+        with self._lock:
+            return list(self._samples.get((provider, model), ()))
+
+    def count(self, provider, model):
+        """Number of calls kept for a model"""
+        with self._lock:
+            return len(self._samples.get((provider, model), ()))
+
+    def percentile(self, provider, model, fraction, min_samples=1):
+        """Latency below which fraction of recent answers came back, or None with fewer than min_samples"""
+        latencies = sorted(sample[1] for sample in self._get(provider, model) if sample[1] is not None)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+    def summary(self, provider, model):
+        """Latency percentiles, failure rates, mean token counts and tokens/second of recent calls"""
+        samples = self._get(provider, model)
+        answered = [sample for sample in samples if sample[1] is not None]
+        output_tokens = sum(sample[3] for sample in answered)
+        seconds = sum(sample[1] for sample in answered)
+        return {
+            "calls": len(samples),
+            "p50": self.percentile(provider, model, 0.5),
+            "p95": self.percentile(provider, model, 0.95),
+            "parse_failure_rate": sum(sample[0] == PARSE_ERROR for sample in samples) / len(samples) if samples else None,
+            "error_rate": sum(sample[0] == ERROR for sample in samples) / len(samples) if samples else None,
+            "prompt_tokens": sum(sample[2] for sample in answered) / len(answered) if answered else None,
+            "output_tokens": output_tokens / len(answered) if answered else None,
+            "tokens_per_second": output_tokens / seconds if seconds > 0 else None
+        }
+
+    def models(self):
+        """Every (provider, model) with recorded calls"""
+        with self._lock:
+            return list(self._samples)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            for entry in data["models"]:
+                self._samples[(entry["provider"], entry["model"])] = deque(entry["samples"], maxlen=self.window)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring saved provider statistics: {str(e)}")
+
+    def save(self):
+        """Write the samples to disk if anything changed since the last save"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            data = {"models": [
+                {"provider": provider, "model": model, "samples": list(samples)}
+                for (provider, model), samples in self._samples.items()
+            ]}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save provider statistics: {str(e)}")
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+# Function to get the shared provider statistics
+def get_provider_stats():
+    """Get the process-wide provider statistics, shared by every session"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = ProviderStats(path=os.path.join(CACHE_DIR, "provider_stats.json"))
+            atexit.register(_stats.save)
+        return _stats
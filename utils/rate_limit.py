@@ -0,0 +1,260 @@
+# Per-provider and per-model request/token rate limits for provider calls
+import asyncio
+import contextvars
+import email.utils
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+
+from utils.config import PROVIDER_CONFIGS, PROVIDER_OUTPUT_TOKENS
+from utils.chunking import estimate_tokens
+from utils.http_client import add_response_hook
+
+# (provider, model) of the request running in this thread or task, so the
+# HTTP response hook knows which buckets a rate-limit header refers to
+current_request = contextvars.ContextVar("current_rate_limited_request", default=None)
+
+# Semaphore per provider bounding the requests the current caller has in flight,
+# e.g. the batch CLI's PROVIDER_CONCURRENCY; None (the default) means no bound.
+# Worker threads that run in a copy of the caller's context share the bound.
+concurrency_limits = contextvars.ContextVar("provider_concurrency_limits", default=None)
+
+# Seconds between checks of a concurrency slot from the event loop
+CONCURRENCY_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """Token bucket refilled at a per-minute rate, which callers may overdraw.
+
+    reserve() always succeeds and returns how long the caller must wait
+    before sending. Later callers inherit the debt of earlier ones, so
+    requests go out in the order they arrived instead of being rejected.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take amount tokens and return the seconds until they are covered"""
+        self._refill(now)
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause_until(self, until, now):
+        """Make the next reservation wait at least until the given time"""
+        self._refill(now)
+        self.tokens = min(self.tokens, -(until - now) * self.rate)
+
+
+# Function to parse a rate-limit reset header into seconds from now
+def parse_reset(value, now=None):
+    """Parse "20ms", "1m30s", seconds, epoch (s or ms) or an HTTP/RFC 3339 date"""
+    if value is None:
+        return None
+    value = value.strip()
+    now = time.time() if now is None else now
+
+    duration = re.fullmatch(r'(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?', value)
+    if duration and any(duration.groups()):
+        hours, minutes, seconds, millis = (float(part or 0) for part in duration.groups())
+        return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is not None:
+        if number > 1e11:  # epoch milliseconds
+            return max(0.0, number / 1000 - now)
+        if number > 1e9:  # epoch seconds
+            return max(0.0, number - now)
+        return max(0.0, number)
+
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - now)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+# Headers (remaining, reset) that say a request or token budget is used up
+REQUEST_LIMIT_HEADERS = [
+    ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),    # OpenAI, Groq
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),
+    ("x-ratelimit-remaining", "x-ratelimit-reset")                       # OpenRouter
+]
+TOKEN_LIMIT_HEADERS = [
+    ("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset")
+]
+
+
+class RateLimiter:
+    """Schedule provider requests under requests/minute and tokens/minute limits.
+
+    Limits come from the "rate_limits" entry of PROVIDER_CONFIGS: "rpm" and
+    "tpm" apply to the whole provider, and "models" holds per-model limits.
+    A request waits for every bucket that applies to it. Retry-After and
+    rate-limit headers on responses push the buckets back until the reset.
+    """
+
+    def __init__(self, provider_configs=PROVIDER_CONFIGS):
+        self._limits = {name: config.get("rate_limits") or {} for name, config in provider_configs.items()}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_buckets(self, provider, model):
+        """Return {"rpm": [...], "tpm": [...]} buckets for a request, creating them on first use"""
+        limits = self._limits.get(provider, {})
+        scopes = [((provider, None), limits), ((provider, model), (limits.get("models") or {}).get(model, {}))]
+        buckets = {"rpm": [], "tpm": []}
+        for key, scope_limits in scopes:
+            for kind in ("rpm", "tpm"):
+                bucket_key = key + (kind,)
+                if bucket_key not in self._buckets and scope_limits.get(kind):
+                    self._buckets[bucket_key] = TokenBucket(scope_limits[kind])
+                if bucket_key in self._buckets:
+                    buckets[kind].append(self._buckets[bucket_key])
+        return buckets
+
+    def reserve(self, provider, model, tokens):
+        """Reserve one request and tokens for it, returning the seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._get_buckets(provider, model)
+            delays = [bucket.reserve(1, now) for bucket in buckets["rpm"]]
+            delays += [bucket.reserve(tokens, now) for bucket in buckets["tpm"]]
+        return max(delays, default=0.0)
+
+    def pause(self, provider, model, seconds, kinds=("rpm", "tpm")):
+        """Hold back requests to a model until seconds from now"""
+        now = time.monotonic()
+        with self._lock:
+            for kind in kinds:
+                bucket_key = (provider, model, kind)
+                if bucket_key not in self._buckets:
+                    # A provider with no configured limit still has to respect the server's
+                    self._buckets[bucket_key] = TokenBucket(1e9 if kind == "tpm" else 1e6)
+                self._buckets[bucket_key].pause_until(now + seconds, now)
+
+    def observe(self, provider, model, status_code, headers):
+        """Adjust the buckets from a response's Retry-After and rate-limit headers"""
+        headers = {name.lower(): value for name, value in headers.items()}
+        retry_after = parse_reset(headers.get("retry-after"))
+        if status_code == 429 and retry_after is None:
+            retry_after = 1.0
+        if retry_after:
+            self.pause(provider, model, retry_after)
+
+        for kind, header_pairs in (("rpm", REQUEST_LIMIT_HEADERS), ("tpm", TOKEN_LIMIT_HEADERS)):
+            for remaining_header, reset_header in header_pairs:
+                remaining = headers.get(remaining_header)
+                if remaining is None:
+                    continue
+                try:
+                    exhausted = float(remaining) <= 0
+                except ValueError:
+                    break
+                reset = parse_reset(headers.get(reset_header))
+                if exhausted and reset:
+                    self.pause(provider, model, reset, kinds=(kind,))
+                break
+
+    def request_tokens(self, provider, prompt):
+        """Tokens a request counts against TPM: the prompt plus the requested answer size"""
+        return estimate_tokens(prompt) + PROVIDER_OUTPUT_TOKENS.get(provider, 0)
+
+    @contextmanager
+    def request(self, provider, model, prompt):
+        """Wait for a slot, then run the block with responses attributed to this model.
+
+        With concurrency_limits set, also wait until fewer than the provider's
+        limit of requests are in flight.
+        """
+        limits = concurrency_limits.get()
+        slot = limits.get(provider) if limits else None
+        if slot is not None:
+            slot.acquire()
+        try:
+            delay = self.reserve(provider, model, self.request_tokens(provider, prompt))
+            if delay > 0:
+                time.sleep(delay)
+            token = current_request.set((provider, model))
+            try:
+                yield
+            finally:
+                current_request.reset(token)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    @asynccontextmanager
+    async def request_async(self, provider, model, prompt):
+        """Async version of request(): waiting doesn't block the event loop"""
+        limits = concurrency_limits.get()
+        slot = limits.get(provider) if limits else None
+        if slot is not None:
+            # The semaphore is shared with threads, so poll it instead of blocking the loop;
+            # a task cancelled while it waits never holds the slot
+            while not slot.acquire(blocking=False):
+                await asyncio.sleep(CONCURRENCY_POLL_INTERVAL)
+        try:
+            delay = self.reserve(provider, model, self.request_tokens(provider, prompt))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            token = current_request.set((provider, model))
+            try:
+                yield
+            finally:
+                current_request.reset(token)
+        finally:
+            if slot is not None:
+                slot.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+# Function to build per-provider concurrency limits
+def make_concurrency_limits(limits):
+    """Semaphores for concurrency_limits from a {provider: requests in flight} mapping"""
+    return {provider: threading.BoundedSemaphore(limit) for provider, limit in limits.items() if limit}
+
+
+# Function to pass a response's rate-limit headers to the rate limiter
+def observe_headers(status_code, headers):
+    """Adjust the current request's buckets from a response; for SDK clients,
+    whose responses don't pass through utils.http_client"""
+    request = current_request.get()
+    if request is not None and _limiter is not None:
+        _limiter.observe(request[0], request[1], status_code, headers)
+
+
+# Function to pass HTTP responses to the rate limiter
+def observe_response(response):
+    """Response hook: feed rate-limit headers of provider calls back to the limiter"""
+    observe_headers(response.status_code, response.headers)
+
+
+# Function to get the shared rate limiter
+def get_rate_limiter():
+    """Get the process-wide rate limiter, shared by every session"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+            add_response_hook(observe_response)
+        return _limiter
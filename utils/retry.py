@@ -0,0 +1,118 @@
+# Deadlines, backoff and retry budgets for provider HTTP calls
+import contextvars
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.config import RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND
+
+# Status codes worth retrying: rate limited, server errors and model loading
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Monotonic time by which the current review must finish, for this thread or task
+current_deadline = contextvars.ContextVar("current_review_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """Run the block with a deadline seconds from now (an outer, earlier deadline wins)"""
+    if seconds is None:
+        yield
+        return
+    until = time.monotonic() + seconds
+    outer = current_deadline.get()
+    token = current_deadline.set(until if outer is None else min(outer, until))
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+# Function to get the time left before the current deadline
+def time_remaining():
+    """Seconds left before the current deadline, or None if there is none"""
+    until = current_deadline.get()
+    return None if until is None else until - time.monotonic()
+
+
+# Function to compute the wait before the next attempt
+def backoff_delay(attempt, hint=None):
+    """Capped exponential backoff with full jitter; a server hint sets the minimum.
+
+    attempt counts from 1 for the first retry. hint is a Retry-After or
+    estimated_time value in seconds.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if hint is not None:
+        # Spread out the clients that were all told the same time
+        delay = max(delay, hint + random.uniform(0, RETRY_BASE_DELAY))
+    return delay
+
+
+class RetryBudget:
+    """Limit retries to a fraction of requests so an outage isn't amplified.
+
+    Each request deposits ratio tokens and each retry withdraws one. A small
+    allowance per second keeps retries possible when traffic is low.
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_BUDGET_MIN_PER_SECOND, capacity=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.balance = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def record_request(self):
+        """Count a first attempt"""
+        with self._lock:
+            self._refill()
+            self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_retry(self):
+        """Take a retry from the budget, returning False if it is spent"""
+        with self._lock:
+            self._refill()
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+# Function to get the retry budget for a host
+def get_retry_budget(origin):
+    """Get the shared retry budget for a scheme://host"""
+    with _budgets_lock:
+        if origin not in _budgets:
+            _budgets[origin] = RetryBudget()
+        return _budgets[origin]
+
+
+# Function to read the server's hint for when to retry
+def retry_hint(status_code, headers, body=None):
+    """Seconds the server asked us to wait, from Retry-After or Hugging Face's estimated_time"""
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    # Hugging Face answers 503 {"error": "Model ... is currently loading", "estimated_time": 20.0}
+    if status_code == 503 and isinstance(body, dict) and isinstance(body.get("estimated_time"), (int, float)):
+        return float(body["estimated_time"])
+    return None
@@ -0,0 +1,516 @@
+# Provider dispatch, caching and chunking shared by the web app and the CLI
+import asyncio
+import json
+import time
+
+from utils.config import (
+    ASYNC_REVIEW_TIMEOUT,
+    REVIEW_DEADLINE,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_TARGETS,
+    REFORMAT_TARGETS,
+    PROVIDER_CONFIGS,
+    get_available_providers
+)
+from utils.retry import deadline, time_remaining
+from utils.prompts import create_review_prompt, create_reformat_prompt
+from utils.cache import get_review_cache, make_cache_key
+from utils.incremental import review_changed_definitions, review_changed_definitions_async, store_definition_findings
+from utils.http_client import close_async_client
+from utils.rate_limit import get_rate_limiter
+from utils.provider_stats import get_provider_stats, OK, PARSE_ERROR, ERROR
+from utils.json_extract import extract_json, parse_review_response
+from utils.review_schema import normalize_review
+from utils.json_stream import ReviewStreamParser
+from utils.jobs import JobCancelled, raise_if_cancelled, report_progress
+from utils.chunking import chunk_code, estimate_tokens, get_code_token_budget, merge_reviews, review_in_chunks
+from utils.tracing import span, annotate, record_stage, record_tokens
+
+from providers.openai_provider import analyze_with_openai, analyze_with_openai_async, stream_with_openai
+from providers.anthropic_provider import analyze_with_anthropic, analyze_with_anthropic_async, stream_with_anthropic
+from providers.ollama_provider import analyze_with_ollama, analyze_with_ollama_async, stream_with_ollama
+from providers.gemini_provider import analyze_with_gemini, analyze_with_gemini_async, stream_with_gemini
+from providers.groq_provider import analyze_with_groq, analyze_with_groq_async, stream_with_groq
+from providers.huggingface_provider import analyze_with_huggingface, analyze_with_huggingface_async, stream_with_huggingface
+from providers.openrouter_provider import analyze_with_openrouter, analyze_with_openrouter_async, stream_with_openrouter
+from providers.openrouter_catalog import get_openrouter_catalog
+from providers.streaming import ProviderStreamError
+from providers.health import get_health_registry, get_usable_providers, is_provider_usable
+
+
+# Function to analyze code based on selected provider
+def analyze_with_provider(code, language, api_key, provider, model, depth):
+    """Run one review request against a provider and return the review dict.
+
+    A response that isn't valid JSON goes through recover_review before
+    it is reported as an error.
+    """
+    prompt = build_prompt(code, language, depth, provider, model)
+    return recover_review(call_provider(code, language, api_key, provider, model, prompt), api_key, provider)
+
+
+# Function to build the review prompt for a provider
+def build_prompt(code, language, depth, provider, model):
+    """create_review_prompt, timed as the "prompt" stage"""
+    with span("prompt", provider=provider, model=model) as attributes:
+        prompt = create_review_prompt(code, language, depth, provider, model)
+        attributes["prompt_tokens"] = estimate_tokens(prompt)
+    return prompt
+
+
+# Function to send a prompt to a provider
+def call_provider(code, language, api_key, provider, model, prompt):
+    """Run one request against a provider once its rate limits allow and record the call"""
+    # Wait for the provider's rate limits, then give the call (with its retries) a deadline
+    with get_rate_limiter().request(provider, model, prompt), deadline(REVIEW_DEADLINE), \
+            span("request", provider=provider, model=model):
+        # A job cancelled while it waited for a slot doesn't send the request
+        raise_if_cancelled()
+        started = time.monotonic()
+        if provider == "OpenAI":
+            review = analyze_with_openai(code, language, model, prompt, api_key)
+        elif provider == "Anthropic":
+            review = analyze_with_anthropic(code, language, model, prompt, api_key)
+        elif provider == "Ollama":
+            review = analyze_with_ollama(code, language, model, prompt)
+        elif provider == "Google Gemini":
+            review = analyze_with_gemini(code, language, model, prompt)
+        elif provider == "Groq":
+            review = analyze_with_groq(code, language, model, prompt)
+        elif provider == "Hugging Face":
+            review = analyze_with_huggingface(code, language, model, prompt)
+        elif provider == "OpenRouter":
+            review = analyze_with_openrouter(code, language, model, prompt)
+        else:
+            return {"error": f"Unsupported provider: {provider}"}
+        record_call(provider, model, prompt, started, review)
+        return review
+
+
+# Function to parse the "Provider:model" entries of a target list
+def parse_targets(targets):
+    """(provider, model) of each entry whose provider is configured; a missing model means its first"""
+    available = get_available_providers()
+    parsed = []
+    for target in targets:
+        name, _, target_model = (part.strip() for part in target.partition(":"))
+        if name in available:
+            parsed.append((name, target_model or PROVIDER_CONFIGS[name]["models"][0]))
+    return parsed
+
+
+# Function to pick the model that reformats an unparseable response
+def get_reformat_target(raw_response):
+    """First REFORMAT_TARGETS model that isn't known to be down and fits the response, or None"""
+    status = get_health_registry().snapshot()
+    response_tokens = estimate_tokens(raw_response)
+    for target in parse_targets(REFORMAT_TARGETS):
+        if status.get(target[0]) is not False and get_model_code_budget(*target) >= response_tokens:
+            return target
+    return None
+
+
+# Function to tag a review that a small model reformatted
+def tag_reformatted(review, reformatted, target):
+    """The reformatted review if it parsed, tagged with the model that made it, else the original review"""
+    if reformatted and "error" not in reformatted:
+        return dict(reformatted, recovered="reformatted", reformatted_by=f"{target[0]} ({target[1]})")
+    return review
+
+
+# Function to recover a review whose response couldn't be parsed
+def recover_review(review, api_key=None, provider=None):
+    """Have a small, fast model rewrite an unparseable response as review JSON.
+
+    Only reviews with a "raw_response" (the model answered, but local
+    repair couldn't make JSON of it) are sent; the result is tagged
+    recovered="reformatted". Otherwise, or if that fails too, review is
+    returned as it is. api_key is only used if the target is provider.
+    """
+    raw_response = (review or {}).get("raw_response") or ""
+    if not raw_response.strip():
+        return review
+    target = get_reformat_target(raw_response)
+    if target is None:
+        return review
+    reformatted = call_provider(raw_response, "text", api_key if target[0] == provider else None,
+                                target[0], target[1], create_reformat_prompt(raw_response))
+    return tag_reformatted(review, reformatted, target)
+
+
+# Function to add a finished provider call to the statistics
+def record_call(provider, model, prompt, started, review):
+    """Record latency, outcome and token counts of a call that returned review"""
+    seconds = time.monotonic() - started
+    stats = get_provider_stats()
+    if review and "error" not in review and not review.get("recovered"):
+        outcome, output = OK, json.dumps(review)
+    elif review and "error" not in review:
+        # Usable only after local repair
+        outcome, output = PARSE_ERROR, json.dumps(review)
+    elif review and "raw_response" in review:
+        # The model answered, but not with a usable review
+        outcome, output = PARSE_ERROR, review["raw_response"]
+    else:
+        stats.record(provider, model, ERROR)
+        annotate(outcome=ERROR, error=True)
+        return
+    prompt_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(output)
+    stats.record(provider, model, outcome, seconds, prompt_tokens, output_tokens)
+    record_tokens(provider, model, prompt_tokens, output_tokens)
+    annotate(outcome=outcome)
+
+
+# Function to stream review text from the selected provider
+def stream_review(code, language, api_key, provider, model, depth):
+    """Return a generator of review text chunks from a provider"""
+    prompt = build_prompt(code, language, depth, provider, model)
+    if provider == "OpenAI":
+        stream = stream_with_openai(code, language, model, prompt, api_key)
+    elif provider == "Anthropic":
+        stream = stream_with_anthropic(code, language, model, prompt, api_key)
+    elif provider == "Ollama":
+        stream = stream_with_ollama(code, language, model, prompt)
+    elif provider == "Google Gemini":
+        stream = stream_with_gemini(code, language, model, prompt)
+    elif provider == "Groq":
+        stream = stream_with_groq(code, language, model, prompt)
+    elif provider == "Hugging Face":
+        stream = stream_with_huggingface(code, language, model, prompt)
+    elif provider == "OpenRouter":
+        stream = stream_with_openrouter(code, language, model, prompt)
+    else:
+        raise ProviderStreamError(f"Unsupported provider: {provider}")
+    return rate_limited_stream(stream, provider, model, prompt)
+
+
+# Function to review code through the provider's streaming API
+def analyze_with_stream(code, language, api_key, provider, model, depth):
+    """Stream a review and return it parsed, like analyze_with_provider.
+
+    While the response arrives, the review parsed so far (rating, issues
+    whose objects have closed) is reported as the current job's partial
+    result, so a page polling the job can show it before the end.
+    """
+    parser = ReviewStreamParser()
+    received = []
+    characters = 0
+    try:
+        for chunk in stream_review(code, language, api_key, provider, model, depth):
+            received.append(chunk)
+            characters += len(chunk)
+            events = parser.feed(chunk)
+            report_progress(message=f"Receiving review from {provider}... {characters:,} characters",
+                            partial=dict(parser.review, issues=list(parser.review.get("issues", []))) if events else None)
+    except ProviderStreamError as e:
+        return e.to_review()
+
+    if parser.complete:
+        return normalize_review(parser.review)
+    return recover_review(parse_review_response("".join(received), provider), api_key, provider)
+
+
+# Function to start a stream once the provider's rate limits allow it
+def rate_limited_stream(stream, provider, model, prompt):
+    """Wait for a rate-limit slot when iteration starts, then yield the stream until the deadline.
+
+    The request is timed by hand rather than as a span, since the generator
+    is suspended inside the caller's spans between chunks.
+    """
+    with get_rate_limiter().request(provider, model, prompt), deadline(REVIEW_DEADLINE):
+        started = time.monotonic()
+        received = []
+        try:
+            for chunk in stream:
+                if not received:
+                    record_stage("first_byte", time.monotonic() - started, provider=provider, model=model)
+                received.append(chunk)
+                yield chunk
+                remaining = time_remaining()
+                if remaining is not None and remaining <= 0:
+                    stream.close()
+                    raise ProviderStreamError(f"{provider} review did not finish within {REVIEW_DEADLINE:g} seconds")
+                try:
+                    raise_if_cancelled()
+                except JobCancelled:
+                    stream.close()
+                    raise
+        except ProviderStreamError:
+            get_provider_stats().record(provider, model, ERROR)
+            record_stage("request", time.monotonic() - started, provider=provider, model=model, streamed=True, outcome=ERROR)
+            raise
+        text = "".join(received)
+        outcome = OK if extract_json(text) is not None else PARSE_ERROR
+        prompt_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        get_provider_stats().record(provider, model, outcome, time.monotonic() - started, prompt_tokens, output_tokens)
+        record_tokens(provider, model, prompt_tokens, output_tokens)
+        record_stage("request", time.monotonic() - started, provider=provider, model=model, streamed=True, outcome=outcome,
+                     prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+
+
+# Function to get how many tokens of code fit in one request to a model
+def get_model_code_budget(provider, model):
+    """Code token budget for a model, using the OpenRouter catalog's context length when known"""
+    context_tokens = None
+    if provider == "OpenRouter":
+        model_info = get_openrouter_catalog().get(model)
+        context_tokens = model_info.get("context_length") if model_info else None
+    return get_code_token_budget(provider, model, context_tokens)
+
+
+# Function to check whether a review may be cached
+def is_cacheable(review):
+    """Cache complete reviews only; a recovered one is reviewed again next time"""
+    return bool(review) and "error" not in review and not review.get("recovered")
+
+
+# Function to analyze code, reusing a cached review when nothing changed
+def analyze_code(code, language, api_key, provider, model, depth, use_cache=True, analyze_single=None, hedge=False):
+    """Review code with caching, splitting files too large for one request.
+
+    analyze_single replaces analyze_with_provider for files that fit in one
+    request (the web app passes its streaming renderer here). With hedge,
+    requests that run past the model's usual latency are raced against a
+    backup provider (see analyze_hedged_async). When the file changed but
+    some of its top-level definitions didn't, only the changed ones are
+    sent and the cached findings of the rest are merged in.
+    """
+    analyze = analyze_hedged if hedge else analyze_with_provider
+    review_cache = get_review_cache()
+    cache_key = make_cache_key(code, language, depth, provider, model)
+    if use_cache:
+        cached_review = review_cache.get(cache_key)
+        if cached_review is not None:
+            # Reviews cached before they were normalized may have the wrong shape
+            return dict(normalize_review(cached_review), cached=True)
+
+    def review_text(text):
+        # Text too large for one request is reviewed in chunks, without live output
+        chunks = chunk_code(text, language, get_model_code_budget(provider, model))
+        if len(chunks) > 1:
+            return review_in_chunks(
+                chunks,
+                lambda chunk: analyze(chunk, language, api_key, provider, model, depth)
+            )
+        return (analyze_single or analyze)(text, language, api_key, provider, model, depth)
+
+    review = review_changed_definitions(code, language, depth, provider, model, review_text) if use_cache else None
+    if review is None:
+        review = review_text(code)
+        if is_cacheable(review):
+            store_definition_findings(code, language, depth, provider, model, review)
+    if is_cacheable(review):
+        review_cache.set(cache_key, review)
+    return review
+
+
+# Async analyze function of each provider, called as (code, language, model, prompt[, api_key])
+ASYNC_ANALYZERS = {
+    "OpenAI": analyze_with_openai_async,
+    "Anthropic": analyze_with_anthropic_async,
+    "Ollama": analyze_with_ollama_async,
+    "Google Gemini": analyze_with_gemini_async,
+    "Groq": analyze_with_groq_async,
+    "Hugging Face": analyze_with_huggingface_async,
+    "OpenRouter": analyze_with_openrouter_async
+}
+
+
+# Function to analyze code with a provider on the running event loop
+async def analyze_with_provider_async(code, language, api_key, provider, model, depth, timeout=ASYNC_REVIEW_TIMEOUT):
+    """Async analyze_with_provider with a timeout.
+
+    Returns an error dict if the review takes longer than timeout seconds
+    (None for no limit). Cancelling the calling task cancels the request.
+    """
+    prompt = build_prompt(code, language, depth, provider, model)
+    review = await call_provider_async(code, language, api_key, provider, model, prompt, timeout)
+    return await recover_review_async(review, api_key, provider, timeout)
+
+
+# Function to send a prompt to a provider on the running event loop
+async def call_provider_async(code, language, api_key, provider, model, prompt, timeout=ASYNC_REVIEW_TIMEOUT):
+    """Async call_provider; returns an error dict if the request takes longer than timeout seconds"""
+    analyze = ASYNC_ANALYZERS.get(provider)
+    if analyze is None:
+        return {"error": f"Unsupported provider: {provider}"}
+
+    # The timeout covers the request and its retries, not the wait for a rate-limit slot
+    async with get_rate_limiter().request_async(provider, model, prompt):
+        raise_if_cancelled()
+        if provider in ("OpenAI", "Anthropic"):
+            request = analyze(code, language, model, prompt, api_key)
+        else:
+            request = analyze(code, language, model, prompt)
+        with deadline(timeout), span("request", provider=provider, model=model):
+            started = time.monotonic()
+            try:
+                review = await asyncio.wait_for(request, timeout)
+            except asyncio.TimeoutError:
+                get_provider_stats().record(provider, model, ERROR)
+                annotate(outcome=ERROR, error=True)
+                return {"error": f"{provider} review timed out after {timeout:g} seconds"}
+            record_call(provider, model, prompt, started, review)
+        return review
+
+
+# Function to recover an unparseable review on the running event loop
+async def recover_review_async(review, api_key=None, provider=None, timeout=ASYNC_REVIEW_TIMEOUT):
+    """Async recover_review"""
+    raw_response = (review or {}).get("raw_response") or ""
+    if not raw_response.strip():
+        return review
+    target = get_reformat_target(raw_response)
+    if target is None:
+        return review
+    reformatted = await call_provider_async(raw_response, "text", api_key if target[0] == provider else None,
+                                            target[0], target[1], create_reformat_prompt(raw_response), timeout)
+    return tag_reformatted(review, reformatted, target)
+
+
+# Function to list the providers a slow request may be hedged to
+def get_hedge_candidates(provider, model):
+    """(provider, model) pairs other than the primary, in the order to try them.
+
+    HEDGE_TARGETS ("Provider:model" entries) sets the order when given.
+    Otherwise each other usable provider (see get_usable_providers()) is a
+    candidate with its first model, those with the lowest recent median
+    latency first.
+    """
+    if HEDGE_TARGETS:
+        candidates = parse_targets(HEDGE_TARGETS)
+    else:
+        available = get_usable_providers()
+        stats = get_provider_stats()
+        candidates = [(name, PROVIDER_CONFIGS[name]["models"][0]) for name in available if name != provider]
+        # sort() is stable, so providers without enough history keep their config order
+        candidates.sort(key=lambda target: stats.percentile(target[0], target[1], 0.5, HEDGE_MIN_SAMPLES) or float("inf"))
+    return [target for target in candidates if target != (provider, model)]
+
+
+# Function to pick the provider and model that backs up a slow request
+def get_hedge_target(provider, model, code):
+    """First hedge candidate that is usable and whose context fits the code, or None"""
+    status = get_health_registry().snapshot()
+    code_tokens = estimate_tokens(code)
+    for target in get_hedge_candidates(provider, model):
+        if is_provider_usable(target[0], status) and get_model_code_budget(*target) >= code_tokens:
+            return target
+    return None
+
+
+# Function to get how long a request may run before it is hedged
+def get_hedge_delay(provider, model):
+    """The model's recent HEDGE_PERCENTILE latency, or HEDGE_DEFAULT_DELAY until enough reviews are recorded"""
+    latency = get_provider_stats().percentile(provider, model, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+    return HEDGE_DEFAULT_DELAY if latency is None else max(HEDGE_MIN_DELAY, latency)
+
+
+# Function to analyze code, racing a backup provider when the primary is slow
+async def analyze_hedged_async(code, language, api_key, provider, model, depth, timeout=ASYNC_REVIEW_TIMEOUT):
+    """analyze_with_provider_async with a backup request for stalled calls.
+
+    If the primary hasn't answered within get_hedge_delay(), or fails
+    before then, the same review is sent to get_hedge_target(). The first
+    review without an error wins and the other request is cancelled. A
+    review that came from the backup names it in "hedged_to".
+    """
+    primary = asyncio.ensure_future(analyze_with_provider_async(code, language, api_key, provider, model, depth, timeout))
+    backup = get_hedge_target(provider, model, code)
+    if backup is None:
+        return await primary
+
+    tasks = {primary: None}
+    try:
+        done, _ = await asyncio.wait([primary], timeout=get_hedge_delay(provider, model))
+        if done and "error" not in primary.result():
+            return primary.result()
+
+        # The backup uses its provider's key from the environment
+        tasks[asyncio.ensure_future(analyze_with_provider_async(code, language, None, backup[0], backup[1], depth, timeout))] = backup
+        failed = None
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                target = tasks.pop(task)
+                review = task.result()
+                if review and "error" not in review:
+                    return review if target is None else dict(review, hedged_to=f"{target[0]} ({target[1]})")
+                # If both fail, report the primary's error
+                if failed is None or target is None:
+                    failed = review
+        return failed
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Function to run a hedged review from synchronous code
+def analyze_hedged(code, language, api_key, provider, model, depth):
+    """Blocking analyze_hedged_async on a private event loop, bounded by REVIEW_DEADLINE"""
+    async def run():
+        try:
+            return await analyze_hedged_async(code, language, api_key, provider, model, depth, REVIEW_DEADLINE)
+        finally:
+            await close_async_client()
+
+    return asyncio.run(run())
+
+
+# Function to analyze code asynchronously, with caching and chunking
+async def analyze_code_async(code, language, api_key, provider, model, depth, use_cache=True, timeout=ASYNC_REVIEW_TIMEOUT, hedge=False):
+    """Async analyze_code: chunks of a large file are reviewed concurrently on the same loop.
+
+    Like analyze_code, only the changed definitions of an edited file are
+    sent when the findings of the others are cached.
+    """
+    analyze = analyze_hedged_async if hedge else analyze_with_provider_async
+    review_cache = get_review_cache()
+    cache_key = make_cache_key(code, language, depth, provider, model)
+    if use_cache:
+        cached_review = review_cache.get(cache_key)
+        if cached_review is not None:
+            # Reviews cached before they were normalized may have the wrong shape
+            return dict(normalize_review(cached_review), cached=True)
+
+    async def review_text(text):
+        chunks = chunk_code(text, language, get_model_code_budget(provider, model))
+        if len(chunks) > 1:
+            reviews = await asyncio.gather(*[
+                analyze(chunk["code"], language, api_key, provider, model, depth, timeout)
+                for chunk in chunks
+            ])
+            return merge_reviews(chunks, reviews)
+        return await analyze(text, language, api_key, provider, model, depth, timeout)
+
+    review = await review_changed_definitions_async(code, language, depth, provider, model, review_text) if use_cache else None
+    if review is None:
+        review = await review_text(code)
+        if is_cacheable(review):
+            store_definition_findings(code, language, depth, provider, model, review)
+    if is_cacheable(review):
+        review_cache.set(cache_key, review)
+    return review
+
+
+# Function to run many reviews concurrently on one event loop
+async def analyze_many_async(jobs, max_concurrency=None, timeout=ASYNC_REVIEW_TIMEOUT, use_cache=True):
+    """Review every job concurrently and return the reviews in job order.
+
+    Each job is a dict with code, language, api_key, provider, model and
+    depth. max_concurrency caps the reviews in flight (None for no cap).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run(job):
+        if semaphore is None:
+            return await analyze_code_async(**job, use_cache=use_cache, timeout=timeout)
+        async with semaphore:
+            return await analyze_code_async(**job, use_cache=use_cache, timeout=timeout)
+
+    return await asyncio.gather(*[run(job) for job in jobs])
@@ -0,0 +1,136 @@
+# The one definition of the review structure, in the forms each provider accepts
+import copy
+
+from utils.config import STRUCTURED_OUTPUT, MODEL_JSON_MODES
+
+SEVERITIES = ["Critical", "High", "Medium", "Low"]
+
+# JSON Schema of a review, in the strict form OpenAI's json_schema mode requires
+# (every property required, no additional properties)
+REVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "overall_rating": {
+            "type": "number",
+            "description": "Overall code quality rating from 1 to 10"
+        },
+        "summary": {
+            "type": "object",
+            "properties": {
+                "strengths": {"type": "array", "items": {"type": "string"}},
+                "weaknesses": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["strengths", "weaknesses"],
+            "additionalProperties": False
+        },
+        "key_recommendations": {"type": "array", "items": {"type": "string"}},
+        "issues": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "line": {
+                        "type": "string",
+                        "description": 'line number or range (e.g., "10" or "10-15")'
+                    },
+                    "severity": {"type": "string", "enum": SEVERITIES},
+                    "description": {"type": "string"},
+                    "recommendation": {"type": "string"},
+                    "improved_code": {"type": "string"}
+                },
+                "required": ["line", "severity", "description", "recommendation", "improved_code"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["overall_rating", "summary", "key_recommendations", "issues"],
+    "additionalProperties": False
+}
+
+
+# Function to describe a schema the way the prompts show the expected JSON
+def describe_schema(schema=REVIEW_SCHEMA, indent=0):
+    """Render schema as the annotated JSON skeleton the review prompts include"""
+    pad = " " * indent
+    if schema["type"] == "object":
+        fields = [
+            f'{pad}    "{name}": {describe_schema(value, indent + 4)}'
+            for name, value in schema["properties"].items()
+        ]
+        return "{\n" + ",\n".join(fields) + f"\n{pad}}}"
+    if schema["type"] == "array":
+        items = schema["items"]
+        if items["type"] == "object":
+            return f"[\n{pad}    {describe_schema(items, indent + 4)}\n{pad}]"
+        return f"[list of {items['type']}s]"
+    if "enum" in schema:
+        return '"' + "|".join(schema["enum"]) + '"'
+    if schema["type"] == "string":
+        return schema.get("description", '"string"')
+    return schema["type"]
+
+
+# Function to get the OpenAI-compatible response_format of a JSON mode
+def get_response_format(json_mode):
+    """response_format for json_mode "schema" or "object", or None for plain text"""
+    if json_mode == "schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "code_review", "strict": True, "schema": REVIEW_SCHEMA}
+        }
+    if json_mode == "object":
+        return {"type": "json_object"}
+    return None
+
+
+# Function to convert the review schema to Gemini's schema format
+def get_gemini_schema(schema=REVIEW_SCHEMA):
+    """REVIEW_SCHEMA in the OpenAPI subset Gemini's response_schema takes.
+
+    Gemini names types in upper case and rejects additionalProperties.
+    """
+    schema = copy.deepcopy(schema)
+    schema.pop("additionalProperties", None)
+    schema["type"] = schema["type"].upper()
+    if "properties" in schema:
+        schema["properties"] = {name: get_gemini_schema(value) for name, value in schema["properties"].items()}
+    if "items" in schema:
+        schema["items"] = get_gemini_schema(schema["items"])
+    return schema
+
+
+# Function to get the native JSON mode to request from a model
+def get_json_mode(model, default=None):
+    """MODEL_JSON_MODES entry of model (default if unlisted), or None when STRUCTURED_OUTPUT is off"""
+    if not STRUCTURED_OUTPUT:
+        return None
+    return MODEL_JSON_MODES.get(model, default)
+
+
+# Function to coerce a parsed review to the shape of the review schema
+def normalize_review(review):
+    """A copy of review whose summary is a dict and whose list fields are lists.
+
+    Models without schema enforcement sometimes answer with valid JSON of
+    the wrong shape ("summary": "Looks fine", "issues": null). A text
+    summary is kept as its only strength, a single string in a list field
+    becomes a one-item list, anything else missing or of the wrong type
+    becomes empty, and issues that aren't objects are dropped.
+    """
+    def as_list(value):
+        if isinstance(value, list):
+            return value
+        return [value] if isinstance(value, str) and value.strip() else []
+
+    summary = review.get("summary")
+    if isinstance(summary, dict):
+        summary = dict(summary, strengths=as_list(summary.get("strengths")), weaknesses=as_list(summary.get("weaknesses")))
+    else:
+        summary = {"strengths": as_list(summary), "weaknesses": []}
+    return dict(
+        review,
+        summary=summary,
+        key_recommendations=as_list(review.get("key_recommendations")),
+        issues=[issue for issue in as_list(review.get("issues")) if isinstance(issue, dict)]
+    )
+
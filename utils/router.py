@@ -0,0 +1,158 @@
+# "Auto" provider: route each review to the best model for an objective
+import random
+
+from utils.config import (
+    PROVIDER_CONFIGS,
+    PROVIDER_OUTPUT_TOKENS,
+    ROUTER_OBJECTIVE,
+    ROUTER_EXPLORATION,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_DEFAULT_LATENCY,
+    has_free_tier
+)
+from utils.chunking import PROMPT_OVERHEAD_TOKENS, estimate_tokens
+from utils.provider_stats import get_provider_stats
+from utils.review import get_model_code_budget
+from providers.openrouter_catalog import get_openrouter_catalog
+from providers.health import get_usable_providers
+
+AUTO_PROVIDER = "Auto"
+ROUTER_OBJECTIVES = ["fastest", "balanced", "cheapest"]
+
+# OpenRouter id prefix of models that providers also sell directly, for their prices
+OPENROUTER_PRICE_PREFIXES = {
+    "OpenAI": "openai/",
+    "Anthropic": "anthropic/",
+    "Google Gemini": "google/"
+}
+
+
+# Function to get the price of a model
+def get_model_price(provider, model):
+    """(prompt, completion) USD per 1M tokens, or None if unknown.
+
+    Prices come from the OpenRouter catalog. Local models and free-tier
+    providers without a catalog price cost nothing.
+    """
+    if provider == "Ollama":
+        return 0.0, 0.0
+    model_info = None
+    if provider == "OpenRouter":
+        model_info = get_openrouter_catalog().get(model)
+    elif provider in OPENROUTER_PRICE_PREFIXES:
+        model_info = get_openrouter_catalog().get(OPENROUTER_PRICE_PREFIXES[provider] + model)
+    if model_info is not None:
+        return model_info["prompt_price"], model_info["completion_price"]
+    return (0.0, 0.0) if has_free_tier(provider) else None
+
+
+# Function to estimate how a review would go on a model
+def estimate_model(provider, model, prompt_tokens):
+    """Expected latency and cost of one usable review, from the model's recent calls.
+
+    Both are divided by the success rate (smoothed so one failure doesn't
+    rule a model out), since a failed or unparseable review has to be redone.
+    """
+    stats = get_provider_stats()
+    summary = stats.summary(provider, model)
+    calls = summary["calls"]
+    successes = calls - round(calls * ((summary["parse_failure_rate"] or 0) + (summary["error_rate"] or 0)))
+    success_rate = (successes + 1) / (calls + 2)
+
+    latency = summary["p50"] if calls >= ROUTER_MIN_SAMPLES and summary["p50"] is not None else ROUTER_DEFAULT_LATENCY
+    output_tokens = summary["output_tokens"] or PROVIDER_OUTPUT_TOKENS.get(provider, 1000)
+    price = get_model_price(provider, model)
+    cost = None if price is None else (prompt_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+    return {
+        "provider": provider,
+        "model": model,
+        "calls": calls,
+        "success_rate": success_rate,
+        "latency": latency / success_rate,
+        "cost": None if cost is None else cost / success_rate,
+        "tokens_per_second": summary["tokens_per_second"]
+    }
+
+
+# Function to list the models the router may pick
+def get_candidate_models(code_tokens=0):
+    """(provider, model) of every configured provider not known to be down
+    (keyless ones only once they were found running).
+
+    Models whose context fits the code come first; the others are only
+    used if none fits, and get the file in chunks.
+    """
+    candidates = [
+        (provider, model)
+        for provider in get_usable_providers()
+        for model in PROVIDER_CONFIGS[provider]["models"]
+    ]
+    fitting = [target for target in candidates if get_model_code_budget(*target) >= code_tokens]
+    return fitting or candidates
+
+
+# Function to rank the candidate models for a review
+def rank_models(code, objective=ROUTER_OBJECTIVE):
+    """Estimates for every candidate model, best first for the objective"""
+    code_tokens = estimate_tokens(code)
+    estimates = [estimate_model(provider, model, code_tokens + PROMPT_OVERHEAD_TOKENS)
+                 for provider, model in get_candidate_models(code_tokens)]
+    if not estimates:
+        return []
+
+    # Latency and cost as fractions of the worst candidate; an unknown price counts as the worst
+    max_cost = max((estimate["cost"] for estimate in estimates if estimate["cost"] is not None), default=0.0)
+    max_latency = max(estimate["latency"] for estimate in estimates)
+    for estimate in estimates:
+        if estimate["cost"] is None:
+            relative_cost = 1.0
+        else:
+            relative_cost = estimate["cost"] / max_cost if max_cost else 0.0
+        relative_latency = estimate["latency"] / max_latency
+        if objective == "fastest":
+            estimate["score"] = (relative_latency, relative_cost)
+        elif objective == "cheapest":
+            estimate["score"] = (relative_cost, relative_latency)
+        else:
+            estimate["score"] = (relative_latency + relative_cost,)
+    estimates.sort(key=lambda estimate: estimate["score"])
+    return estimates
+
+
+# Function to pick the model for an "Auto" review
+def choose_model(code, objective=ROUTER_OBJECTIVE, rng=random):
+    """Return the estimate of the model to use, or None if no provider is configured.
+
+    A ROUTER_EXPLORATION share of reviews goes to a model with fewer than
+    ROUTER_MIN_SAMPLES calls, so new models get statistics of their own.
+    """
+    estimates = rank_models(code, objective)
+    if not estimates:
+        return None
+    untried = [estimate for estimate in estimates if estimate["calls"] < ROUTER_MIN_SAMPLES]
+    if untried and rng.random() < ROUTER_EXPLORATION:
+        return rng.choice(untried)
+    return estimates[0]
+
+
+# Function to summarize the statistics of every candidate model
+def get_stats_table():
+    """One row per candidate model with its recent latency, failures, throughput and price"""
+    stats = get_provider_stats()
+    rows = []
+    for provider, model in get_candidate_models():
+        summary = stats.summary(provider, model)
+        price = get_model_price(provider, model)
+        rows.append({
+            "Provider": provider,
+            "Model": model,
+            "Calls": summary["calls"],
+            "p50 (s)": None if summary["p50"] is None else round(summary["p50"], 1),
+            "p95 (s)": None if summary["p95"] is None else round(summary["p95"], 1),
+            "Parse failures": None if summary["parse_failure_rate"] is None else f"{summary['parse_failure_rate']:.0%}",
+            "Errors": None if summary["error_rate"] is None else f"{summary['error_rate']:.0%}",
+            "Tokens/s": None if summary["tokens_per_second"] is None else round(summary["tokens_per_second"]),
+            "$ per 1M tokens (in/out)": None if price is None else f"{price[0]:.2f} / {price[1]:.2f}"
+        })
+    return rows
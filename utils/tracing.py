@@ -0,0 +1,363 @@
+# Lightweight timing of the review stages, exported as Prometheus text and JSON logs
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.config import TRACING, TRACE_HISTORY, TRACE_MAX_SPANS, TRACE_JSON_LOG, METRICS_PORT, METRICS_HOST
+
+# Upper bounds in seconds of the stage duration histogram buckets
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Span attributes that become metric labels; the rest only go to traces and logs
+METRIC_LABELS = ("provider", "model")
+
+# Trace and span the current thread or task works in
+current_trace = contextvars.ContextVar("current_review_trace", default=None)
+current_span = contextvars.ContextVar("current_review_span", default=None)
+
+logger = logging.getLogger("code_review.trace")
+
+
+class Trace:
+    """The spans of one review, possibly recorded from several threads"""
+
+    def __init__(self, name, **attributes):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started = time.time()
+        self.duration = None
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+    def snapshot(self):
+        """A copy of the trace as a dict"""
+        with self._lock:
+            return {
+                "trace_id": self.id,
+                "name": self.name,
+                "attributes": dict(self.attributes),
+                "started": self.started,
+                "duration": self.duration,
+                "spans": [dict(record, attributes=dict(record["attributes"])) for record in self.spans],
+                "dropped_spans": self.dropped
+            }
+
+
+class Tracer:
+    """Aggregate finished spans into per-stage histograms and keep recent traces.
+
+    Stage durations are counted per stage, provider and model in the
+    STAGE_BUCKETS histogram; token counts per provider and model. With
+    json_log, every finished span is also logged as one JSON line.
+    """
+
+    def __init__(self, max_traces=TRACE_HISTORY, json_log=TRACE_JSON_LOG):
+        self.json_log = json_log
+        self._stages = {}
+        self._tokens = {}
+        self._traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        if json_log and not logger.handlers:
+            # One JSON object per line on stderr, for log collectors
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def record_span(self, record):
+        """Add a finished span to the histograms (and the log)"""
+        labels = tuple(str(record["attributes"].get(label) or "") for label in METRIC_LABELS)
+        key = (record["name"],) + labels
+        with self._lock:
+            stage = self._stages.get(key)
+            if stage is None:
+                stage = self._stages[key] = {"count": 0, "sum": 0.0, "max": 0.0, "errors": 0, "buckets": [0] * len(STAGE_BUCKETS)}
+            stage["count"] += 1
+            stage["sum"] += record["duration"]
+            stage["max"] = max(stage["max"], record["duration"])
+            stage["errors"] += bool(record.get("error"))
+            for index, bound in enumerate(STAGE_BUCKETS):
+                if record["duration"] <= bound:
+                    stage["buckets"][index] += 1
+        if self.json_log:
+            logger.info(json.dumps(record, default=str))
+
+    def add_tokens(self, provider, model, prompt_tokens, output_tokens):
+        """Count the tokens sent to and received from a model"""
+        with self._lock:
+            tokens = self._tokens.setdefault((provider, model), {"prompt": 0, "output": 0})
+            tokens["prompt"] += prompt_tokens
+            tokens["output"] += output_tokens
+
+    def add_trace(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def get_traces(self, trace_ids=None):
+        """Snapshots of the kept traces (only trace_ids if given), newest first"""
+        with self._lock:
+            traces = list(self._traces)
+        return [trace.snapshot() for trace in reversed(traces) if trace_ids is None or trace.id in trace_ids]
+
+    def stage_summary(self):
+        """One row per stage, provider and model with call count, mean, max and error count"""
+        with self._lock:
+            stages = {key: dict(stage) for key, stage in self._stages.items()}
+        return [{
+            "Stage": stage_name,
+            "Provider": provider or None,
+            "Model": model or None,
+            "Calls": stage["count"],
+            "Mean (ms)": round(1000 * stage["sum"] / stage["count"], 1),
+            "Max (ms)": round(1000 * stage["max"], 1),
+            "Errors": stage["errors"]
+        } for (stage_name, provider, model), stage in sorted(stages.items())]
+
+    def render_prometheus(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self._lock:
+            stages = {key: dict(stage, buckets=list(stage["buckets"])) for key, stage in self._stages.items()}
+            tokens = {key: dict(value) for key, value in self._tokens.items()}
+
+        lines = [
+            "# HELP code_review_stage_seconds Time spent in each stage of a review",
+            "# TYPE code_review_stage_seconds histogram"
+        ]
+        for key, stage in sorted(stages.items()):
+            labels = format_labels(zip(("stage",) + METRIC_LABELS, key))
+            for bound, count in zip(STAGE_BUCKETS, stage["buckets"]):
+                lines.append(f'code_review_stage_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'code_review_stage_seconds_bucket{{{labels},le="+Inf"}} {stage["count"]}')
+            lines.append(f"code_review_stage_seconds_sum{{{labels}}} {stage['sum']:.6f}")
+            lines.append(f"code_review_stage_seconds_count{{{labels}}} {stage['count']}")
+        lines += [
+            "# HELP code_review_stage_errors_total Stages that ended with an exception or an error result",
+            "# TYPE code_review_stage_errors_total counter"
+        ]
+        for key, stage in sorted(stages.items()):
+            lines.append(f"code_review_stage_errors_total{{{format_labels(zip(('stage',) + METRIC_LABELS, key))}}} {stage['errors']}")
+        lines += [
+            "# HELP code_review_tokens_total Estimated tokens sent to (prompt) and received from (output) each model",
+            "# TYPE code_review_tokens_total counter"
+        ]
+        for (provider, model), counts in sorted(tokens.items()):
+            for kind in ("prompt", "output"):
+                labels = format_labels((("provider", provider), ("model", model), ("kind", kind)))
+                lines.append(f"code_review_tokens_total{{{labels}}} {counts[kind]}")
+        return "\n".join(lines) + "\n"
+
+
+# Function to format Prometheus labels
+def format_labels(pairs):
+    """name="value" pairs joined by commas, with the value escaped"""
+    def escape(value):
+        return str(value or "").replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+# Global tracer instance
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+# Function to get the tracer shared by the app and the CLI
+def get_tracer():
+    """Get or create the global Tracer instance"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
+
+
+# Function to finish a span and hand it to its trace and the tracer
+def _finish(record, trace):
+    if trace is not None:
+        record["trace_id"] = trace.id
+        trace.add(record)
+    get_tracer().record_span(record)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as stage name; yields the span's attributes, which annotate() adds to.
+
+    The span is nested in the current one, inherits its provider and model,
+    and is counted as an error if the block raises.
+    """
+    if not TRACING:
+        yield {}
+        return
+    parent = current_span.get()
+    if parent is not None:
+        attributes = dict({label: parent["attributes"][label] for label in METRIC_LABELS if label in parent["attributes"]}, **attributes)
+    record = {
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent is not None else None,
+        "start": time.time(),
+        "duration": None,
+        "error": False,
+        "attributes": attributes
+    }
+    token = current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException:
+        record["error"] = True
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - started
+        current_span.reset(token)
+        _finish(record, current_trace.get())
+
+
+# Function to time every call of a function as a stage
+def traced(name):
+    """Decorator running the function inside span(name)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Function to add attributes to the current span
+def annotate(**attributes):
+    """Set attributes (e.g. token counts) on the current span; a no-op outside spans.
+
+    error=True marks the span as failed instead of adding an attribute.
+    """
+    record = current_span.get()
+    if record is not None:
+        if attributes.pop("error", False):
+            record["error"] = True
+        record["attributes"].update(attributes)
+
+
+# Function to record a stage that was timed by hand
+def record_stage(name, seconds, **attributes):
+    """Record a finished stage of the given duration, e.g. the time to first byte of a response,
+    as a child of the current span"""
+    if not TRACING:
+        return
+    parent = current_span.get()
+    if parent is not None:
+        attributes = dict({label: parent["attributes"][label] for label in METRIC_LABELS if label in parent["attributes"]}, **attributes)
+    _finish({
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent is not None else None,
+        "start": time.time() - seconds,
+        "duration": seconds,
+        "error": False,
+        "attributes": attributes
+    }, current_trace.get())
+
+
+# Function to record how long a response took to start arriving
+def record_first_byte(seconds, **attributes):
+    """Record a "first_byte" stage under the current span; a no-op outside spans,
+    so health checks and catalog fetches aren't counted"""
+    if current_span.get() is not None:
+        record_stage("first_byte", seconds, **attributes)
+
+
+# Function to count the tokens of a provider call
+def record_tokens(provider, model, prompt_tokens, output_tokens):
+    """Add token counts to the metrics and to the current span"""
+    if not TRACING:
+        return
+    get_tracer().add_tokens(provider, model, prompt_tokens, output_tokens)
+    annotate(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Group the spans recorded in the block, including those of worker threads
+    that run in a copy of this context, into one trace; yields the Trace"""
+    current = Trace(name, **attributes)
+    token = current_trace.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - started
+        current_trace.reset(token)
+        if TRACING:
+            get_tracer().add_trace(current)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the tracer's metrics at /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_tracer().render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+# Global metrics server instance, and why it couldn't be started
+_metrics_server = None
+_metrics_server_error = None
+_metrics_server_lock = threading.Lock()
+
+
+# Function to serve the metrics for Prometheus to scrape
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on host:port from a background thread, once per process.
+
+    Returns the server, or None if port is 0 or it couldn't be started. A
+    failure (e.g. the port is taken) is logged and remembered, so later
+    calls neither retry nor log again; get_metrics_server_error() tells why.
+    """
+    global _metrics_server, _metrics_server_error
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None and _metrics_server_error is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                _metrics_server_error = f"Could not serve metrics on {host}:{port}: {str(e)}"
+                logger.warning(_metrics_server_error)
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _metrics_server
+
+
+# Function to tell why the metrics server isn't running
+def get_metrics_server_error():
+    """The error start_metrics_server() ran into, or None"""
+    return _metrics_server_error
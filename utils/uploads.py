@@ -0,0 +1,217 @@
+# Review many uploaded files and archives at once, reading archive members one at a time
+import contextvars
+import os
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from utils.config import UPLOAD_REVIEW_WORKERS, UPLOAD_MAX_FILE_BYTES, UPLOAD_MAX_FILES
+from utils.language import EXTENSION_LANGUAGES, SKIP_DIRS, detect_language
+from utils.jobs import JobCancelled, get_task_pool, raise_if_cancelled, report_progress, run_without_progress
+
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz")
+
+# File types the uploader accepts: source files and archives of them
+UPLOAD_TYPES = [ext.lstrip(".") for ext in EXTENSION_LANGUAGES] + ["zip", "gz", "tgz"]
+
+
+# Function to check whether an upload is an archive
+def is_archive(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+# Function to check whether a path inside an archive is source code worth reviewing
+def is_reviewable_path(path):
+    """True for files with a known source extension outside hidden, dependency and build directories"""
+    parts = path.replace("\\", "/").strip("/").split("/")
+    if any(part.startswith(".") or part in SKIP_DIRS for part in parts[:-1]):
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in EXTENSION_LANGUAGES
+
+
+# Function to read one file as text without reading more than the size limit
+def read_source(stream, max_bytes):
+    """Return (text, None), or (None, reason) if the file is too large or not UTF-8 text"""
+    # Reading one byte past the limit catches files whose declared size is wrong
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        return None, f"larger than {max_bytes:,} bytes"
+    try:
+        return data.decode("utf-8"), None
+    except UnicodeDecodeError:
+        return None, "not UTF-8 text"
+
+
+# Function to go through the source files of an archive
+def iter_archive(name, fileobj, max_bytes, prefix=""):
+    """Yield (path, text, skip_reason) for each source file in a zip or tar.gz archive, with prefix before each path.
+
+    Only one member is decompressed and held in memory at a time; a tar.gz
+    is read front to back in streaming mode, without seeking.
+    """
+    try:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not is_reviewable_path(info.filename):
+                        continue
+                    if info.file_size > max_bytes:
+                        yield prefix + info.filename, None, f"larger than {max_bytes:,} bytes"
+                        continue
+                    with archive.open(info) as member:
+                        text, skipped = read_source(member, max_bytes)
+                    yield prefix + info.filename, text, skipped
+        else:
+            with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+                for member in archive:
+                    if not member.isfile() or not is_reviewable_path(member.name):
+                        continue
+                    if member.size > max_bytes:
+                        yield prefix + member.name, None, f"larger than {max_bytes:,} bytes"
+                        continue
+                    text, skipped = read_source(archive.extractfile(member), max_bytes)
+                    yield prefix + member.name, text, skipped
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        yield name, None, f"could not read the archive: {str(e)}"
+
+
+# Function to go through the source files of a set of uploads
+def iter_uploaded_files(uploads, max_bytes=UPLOAD_MAX_FILE_BYTES, max_files=UPLOAD_MAX_FILES):
+    """Yield (path, text, skip_reason) for each uploaded file and each source file in uploaded archives.
+
+    uploads is a list of (name, file object). Files inside an archive are
+    named after the archive when more than one upload is given. Stops after
+    max_files source files.
+    """
+    count = 0
+    for name, fileobj in uploads:
+        if is_archive(name):
+            entries = iter_archive(name, fileobj, max_bytes, f"{name}/" if len(uploads) > 1 else "")
+        else:
+            entries = [(name, *read_source(fileobj, max_bytes))]
+        for entry in entries:
+            if count >= max_files:
+                yield name, None, f"only the first {max_files} files of an upload are reviewed"
+                return
+            count += 1
+            yield entry
+
+
+# Function to count the issues of one file's review
+def count_issues(review):
+    """Number of issues in review, or None if it has no list of them (e.g. "issues": null)"""
+    issues = (review or {}).get("issues") or []
+    return len(issues) if isinstance(issues, list) else None
+
+
+# Function to review every source file of a set of uploads in parallel
+def review_uploaded_files(uploads, analyze_file, max_workers=UPLOAD_REVIEW_WORKERS):
+    """Review the files of uploads, max_workers at a time, and return one record per file.
+
+    analyze_file(code, language) reviews one file. The files are reviewed
+    on the shared task pool, so this must not itself run there. Files are
+    read from the archives only as reviews finish, so at most one more
+    than max_workers are held in memory at once. The status of every
+    file is reported as the job's partial result ({"files": rows}) while
+    the review runs. Records are {"path", "language", "review"}, or
+    {"path", "skipped"} for files that were not reviewed, in the order
+    the files were found.
+    """
+    records = []
+    rows = []
+    lock = threading.Lock()
+    window = threading.BoundedSemaphore(max_workers)
+    finished = [0]
+
+    def publish(message):
+        with lock:
+            table = [dict(row) for row in rows]
+            done, found = finished[0], len(rows)
+        report_progress(done, found, message, partial={"files": table})
+
+    def review_one(index, text):
+        with lock:
+            rows[index]["Status"] = "reviewing"
+            path, language = records[index]["path"], records[index]["language"]
+        try:
+            review = run_without_progress(analyze_file, text, language)
+            row = {
+                "Status": "failed" if not review or "error" in review else "done",
+                "Issues": count_issues(review),
+                "Rating": (review or {}).get("overall_rating")
+            }
+        except JobCancelled:
+            raise
+        except Exception as e:
+            # One broken file shouldn't fail the review of the others
+            review = {"error": f"The review failed: {str(e) or type(e).__name__}"}
+            row = {"Status": "failed", "Issues": None, "Rating": None}
+        finally:
+            window.release()
+        with lock:
+            records[index]["review"] = review
+            rows[index].update(row)
+            finished[0] += 1
+        publish(f"Reviewed {path}")
+
+    pool = get_task_pool()
+    futures = set()
+    try:
+        for path, text, skipped in iter_uploaded_files(uploads):
+            raise_if_cancelled()
+            language = None if text is None else detect_language(text, path)
+            with lock:
+                if text is None:
+                    records.append({"path": path, "skipped": skipped})
+                    rows.append({"File": path, "Language": None, "Status": f"skipped: {skipped}", "Issues": None, "Rating": None})
+                    finished[0] += 1
+                    continue
+                records.append({"path": path, "language": language})
+                rows.append({"File": path, "Language": language, "Status": "queued", "Issues": None, "Rating": None})
+                index = len(records) - 1
+            # Wait for a free slot before reading further, checking for cancellation meanwhile
+            while not window.acquire(timeout=0.5):
+                raise_if_cancelled()
+            # Each worker gets a copy of this context, so the job can still be cancelled from there
+            futures.add(pool.submit(contextvars.copy_context().run, review_one, index, text))
+            done, futures = wait(futures, timeout=0, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        publish(f"Found {len(records)} files")
+
+        while futures:
+            done, futures = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+            raise_if_cancelled()
+    finally:
+        # The pool is shared, so only drop this upload's files that haven't started
+        for future in futures:
+            future.cancel()
+    return records
+
+
+# Function to summarize the reviews of many files
+def summarize_file_reviews(records):
+    """Counts over the records of review_uploaded_files for the combined report"""
+    reviewed = [record for record in records if "review" in record and record["review"] and "error" not in record["review"]]
+    severities = {}
+    for record in reviewed:
+        issues = record["review"].get("issues") or []
+        for issue in issues if isinstance(issues, list) else []:
+            severity = issue.get("severity", "Unknown") if isinstance(issue, dict) else "Unknown"
+            severities[severity] = severities.get(severity, 0) + 1
+    ratings = []
+    for record in reviewed:
+        try:
+            ratings.append(float(record["review"].get("overall_rating")))
+        except (TypeError, ValueError):
+            pass
+    return {
+        "files_reviewed": len(reviewed),
+        "files_failed": sum(1 for record in records if "review" in record) - len(reviewed),
+        "files_skipped": sum(1 for record in records if "skipped" in record),
+        "issues_by_severity": severities,
+        "average_rating": round(sum(ratings) / len(ratings), 1) if ratings else None
+    }